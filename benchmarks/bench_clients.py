@@ -0,0 +1,111 @@
+"""Benchmark: pooled clients vs. a fresh connection/client per request.
+
+Runs a local keep-alive stub that serves a small HTML page and a fake
+``/v1/chat/completions`` endpoint, then times sequential requests made the old
+way (bare ``requests.get`` / a new ``OpenAI`` client per call) and through
+``prospecting_keywords.clients``: pages with ``fetch.fetch_description`` over
+the shared, deadline-bounded session, as the pipeline fetches them. Loopback has no real DNS or TLS cost, so the
+numbers here are a lower bound on the saving against remote HTTPS hosts.
+
+    python benchmarks/bench_clients.py
+"""
+
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+from prospecting_keywords import clients  # noqa: E402
+from prospecting_keywords.fetch import fetch_description  # noqa: E402
+
+REQUESTS = 200
+PAGE = b'<html><head><meta name="description" content="Stub page"></head><body></body></html>'
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "<step_5_keywords>\n1. [stub]\n</step_5_keywords>"}}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+    connections = 0
+    flaky_remaining = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/flaky" and StubHandler.flaky_remaining > 0:
+            StubHandler.flaky_remaining -= 1
+            self._send(503, b"busy", "text/plain", [("Retry-After", "1")])
+            return
+        self._send(200, PAGE, "text/html; charset=utf-8")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(200, COMPLETION, "application/json")
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(label, func):
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36}{elapsed * 1000 / REQUESTS:>9.2f} ms/req{StubHandler.connections:>8} connections")
+    return elapsed
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    clients.host_limiter.min_interval = 0
+    messages = [{"role": "user", "content": "hi"}]
+
+    print(f"{REQUESTS} sequential requests against {base}\n")
+    bare = timed("page: requests.get per call", lambda: requests.get(f"{base}/", timeout=10).content)
+    pooled = timed("page: shared session", lambda: fetch_description(f"{base}/"))
+    print(f"{'':<36}{bare / pooled:>9.1f}x faster\n")
+
+    fresh = timed("llm: new OpenAI client per call", lambda: OpenAI(
+        api_key="sk-stub", base_url=f"{base}/v1").chat.completions.create(model="gpt-4o", messages=messages))
+    shared_client = clients.get_openai_client("sk-stub")
+    shared_client = shared_client.with_options(base_url=f"{base}/v1")
+    shared = timed("llm: shared OpenAI client", lambda: shared_client.chat.completions.create(
+        model="gpt-4o", messages=messages))
+    print(f"{'':<36}{fresh / shared:>9.1f}x faster\n")
+
+    StubHandler.flaky_remaining = 2
+    start = time.perf_counter()
+    description, _ = fetch_description(f"{base}/flaky")
+    print(f"retry: two 503s with Retry-After: 1 -> {description!r} after {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Micro-benchmark for keyword extraction.
+
+Checks that the original regex chain agrees with the single-pass extractor on
+the recorded GPT responses in fixtures/gpt_responses.jsonl (tests/test_extract.py
+checks the extractor itself against them), then times both over the corpus
+repeated to ROWS responses and over one long untagged response.
+
+    python benchmarks/bench_extract.py
+"""
+
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prospecting_keywords.extract import extract  # noqa: E402
+
+CORPUS = os.path.join(ROOT, "benchmarks", "fixtures", "gpt_responses.jsonl")
+ROWS = 20_000
+# Untagged long-form reasoning: the worst case for the "final list of.*?keywords" search
+LONG_RESPONSE = "Reviewing the final list of products, keywords, and categories.\n" * 300 + "1. Garden Tools\n"
+LONG_ROWS = 20
+
+
+def legacy_extract_keywords(gpt_response):
+    # The original four-method chain from main.py, uncompiled patterns and all
+    keywords = []
+
+    step_5_pattern = r'<step_5_keywords>(.*?)</step_5_keywords>'
+    final_keywords_match = re.search(step_5_pattern, gpt_response, re.DOTALL)
+    if final_keywords_match:
+        for line in final_keywords_match.group(1).strip().split('\n'):
+            line = line.strip()
+            if line and re.match(r'^\d+\.', line):
+                keyword_match = re.search(r'\[(.*?)\]', line)
+                if keyword_match:
+                    keywords.append(keyword_match.group(1).strip())
+                else:
+                    keywords.append(re.sub(r'^\d+\.\s*', '', line).strip())
+
+    if not keywords:
+        step5_patterns = [
+            r'Step 5[\s\-\:\.]+([^#]+)',
+            r'top 5 most relevant keywords[\s\-\:\.]+([^#]+)',
+            r'final list of.*?keywords[\s\-\:\.]+([^#]+)'
+        ]
+        for pattern in step5_patterns:
+            match = re.search(pattern, gpt_response, re.IGNORECASE | re.DOTALL)
+            if match:
+                for line in match.group(1).strip().split('\n'):
+                    line = line.strip()
+                    if line and re.match(r'^\d+[\.\)]', line):
+                        keyword_match = re.search(r'\[(.*?)\]', line)
+                        if keyword_match:
+                            keywords.append(keyword_match.group(1).strip())
+                        else:
+                            keyword = re.sub(r'^\d+[\.\)]\s*', '', line).strip()
+                            keyword = re.sub(r'^["\'`\[]|["\'`\]]$', '', keyword).strip()
+                            if keyword:
+                                keywords.append(keyword)
+                break
+
+    if not keywords:
+        all_items = re.findall(r'^\d+[\.\)]\s*(.*?)$', gpt_response, re.MULTILINE)
+        for item in [item.strip() for item in all_items if len(item.split()) <= 3]:
+            clean_item = re.sub(r'^["\'`\[]|["\'`\]]$', '', item).strip()
+            if clean_item and clean_item not in keywords:
+                keywords.append(clean_item)
+
+    if not keywords:
+        for pattern in [r'"([^"]{1,30})"', r"'([^']{1,30})'", r"\[([^\]]{1,30})\]"]:
+            for word in re.findall(pattern, gpt_response):
+                if len(word.split()) <= 3 and word.strip() not in keywords:
+                    keywords.append(word.strip())
+
+    return keywords[:5]
+
+
+def main():
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    for record in corpus:
+        keywords, method = extract(record["response"])
+        ok = keywords == legacy_extract_keywords(record["response"])
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {record['id']:<30}{method:<16}{', '.join(keywords)}")
+    print(f"\n{len(corpus) - failures}/{len(corpus)} responses match the original regex chain\n")
+
+    responses = [corpus[i % len(corpus)]["response"] for i in range(ROWS)]
+    for label, func in (("legacy regex chain", legacy_extract_keywords), ("single-pass extractor", extract)):
+        start = time.perf_counter()
+        for response in responses:
+            func(response)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24}{elapsed:>7.2f}s  {elapsed * 1e6 / ROWS:>7.1f} us/response")
+
+    print(f"\n{len(LONG_RESPONSE)}-character untagged response:")
+    for label, func in (("legacy regex chain", legacy_extract_keywords), ("single-pass extractor", extract)):
+        start = time.perf_counter()
+        for _ in range(LONG_ROWS):
+            func(LONG_RESPONSE)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24}{elapsed * 1000 / LONG_ROWS:>9.2f} ms/response")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark: the description fallback chain, streamed vs. a full BeautifulSoup parse.
+
+Each saved page in fixtures/pages is padded with product-grid markup as in
+bench_meta.py, then described twice: by ``read_description``, which stops at
+the first tier with enough text, and by the same tiers looked up in a full
+BeautifulSoup parse of the whole page. Reports time, bytes read, peak Python
+memory (tracemalloc) and which source was chosen, and checks both agree.
+
+    python benchmarks/bench_fallback.py
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from bench_meta import PAGES_DIR, best_of, chunks, padded_page  # noqa: E402
+from prospecting_keywords.meta import (  # noqa: E402
+    MAX_HEADINGS,
+    MAX_PARAGRAPHS,
+    PARAGRAPH_TARGET_CHARS,
+    META_PRIORITY,
+    META_SOURCES,
+    MIN_FALLBACK_CHARS,
+    MIN_PARAGRAPH_CHARS,
+    SOURCE_HEADINGS,
+    SOURCE_JSON_LD,
+    SOURCE_PARAGRAPHS,
+    SOURCE_TITLE,
+    WHITESPACE,
+    json_ld_description,
+    read_description,
+)
+
+SIZES = (50_000, 500_000, 2_000_000)
+
+
+def text_of(tag):
+    return WHITESPACE.sub(" ", tag.get_text()).strip()
+
+
+def bs4_description(html):
+    # The same tiers, found by parsing the whole page up front
+    soup = BeautifulSoup(html, "html.parser")
+    for (attr, value), source in zip(META_PRIORITY, META_SOURCES):
+        tag = soup.find("meta", attrs={attr: value})
+        if tag and tag.get("content"):
+            return tag["content"], source
+
+    title = text_of(soup.head.title) if soup.head and soup.head.title else ""
+    json_ld = ""
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            json_ld = json_ld_description(json.loads(script.string or "")) or ""
+        except ValueError:
+            continue
+        if json_ld:
+            break
+    for tag in soup.find_all(["script", "style", "noscript", "template", "svg"]):
+        tag.decompose()
+    body = soup.body or soup
+    headings = [text for text in map(text_of, body.find_all(["h1", "h2"])) if text][:MAX_HEADINGS]
+    paragraphs = []
+    for text in map(text_of, body.find_all("p")):
+        if len(paragraphs) >= MAX_PARAGRAPHS or len(" ".join(paragraphs)) >= PARAGRAPH_TARGET_CHARS:
+            break
+        if len(text) >= MIN_PARAGRAPH_CHARS:
+            paragraphs.append(text)
+
+    candidates = (
+        (title, SOURCE_TITLE),
+        (json_ld, SOURCE_JSON_LD),
+        (". ".join(heading.rstrip(".") for heading in headings), SOURCE_HEADINGS),
+        (" ".join(paragraphs), SOURCE_PARAGRAPHS),
+    )
+    for text, source in candidates:
+        if len(text) >= MIN_FALLBACK_CHARS:
+            return text, source
+    for text, source in candidates:
+        if text:
+            return text, source
+    return "", ""
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    print(f"{'page':<22}{'size':>10}{'bs4 ms':>9}{'bs4 MB':>8}{'stream ms':>11}{'stream KB':>11}"
+          f"{'bytes read':>12}  {'source':<20}match")
+    for name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+            template = f.read()
+        for size in SIZES:
+            data = padded_page(template, size)
+
+            def full():
+                return bs4_description(data.decode("utf-8"))
+
+            def streamed():
+                return read_description(chunks(data), "utf-8")
+
+            bs4_time, expected = best_of(full)
+            stream_time, (description, source, bytes_read) = best_of(streamed)
+            bs4_peak = peak_memory(full)
+            stream_peak = peak_memory(streamed)
+            match = (description, source) == expected
+            print(f"{name:<22}{len(data):>10}{bs4_time * 1000:>9.1f}{bs4_peak / 2 ** 20:>8.1f}"
+                  f"{stream_time * 1000:>11.2f}{stream_peak / 2 ** 10:>11.0f}{bytes_read:>12}  "
+                  f"{source:<20}{'yes' if match else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark for bounded page fetches with a share of slow sites.
+
+A local server serves fast pages and pages that trickle one byte at a time
+and never finish their head. A bulk run over a mix of them shows the total
+time is set by the concurrency and the deadline (shortened here so the run is
+quick), not by the slowest sites, next to the unbounded read the pipeline
+used before. tests/test_fetch.py checks each kind of misbehaving site.
+
+    python benchmarks/bench_fetch.py
+"""
+
+import http.server
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prospecting_keywords import clients, fetch  # noqa: E402
+from prospecting_keywords.fetch import fetch_description  # noqa: E402
+from prospecting_keywords.meta import CHUNK_SIZE  # noqa: E402
+
+DEADLINE = 1.5
+BULK_SITES = 48
+BULK_SLOW_SHARE = 0.25
+BULK_CONCURRENCY = 8
+
+DESCRIPTION = "Handmade oak furniture, built to order in Yorkshire"
+PAGE = f'<html><head><title>Oak</title><meta name="description" content="{DESCRIPTION}"></head><body></body></html>'
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.close_connection = True
+        try:
+            if self.path == "/drip":
+                self.drip()
+            else:
+                body = PAGE.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        except OSError:
+            # The client gave up first, as it should
+            pass
+
+    def drip(self):
+        # The title, then one byte at a time and never the end of the head
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(b"<html><head><title>A page that never finishes loading</title>")
+        self.wfile.flush()
+        for _ in range(int(DEADLINE * 4 / 0.05)):
+            self.wfile.write(b" ")
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def log_message(self, *args):
+        pass
+
+
+def unbounded_fetch(url):
+    # The read before the deadline: a per-socket-read timeout and full-size chunks
+    from prospecting_keywords.meta import header_charset, read_description
+
+    with clients.get_session().get(url, timeout=DEADLINE, stream=True) as response:
+        return read_description(response.iter_content(CHUNK_SIZE), header_charset(response.headers.get("Content-Type")))
+
+
+def bulk(base, fetcher):
+    slow = int(BULK_SITES * BULK_SLOW_SHARE)
+    urls = [base + ("drip" if i % (BULK_SITES // slow) == 0 else "fast") for i in range(BULK_SITES)]
+
+    def timed(url):
+        started = time.perf_counter()
+        try:
+            fetcher(url)
+        except Exception:
+            pass
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as pool:
+        times = list(pool.map(timed, urls))
+    return time.perf_counter() - started, max(times), slow
+
+
+def main():
+    fetch.FETCH_DEADLINE = DEADLINE
+    fetch.CONNECT_TIMEOUT = fetch.READ_TIMEOUT = DEADLINE
+    clients.host_limiter.min_interval = 0
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}/"
+
+    print(f"{BULK_SITES} pages, {BULK_SLOW_SHARE:.0%} trickling bytes, {BULK_CONCURRENCY} workers, "
+          f"deadline {DEADLINE}s:")
+    bound = math.ceil(BULK_SITES * BULK_SLOW_SHARE / BULK_CONCURRENCY) * DEADLINE
+    for label, fetcher in (("bounded", fetch_description), ("unbounded", unbounded_fetch)):
+        total, slowest, slow = bulk(base, fetcher)
+        print(f"  {label:<10}{total:>6.2f}s total, slowest page {slowest:.2f}s")
+    print(f"  bound for {slow} slow pages: about {bound:.2f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
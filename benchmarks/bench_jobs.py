@@ -0,0 +1,106 @@
+"""Benchmark: checkpointing and exporting a large bulk job.
+
+Creates a ROWS-row job in a temporary job store and checkpoints every row
+through fetched, prompted and extracted with a realistic GPT-4o response, then
+exports it to CSV and Parquet. Reports the time taken and the peak Python
+memory (tracemalloc) of each export next to the in-memory ``rows_to_csv`` the
+bulk page used to build. Also checks that a row checkpointed as "prompted" is
+resumed by extraction alone.
+
+    python benchmarks/bench_jobs.py [rows]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prospecting_keywords.batch import (  # noqa: E402
+    STATE_EXTRACTED,
+    STATE_FETCHED,
+    STATE_PROMPTED,
+    extract_row,
+    rows_to_csv,
+)
+from prospecting_keywords.jobs import JobStore, run_job  # noqa: E402
+from prospecting_keywords.structured import STEP_KEYS  # noqa: E402
+
+ROWS = 100_000
+RESPONSE = json.dumps({key: [f"keyword {step}.{i}" for i in range(1, 6)] for step, key in enumerate(STEP_KEYS, 1)})
+DESCRIPTION = "Handmade oak furniture from our Vermont workshop: dining tables, benches and bookshelves. " * 2
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def fill(store, job_id):
+    # Every step of every row is a separate checkpoint, as in a real run
+    for row in store.unfinished_rows(job_id):
+        row.update(state=STATE_FETCHED, root_domain=f"site{row['index']}.com", meta_description=DESCRIPTION,
+                   description_source="meta_description", meta_found=True)
+        store.save_row(job_id, row)
+        row.update(state=STATE_PROMPTED, gpt_response=RESPONSE, output_format="json")
+        store.save_row(job_id, row)
+        extract_row(row)
+        store.save_row(job_id, row)
+
+
+def check_resume_from_prompted(store):
+    job_id = store.create_job(["https://example.com"])
+    row = next(store.unfinished_rows(job_id))
+    row.update(state=STATE_PROMPTED, root_domain="example.com", meta_description=DESCRIPTION,
+               gpt_response=RESPONSE, output_format="json")
+    store.save_row(job_id, row)
+    # No API key: a GPT-4o call would fail, so the row must only be extracted
+    (resumed,) = run_job(store, job_id, api_key=None)
+    assert resumed["state"] == STATE_EXTRACTED and resumed["keywords"][0] == "keyword 5.1", resumed
+    print("a row checkpointed as prompted resumes with extraction only\n")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, "jobs.sqlite3"))
+        check_resume_from_prompted(store)
+
+        job_id = store.create_job(f"https://site{i}.com" for i in range(rows))
+        started = time.perf_counter()
+        fill(store, job_id)
+        elapsed = time.perf_counter() - started
+        print(f"{rows} rows x 3 checkpoints: {elapsed:.1f}s ({elapsed / rows / 3 * 1e6:.0f} us per checkpoint), "
+              f"{os.path.getsize(os.path.join(directory, 'jobs.sqlite3')) / 2 ** 20:.0f} MB on disk\n")
+
+        def in_memory():
+            # The old bulk export: every row in a list, then one CSV string
+            rows_to_csv(list(store.rows(job_id)))
+
+        def to_csv():
+            with open(os.devnull, "w", encoding="utf-8", newline="") as f:
+                store.export_csv(job_id, f)
+
+        # Imported up front so the import isn't counted as export memory
+        import pyarrow.parquet  # noqa: F401
+
+        def to_parquet():
+            store.export_parquet(job_id, os.path.join(directory, "export.parquet"))
+
+        print(f"{'export':<22}{'seconds':>9}{'peak MB':>9}")
+        for name, func in (("in-memory CSV", in_memory), ("streamed CSV", to_csv), ("streamed Parquet", to_parquet)):
+            seconds, peak = peak_memory(func)
+            print(f"{name:<22}{seconds:>9.2f}{peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
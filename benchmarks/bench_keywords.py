@@ -0,0 +1,211 @@
+"""Benchmark for keyword clean-up and the cross-domain keyword index at a million keyword rows.
+
+Checks ``clean_keyword``, ``keyword_key`` and ``normalize_keywords`` on the
+kinds of variants the fallback extraction strategies return, then builds a
+synthetic batch: SITES domains with five keywords each, drawn with a skewed
+(Zipf) popularity from some 200,000 niche phrases, and written the ways
+models write them: in title or upper case, singular or plural, numbered,
+quoted or bracketed, with the odd "Keyword 3" placeholder and repeat.
+
+The ``KeywordIndex`` is compared with a plain dict of sets built from the
+same rows, for time, peak memory and identical counts, and the CSV export of
+the whole index is timed. The index's rows take 8 bytes each; most of its
+memory is the distinct domains, spellings and keywords, which the dict of
+sets also holds (without the spellings).
+
+    python benchmarks/bench_keywords.py
+    python benchmarks/bench_keywords.py --sites 20000    # a quicker run
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prospecting_keywords.aggregate import KeywordIndex  # noqa: E402
+from prospecting_keywords.postprocess import clean_keyword, keyword_key, normalize_keywords  # noqa: E402
+
+SITES = 200_000
+KEYWORDS_PER_SITE = 5
+SEED = 7
+
+# (raw, cleaned, same key as)
+CASES = [
+    ('1. "Dog Toys"', "dog toys", "dog toy"),
+    ("[dog-toys]", "dog-toys", "dog toy"),
+    ("“Organic Coffee Beans”.", "organic coffee beans", "organic coffee bean"),
+    ("coffee beans (high volume)", "coffee beans", "coffee bean"),
+    ("(organic) coffee", "organic coffee", "organic coffee"),
+    ("- Pet Supplies", "pet supplies", "pet supply"),
+    ("'Yoga Mats'", "yoga mats", "yoga mat"),
+    ("Kid's Toys", "kid's toys", "kids toy"),
+    ("Watches", "watches", "watch"),
+    ("Movies", "movies", "movie"),
+    ("Dresses", "dresses", "dress"),
+    ("Hoodies", "hoodies", "hoodie"),
+    ("Glasses", "glasses", "glass"),
+    ("News", "news", "news"),
+    ("Keyword 1", "", ""),
+    ("keyword_2", "", ""),
+    ("[keyword]", "", ""),
+    ("Term #3", "", ""),
+    ("N/A", "", ""),
+    ("...", "", ""),
+    # Real words that look like placeholders are kept
+    ("Terms", "terms", "term"),
+    ("Example", "example", "example"),
+    ("None", "none", "none"),
+    ("C++", "c++", "c++"),
+]
+# Keywords that must not share a key
+DISTINCT = [("C++", "C"), ("C#", "C"), ("C++", "C#")]
+MODIFIERS = """organic handmade vintage vegan wooden leather bamboo kids mens womens luxury eco outdoor indoor
+wireless smart electric portable custom personalised natural gluten-free waterproof ceramic recycled
+artisan italian japanese nordic rustic modern classic mini travel garden kitchen baby pet camping
+fitness yoga cycling running hiking fishing""".split()
+NOUNS = """toy bed lamp mug candle soap blanket chair table rug boot bag wallet watch dress shirt hoodie
+sock scarf jacket bottle knife pan teapot coffee tea cookie chocolate cheese wine gin sauce spice
+bike tent backpack mat stroller crib collar leash treat shampoo serum cream perfume ring necklace
+earring bracelet print poster frame vase planter seed shovel hammock cushion duvet towel apron
+notebook pen puzzle game kite drone speaker headphone charger case keyboard""".split()
+
+
+def check_normalization():
+    for raw, cleaned, same_as in CASES:
+        assert clean_keyword(raw) == cleaned, (raw, clean_keyword(raw))
+        assert keyword_key(raw) == keyword_key(same_as), (raw, keyword_key(raw), keyword_key(same_as))
+    for first, second in DISTINCT:
+        assert keyword_key(first) != keyword_key(second), (first, second, keyword_key(first))
+    assert normalize_keywords(["Dog Toys", "dog toy", "Keyword 3", "[Dog Beds]", "dog-beds", "Cat Trees"]) == [
+        "dog toys", "dog beds", "cat trees"]
+    print(f"normalization: {len(CASES) + len(DISTINCT)} cases ok")
+
+
+def plural(noun):
+    if noun.endswith(("ch", "sh", "x", "s")):
+        return noun + "es"
+    if noun.endswith("y") and noun[-2] not in "aeiou":
+        return noun[:-1] + "ies"
+    return noun + "s"
+
+
+def spellings(phrase, position):
+    # The ways a model writes one keyword
+    modifier, noun = phrase
+    forms = [f"{modifier} {noun}", f"{modifier} {plural(noun)}"]
+    return [
+        forms[1], forms[1], forms[0],
+        forms[1].title(), forms[0].title(), forms[1].upper(),
+        f'"{forms[1]}"', f"[{forms[0]}]", f"{position}. {forms[1].title()}", f"'{forms[1]}'",
+    ]
+
+
+def synthetic_rows(sites, seed=SEED):
+    """(domain, keywords) pairs, with popular phrases far more common than the rest."""
+    rng = np.random.default_rng(seed)
+    # A few thousand two-word phrases and a long tail of three-word ones, in random order of popularity
+    phrases = [(modifier, noun) for modifier in MODIFIERS for noun in NOUNS]
+    phrases += [(f"{first} {second}", noun) for first in MODIFIERS for second in MODIFIERS if first != second
+                for noun in NOUNS]
+    phrases = [phrases[i] for i in rng.permutation(len(phrases))]
+    # Every spelling string is made once and shared, as a job's rows loaded from the store would be
+    variants = [[spellings(phrase, position) for position in range(1, KEYWORDS_PER_SITE + 1)] for phrase in phrases]
+    choices = (rng.zipf(1.2, size=(sites, KEYWORDS_PER_SITE)) - 1) % len(phrases)
+    styles = rng.integers(0, 10, size=(sites, KEYWORDS_PER_SITE))
+    noise = rng.random(size=(sites, KEYWORDS_PER_SITE))
+    rows = []
+    for site in range(sites):
+        keywords = []
+        for position in range(KEYWORDS_PER_SITE):
+            if noise[site, position] < 0.02:
+                keywords.append(f"Keyword {position + 1}")
+            elif noise[site, position] < 0.05 and keywords:
+                # A variant of the keyword before it
+                keywords.append(keywords[-1].upper())
+            else:
+                keywords.append(variants[choices[site, position]][position][styles[site, position]])
+        rows.append({"root_domain": f"site{site}.example.com", "keywords": keywords})
+    return rows
+
+
+def dict_of_sets(rows):
+    # The straightforward version: normalize every keyword, a set of domains per keyword
+    index = {}
+    for row in rows:
+        for keyword in row["keywords"]:
+            key = keyword_key(keyword)
+            if key:
+                index.setdefault(key, set()).add(row["root_domain"])
+    return index
+
+
+def measure(build, rows):
+    started = time.perf_counter()
+    result = build(rows)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    peak_result = build(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del peak_result
+    return result, elapsed, peak
+
+
+def build_index(rows):
+    index = KeywordIndex().add_rows(rows)
+    index.top(1)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=SITES)
+    args = parser.parse_args()
+
+    check_normalization()
+
+    started = time.perf_counter()
+    rows = synthetic_rows(args.sites)
+    keyword_rows = sum(len(row["keywords"]) for row in rows)
+    print(f"\n{args.sites:,} domains, {keyword_rows:,} keyword rows "
+          f"(generated in {time.perf_counter() - started:.1f}s)")
+
+    index, index_s, index_peak = measure(build_index, rows)
+    naive, naive_s, naive_peak = measure(dict_of_sets, rows)
+    print(f"{'':<16}{'build s':>9}{'rows / s':>12}{'peak MB':>9}")
+    for label, elapsed, peak in (("KeywordIndex", index_s, index_peak), ("dict of sets", naive_s, naive_peak)):
+        print(f"{label:<16}{elapsed:>9.2f}{keyword_rows / elapsed:>12,.0f}{peak / 1e6:>9.1f}")
+    # The rest of the index is one entry per distinct domain, spelling and keyword
+    print(f"index columns: {len(index):,} rows kept in {len(index) * 8 / 1e6:.1f} MB; "
+          f"{len(index.domains):,} domains, {len(index.spellings):,} spellings, {len(index.top()):,} keywords")
+
+    # Same keywords, same domain counts
+    counts = {keyword_key(keyword): count for keyword, count in index.top()}
+    assert counts == {key: len(domains) for key, domains in naive.items()}
+    print("counts match the dict of sets for every keyword")
+
+    started = time.perf_counter()
+    for keyword, _ in index.top(1000):
+        index.domains_for(keyword)
+    lookup_ms = (time.perf_counter() - started) * 1000 / 1000
+    output = io.StringIO()
+    started = time.perf_counter()
+    index.export_csv(output)
+    export_s = time.perf_counter() - started
+    print(f"domains_for: {lookup_ms:.3f} ms per keyword; CSV export: {export_s:.2f}s, "
+          f"{len(output.getvalue()) / 1e6:.1f} MB")
+
+    print("\nmost widespread keywords:")
+    for keyword, count in index.top(10):
+        print(f"  {keyword:<28}{count:>8,} domains")
+
+
+if __name__ == "__main__":
+    main()
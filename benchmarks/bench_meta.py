@@ -0,0 +1,84 @@
+"""Benchmark: streaming meta extraction vs. the original full BeautifulSoup parse.
+
+Each saved page in fixtures/pages is padded with product-grid markup to the
+sizes below to mimic heavy e-commerce homepages, then both extractors run on
+the same bytes delivered in CHUNK_SIZE pieces.
+
+    python benchmarks/bench_meta.py
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from prospecting_keywords.meta import CHUNK_SIZE, read_meta_description  # noqa: E402
+
+PAGES_DIR = os.path.join(ROOT, "benchmarks", "fixtures", "pages")
+SIZES = (50_000, 500_000, 2_000_000)
+REPEAT = 3
+PRODUCT = (
+    '<div class="product-card"><a href="/products/item-{i}"><img src="/cdn/item-{i}.jpg" '
+    'alt="Item {i}" loading="lazy"><span class="price">£{i}.99</span></a></div>\n'
+)
+
+
+def bs4_meta_description(html):
+    # The pre-streaming implementation from main.py
+    soup = BeautifulSoup(html, 'html.parser')
+    meta_tags = [
+        soup.find('meta', attrs={'name': 'description'}),
+        soup.find('meta', attrs={'property': 'og:description'}),
+        soup.find('meta', attrs={'name': 'twitter:description'})
+    ]
+    for meta_tag in meta_tags:
+        if meta_tag and meta_tag.get('content'):
+            return meta_tag.get('content')
+    return ""
+
+
+def padded_page(template, size):
+    padding = []
+    total = len(template)
+    i = 0
+    while total < size:
+        card = PRODUCT.format(i=i)
+        padding.append(card)
+        total += len(card)
+        i += 1
+    return template.replace("<!-- BODY -->", "".join(padding)).encode("utf-8")
+
+
+def chunks(data):
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE]
+
+
+def best_of(func):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    print(f"{'page':<18}{'size':>10}{'bs4 ms':>10}{'stream ms':>11}{'speedup':>9}{'bytes read':>12}  match")
+    for name in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+            template = f.read()
+        for size in SIZES:
+            data = padded_page(template, size)
+            bs4_time, expected = best_of(lambda: bs4_meta_description(data.decode("utf-8")))
+            stream_time, (found, bytes_read) = best_of(lambda: read_meta_description(chunks(data), "utf-8"))
+            print(f"{name:<18}{len(data):>10}{bs4_time * 1000:>10.1f}{stream_time * 1000:>11.2f}"
+                  f"{bs4_time / stream_time:>8.0f}x{bytes_read:>12}  {'yes' if found == expected else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Offline benchmark for model routing: latency, token cost and keyword agreement per model.
+
+fixtures/model_responses.jsonl holds one response per site and model, with the
+latency and completion tokens recorded for it. Each site's prompt is rebuilt
+with the current prompt code and replayed through the real client against a
+local stub endpoint, which streams back the recorded response for that model
+and prompt after the recorded latency scaled by TIME_SCALE.
+
+Reports, per model: how often keywords were extracted, mean confidence,
+latency, cost per 1,000 sites and agreement with the last model in the route
+(the share of its five keywords the model also gave). Then sweeps the
+confidence threshold over the route and shows the escalation rate, latency,
+cost and agreement each threshold would give, and checks that
+``generate_keywords`` asks exactly the models the sweep predicts at
+MIN_CONFIDENCE.
+
+    python benchmarks/bench_routing.py             # replay the recorded responses
+    python benchmarks/bench_routing.py --record    # record them again from the API (needs OPENAI_API_KEY)
+"""
+
+import argparse
+import http.server
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep the benchmark's responses out of the real cache
+os.environ["PROSPECTING_KEYWORDS_CACHE"] = ""
+
+from prospecting_keywords import pipeline  # noqa: E402
+from prospecting_keywords.clients import get_openai_client  # noqa: E402
+from prospecting_keywords.prompt import build_prompt, count_tokens  # noqa: E402
+from prospecting_keywords.routing import DEFAULT_ROUTE, MIN_CONFIDENCE, keyword_confidence, token_cost  # noqa: E402
+from prospecting_keywords.structured import RESPONSE_FORMAT  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures", "model_responses.jsonl")
+TIME_SCALE = 0.02
+THRESHOLDS = (0.0, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def load_records():
+    with open(FIXTURES, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        record["prompt"] = build_prompt(record["root_domain"], record["meta_description"],
+                                        structured=record["structured"])
+    return records
+
+
+class ReplayHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    # (model, prompt) -> record, and the models asked, in order
+    responses = {}
+    asked = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        record = self.responses[(body["model"], body["messages"][-1]["content"])]
+        ReplayHandler.asked.append(body["model"])
+        time.sleep(record["latency_ms"] / 1000 * TIME_SCALE)
+        usage = {"prompt_tokens": record["prompt_tokens"], "completion_tokens": record["completion_tokens"],
+                 "total_tokens": record["prompt_tokens"] + record["completion_tokens"]}
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        content = record["response"]
+        for start in range(0, len(content), 40):
+            chunk = {"id": "chatcmpl-replay", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": content[start:start + 40]}, "finish_reason": None}]}
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        chunk = {"id": "chatcmpl-replay", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                 "choices": [], "usage": usage}
+        self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\ndata: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def agreement(keywords, reference):
+    # Share of the reference keywords the model also gave, ignoring case and order
+    if not reference:
+        return 0.0
+    ours = {keyword.casefold().strip() for keyword in keywords}
+    return sum(keyword.casefold().strip() in ours for keyword in reference) / len(reference)
+
+
+def mean_agreement(results, sites, final, reference):
+    return statistics.mean(agreement(result["keywords"], results[(site, reference)]["keywords"])
+                           for site, result in zip(sites, final))
+
+
+def replay(records):
+    """Run every recorded (site, model) pair through the client and extraction."""
+    results = {}
+    for record in records:
+        response = pipeline.call_llm("sk-replay", record["prompt"], use_cache=False,
+                                     response_format=RESPONSE_FORMAT if record["structured"] else None,
+                                     model=record["model"])
+        keywords, method = pipeline.keywords_from_response(response, record["structured"])
+        results[(record["root_domain"], record["model"])] = {
+            "keywords": keywords,
+            "method": method,
+            "confidence": keyword_confidence(keywords, method, record["root_domain"]),
+            "latency_ms": record["latency_ms"],
+            "cost": token_cost(record["model"], record["prompt_tokens"], 0, record["completion_tokens"]) or 0.0,
+        }
+    return results
+
+
+def routed(results, site, route, threshold):
+    """(models asked, final result, latency, cost) for one site at a threshold."""
+    asked, latency, cost = [], 0, 0.0
+    for model in route:
+        result = results[(site, model)]
+        asked.append(model)
+        latency += result["latency_ms"]
+        cost += result["cost"]
+        if result["confidence"] >= threshold:
+            break
+    return asked, result, latency, cost
+
+
+def report(results, sites, route):
+    reference = route[-1]
+    print(f"{'model':<16}{'extracted':>10}{'confidence':>11}{'p50 ms':>8}{'p95 ms':>8}"
+          f"{'$ / 1k sites':>13}{'agreement':>10}")
+    for model in route:
+        rows = [results[(site, model)] for site in sites]
+        latencies = sorted(row["latency_ms"] for row in rows)
+        p95 = latencies[min(len(latencies) - 1, round(0.95 * (len(latencies) - 1)))]
+        print(f"{model:<16}{sum(bool(row['keywords']) for row in rows) / len(rows):>10.0%}"
+              f"{statistics.mean(row['confidence'] for row in rows):>11.2f}"
+              f"{statistics.median(latencies):>8.0f}{p95:>8.0f}"
+              f"{sum(row['cost'] for row in rows) / len(rows) * 1000:>13.2f}"
+              f"{mean_agreement(results, sites, rows, reference):>10.0%}")
+
+    print(f"\nroute {' -> '.join(route)}, by confidence threshold:")
+    print(f"{'threshold':>10}{'escalated':>11}{'mean ms':>9}{'$ / 1k sites':>13}{'agreement':>10}")
+    for threshold in THRESHOLDS:
+        outcomes = [routed(results, site, route, threshold) for site in sites]
+        marker = "  <- MIN_CONFIDENCE" if threshold == MIN_CONFIDENCE else ""
+        print(f"{threshold:>10.2f}{sum(len(asked) > 1 for asked, *_ in outcomes) / len(sites):>11.0%}"
+              f"{statistics.mean(latency for *_, latency, _ in outcomes):>9.0f}"
+              f"{sum(cost for *_, cost in outcomes) / len(sites) * 1000:>13.2f}"
+              f"{mean_agreement(results, sites, [result for _, result, _, _ in outcomes], reference):>10.0%}"
+              f"{marker}")
+
+    print("\nsites escalated at MIN_CONFIDENCE:")
+    for site in sites:
+        first = results[(site, route[0])]
+        if first["confidence"] < MIN_CONFIDENCE:
+            print(f"  {site:<26}{first['confidence']:.2f}  {', '.join(first['keywords'])}")
+
+
+def check_routing(records, results, sites, route):
+    # The real router must ask the same models as the simulation above
+    by_site = {record["root_domain"]: record for record in records}
+    started = time.perf_counter()
+    for site in sites:
+        record = by_site[site]
+        ReplayHandler.asked = []
+        keywords, _, _, model, _ = pipeline.generate_keywords("sk-replay", site, record["meta_description"],
+                                                              use_cache=False, route=route)
+        asked, result, _, _ = routed(results, site, route, MIN_CONFIDENCE)
+        assert ReplayHandler.asked == asked and model == asked[-1], (site, ReplayHandler.asked, asked)
+        assert keywords == result["keywords"], (site, keywords)
+    elapsed = time.perf_counter() - started
+    print(f"\ngenerate_keywords asked the predicted models for all {len(sites)} sites "
+          f"({elapsed:.2f}s at {TIME_SCALE:g}x recorded latency)")
+
+
+def record(api_key, route):
+    # Re-record every site in the fixtures with each model in the route
+    records = load_records()
+    sites = {record["root_domain"]: record for record in records}
+    with open(FIXTURES, "w", encoding="utf-8") as f:
+        for site in sites.values():
+            for model in route:
+                started = time.perf_counter()
+                response, usage = pipeline._complete(
+                    api_key, site["prompt"], RESPONSE_FORMAT if site["structured"] else None, model=model)
+                latency_ms = round((time.perf_counter() - started) * 1000)
+                entry = {key: site[key] for key in ("root_domain", "meta_description", "structured")}
+                entry.update(model=model, response=response, latency_ms=latency_ms, usage={
+                    "prompt_tokens": pipeline._usage_value(usage, "prompt_tokens"),
+                    "completion_tokens": pipeline._usage_value(usage, "completion_tokens"),
+                })
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                print(f"{site['root_domain']:<26}{model:<14}{latency_ms:>6} ms", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="call the real API and rewrite the fixtures")
+    parser.add_argument("--route", default=",".join(DEFAULT_ROUTE), help="comma-separated models, cheapest first")
+    args = parser.parse_args()
+    route = tuple(model.strip() for model in args.route.split(","))
+
+    if args.record:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            parser.error("set OPENAI_API_KEY")
+        record(api_key, route)
+        return
+
+    records = load_records()
+    for entry in records:
+        usage = entry.get("usage", {})
+        # Responses recorded without prompt usage are counted locally
+        entry["prompt_tokens"] = usage.get("prompt_tokens") or count_tokens(pipeline.SYSTEM_MESSAGE + entry["prompt"])
+        entry["completion_tokens"] = usage.get("completion_tokens") or count_tokens(entry["response"])
+    ReplayHandler.responses = {(entry["model"], entry["prompt"]): entry for entry in records}
+    sites = sorted({entry["root_domain"] for entry in records})
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ReplayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    get_openai_client("sk-replay").base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    results = replay(records)
+    report(results, sites, route)
+    check_routing(records, results, sites, route)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Benchmark: near-duplicate reuse with the local embeddings.
+
+Builds a synthetic prospect list: for each niche, STORES_PER_NICHE stores
+describe its products in one of the store-theme TEMPLATES, each leaving out
+one product, listing the rest in its own order and adding its own name and
+prices, the way stores on the same theme and supplier feed do. Some niches are
+deliberately close (dog and cat supplies, road and mountain bikes, coffee and
+tea), and every template is shared across niches.
+
+Stores are analyzed in a shuffled order. For each similarity threshold, a store
+whose nearest indexed neighbour is at least that similar reuses its keywords,
+and any other store is analyzed and indexed. Reports how many stores reuse
+keywords, and how many of those took them from another niche, next to the
+highest similarity between any two stores in different niches.
+
+Then fills an index to MAX_ENTRIES in a SQLite file and times adding, looking
+up and reloading it, and checks through a local stub endpoint that
+``generate_keywords`` makes one full call, no call or one short adapt call for
+a near-duplicate depending on the reuse mode.
+
+    python benchmarks/bench_similar.py
+"""
+
+import http.server
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep the benchmark's sites and responses out of the real index and cache
+os.environ["PROSPECTING_KEYWORDS_CACHE"] = ""
+os.environ["PROSPECTING_KEYWORDS_SIMILAR"] = ""
+
+from prospecting_keywords import pipeline  # noqa: E402
+from prospecting_keywords.clients import get_openai_client  # noqa: E402
+from prospecting_keywords.prompt import build_adapt_prompt, build_prompt, count_tokens  # noqa: E402
+from prospecting_keywords.similar import (  # noqa: E402
+    MAX_ENTRIES,
+    SIMILARITY_THRESHOLD,
+    SimilarityIndex,
+    get_similarity_index,
+    local_embedding,
+)
+
+NICHES = {
+    "dog": ["dog toys", "dog beds", "natural dog treats", "dog collars", "dog leads"],
+    "cat": ["cat toys", "cat beds", "scratching posts", "cat collars", "cat treats"],
+    "road bikes": ["road bikes", "carbon wheels", "cycling shoes", "bib shorts", "bike computers"],
+    "mountain bikes": ["mountain bikes", "full suspension frames", "trail helmets", "knee pads", "tubeless tyres"],
+    "coffee": ["specialty coffee beans", "espresso machines", "coffee grinders", "pour over kettles",
+               "milk frothers"],
+    "tea": ["loose leaf tea", "matcha powder", "tea infusers", "teapots", "herbal blends"],
+    "candles": ["scented candles", "wax melts", "reed diffusers", "candle wicks", "soy wax"],
+    "skincare": ["vitamin c serum", "face moisturiser", "retinol cream", "sunscreen", "cleansing balm"],
+    "yoga": ["yoga mats", "yoga blocks", "meditation cushions", "yoga straps", "leggings"],
+    "vinyl": ["vinyl records", "turntables", "record sleeves", "stylus cartridges", "record cleaning kits"],
+    "fasteners": ["stainless bolts", "wall anchors", "hex nuts", "self tapping screws", "threaded rod"],
+    "solar": ["portable solar panels", "power stations", "charge controllers", "lithium batteries",
+              "camper van kits"],
+    "homebrew": ["beer brewing kits", "hops", "fermenters", "malt extract", "brewing yeast"],
+    "running": ["trail running shoes", "hydration vests", "running socks", "gps watches", "headlamps"],
+    "baby": ["baby carriers", "muslin swaddles", "teething toys", "nursery bedding", "changing bags"],
+    "garden": ["raised garden beds", "seed potatoes", "compost bins", "pruning shears", "plant feed"],
+    "knitting": ["merino yarn", "knitting needles", "crochet hooks", "knitting patterns", "stitch markers"],
+    "fishing": ["fishing rods", "carp bait", "fishing reels", "tackle boxes", "bite alarms"],
+    "aquarium": ["aquarium filters", "tropical fish food", "aquarium heaters", "live plants", "water test kits"],
+    "wine": ["natural wine", "wine glasses", "decanters", "wine racks", "corkscrews"],
+}
+TEMPLATES = (
+    "Shop {products} at {brand}. Free UK delivery on orders over £{price}.",
+    "{brand} | {products} | Free shipping over ${price} | Easy 30-day returns",
+    "Discover our range of {products}. {brand}: free delivery on all orders over £{price}, next day available.",
+    "Welcome to {brand}, your online store for {products}. Save {percent}% on your first order today.",
+)
+STORES_PER_NICHE = 6
+THRESHOLDS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9)
+SYLLABLES = ("ba", "lo", "ki", "ru", "mo", "ze", "ta", "vi", "no", "pe", "sa", "do")
+
+
+def brand(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize() + rng.choice(("", " Co", " & Co", "ly"))
+
+
+def corpus(seed=1):
+    """[(niche, root_domain, description)] in the order they are analyzed."""
+    rng = random.Random(seed)
+    stores = []
+    for niche, products in NICHES.items():
+        for i in range(STORES_PER_NICHE):
+            chosen = rng.sample(products, len(products) - 1)
+            description = rng.choice(TEMPLATES).format(
+                products=", ".join(chosen[:-1]) + " and " + chosen[-1], brand=brand(rng),
+                price=rng.choice((25, 30, 40, 50, 75)), percent=rng.choice((10, 15, 20)))
+            stores.append((niche, f"{niche.replace(' ', '')}{i}.com", description))
+    rng.shuffle(stores)
+    return stores
+
+
+def sweep(stores):
+    vectors = {domain: local_embedding(description) for _, domain, description in stores}
+    closest = max(float(vectors[a[1]] @ vectors[b[1]]) for a in stores for b in stores if a[0] != b[0])
+    print(f"{len(stores)} stores in {len(NICHES)} niches, {len(TEMPLATES)} shared templates; "
+          f"stores in different niches are at most {closest:.2f} similar\n")
+    print(f"{'threshold':>10}{'reused':>9}{'full prompts':>14}{'wrong niche':>13}")
+    for threshold in THRESHOLDS:
+        index = SimilarityIndex(":memory:", max_entries=len(stores))
+        niche_of = {}
+        reused = wrong = 0
+        for niche, domain, description in stores:
+            similar = index.nearest(vectors[domain], threshold)
+            if similar is None:
+                index.add(domain, description, [], "", vectors[domain])
+                niche_of[domain] = niche
+                continue
+            reused += 1
+            wrong += niche_of[similar["root_domain"]] != niche
+        marker = "  <- SIMILARITY_THRESHOLD" if threshold == SIMILARITY_THRESHOLD else ""
+        print(f"{threshold:>10.2f}{reused / len(stores):>9.0%}{len(stores) - reused:>14}{wrong:>13}{marker}")
+
+
+def at_capacity(directory):
+    # Random descriptions from every niche's products, to fill the index to its cap
+    rng = random.Random(2)
+    words = [word for products in NICHES.values() for product in products for word in product.split()]
+    texts = [" ".join(rng.choices(words, k=12)) for _ in range(MAX_ENTRIES)]
+    started = time.perf_counter()
+    vectors = [local_embedding(text) for text in texts]
+    embed_us = (time.perf_counter() - started) / len(texts) * 1e6
+
+    path = os.path.join(directory, "similar.sqlite3")
+    index = SimilarityIndex(path)
+    started = time.perf_counter()
+    for i, (text, vector) in enumerate(zip(texts, vectors)):
+        index.add(f"site{i}.com", text, ["keyword"] * 5, "gpt-4o", vector)
+    add_us = (time.perf_counter() - started) / len(texts) * 1e6
+
+    timings = []
+    for vector in vectors[:500]:
+        started = time.perf_counter()
+        index.nearest(vector, exclude="")
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    started = time.perf_counter()
+    index.add("one-more.com", texts[0], ["keyword"] * 5, "gpt-4o", vectors[0])
+    evict_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    reloaded = SimilarityIndex(path)
+    reload_s = time.perf_counter() - started
+    assert len(reloaded) == MAX_ENTRIES and "one-more.com" in reloaded._positions
+
+    print(f"\nindex at MAX_ENTRIES ({MAX_ENTRIES} sites, {index._vectors.nbytes / 2 ** 20:.0f} MB of vectors, "
+          f"{os.path.getsize(path) / 2 ** 20:.0f} MB on disk)")
+    print(f"  embed {embed_us:.0f} us, add {add_us:.0f} us, add with eviction {evict_ms:.1f} ms")
+    print(f"  lookup p50 {statistics.median(timings):.2f} ms, p95 {timings[int(0.95 * len(timings))]:.2f} ms")
+    print(f"  reload from SQLite {reload_s:.2f}s")
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The full prompt gets JSON output, the adapt prompt tagged text
+    FULL = json.dumps({f"step_{step}_keywords": ["dog toys", "dog beds", "dog treats", "dog collars", "dog leads"]
+                       for step in range(1, 6)})
+    ADAPTED = "<step_5_keywords>\n1. dog toys\n2. dog beds\n3. dog treats\n4. dog harnesses\n5. dog leads\n" \
+              "</step_5_keywords>"
+    prompts = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubHandler.prompts.append(body["messages"][-1]["content"])
+        content = self.FULL if "response_format" in body else self.ADAPTED
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for chunk in ({"choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]},
+                      {"choices": [], "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}):
+            chunk.update(id="chatcmpl-stub", object="chat.completion.chunk", created=0, model=body["model"])
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def check_reuse_modes():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    get_openai_client("sk-stub").base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    first = "Shop dog toys, dog beds, natural dog treats and dog collars at Barkly. Free UK delivery over £40."
+    second = "Shop dog beds, dog toys, dog leads and natural dog treats at Woofco. Free UK delivery over £30."
+
+    full_tokens = count_tokens(pipeline.SYSTEM_MESSAGE + build_prompt("woofco.com", second, structured=True))
+    adapt_tokens = count_tokens(pipeline.SYSTEM_MESSAGE + build_adapt_prompt("woofco.com", second,
+                                                                             ["dog toys"] * 5))
+    print(f"\nprompt tokens: full {full_tokens}, adapt {adapt_tokens} ({1 - adapt_tokens / full_tokens:.0%} fewer)")
+
+    pipeline.generate_keywords("sk-stub", "barkly.com", first, reuse=pipeline.REUSE_KEYWORDS)
+    assert len(get_similarity_index()) == 1
+    for reuse, calls, method in ((pipeline.REUSE_OFF, 1, "json"), (pipeline.REUSE_KEYWORDS, 0, pipeline.METHOD_REUSED),
+                                 (pipeline.REUSE_ADAPT, 1, "step_5_tag")):
+        StubHandler.prompts = []
+        keywords, found, _, model, similar = pipeline.generate_keywords("sk-stub", "woofco.com", second, reuse=reuse)
+        assert len(StubHandler.prompts) == calls and found == method, (reuse, StubHandler.prompts, found)
+        assert (similar is None) == (reuse == pipeline.REUSE_OFF), (reuse, similar)
+        source = f"from {similar['root_domain']} ({similar['similarity']:.2f})" if similar else "full prompt"
+        print(f"  reuse={reuse:<9} {calls} call(s), {found:<11} {source}: {', '.join(keywords)}")
+
+
+def main():
+    sweep(corpus())
+    with tempfile.TemporaryDirectory() as directory:
+        at_capacity(directory)
+    check_reuse_modes()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark for streamed GPT-4o responses.
+
+Runs a local fake SSE ``/v1/chat/completions`` endpoint that writes one token
+every TOKEN_DELAY seconds, and times the real client code with and without
+streaming: when the first and last keyword appear, when the call returns, and
+how many tokens the server sent before the client hung up. tests/test_streaming.py
+checks the incremental extractor and that both calls give the same keywords.
+
+    python benchmarks/bench_streaming.py
+"""
+
+import http.server
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep the benchmark's responses out of the real cache
+os.environ["PROSPECTING_KEYWORDS_CACHE"] = ""
+
+from prospecting_keywords import pipeline  # noqa: E402
+from prospecting_keywords.clients import get_openai_client  # noqa: E402
+from prospecting_keywords.structured import RESPONSE_FORMAT, STEP_KEYS  # noqa: E402
+
+TOKEN_DELAY = 0.004
+TOKEN = re.compile(r'\s*\S{1,4}|\s+')
+
+TEXT_RESPONSE = "".join(
+    f"<step_{step}_keywords>\n" + "".join(f"{i}. [Keyword {step}.{i}]\n" for i in range(1, 4))
+    + f"</step_{step}_keywords>\n" for step in range(1, 5)
+) + (
+    "<step_5_keywords>\n1. [Dog Treats]\n2. [Chew Toys]\n3. [Dog Collars]\n4. [Pet Food]\n5. [Pet Supplies]\n"
+    "</step_5_keywords>\n\n"
+    + "These keywords target pet blogs that review treats, toys and accessories for dog owners. " * 8
+)
+JSON_RESPONSE = json.dumps(
+    {key: [f"keyword {step}.{i}" for i in range(1, 4)] for step, key in enumerate(STEP_KEYS[:-1], 1)}
+    | {STEP_KEYS[-1]: ["dog treats", "chew toys", "dog collars", "pet food", "pet supplies"]}
+)
+
+
+class SSEHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    tokens_sent = 0
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = JSON_RESPONSE if "response_format" in body else TEXT_RESPONSE
+        tokens = TOKEN.findall(content)
+        usage = {"prompt_tokens": 400, "completion_tokens": len(tokens), "total_tokens": 400 + len(tokens)}
+        SSEHandler.tokens_sent = 0
+
+        if not body.get("stream"):
+            time.sleep(TOKEN_DELAY * len(tokens))
+            SSEHandler.tokens_sent = len(tokens)
+            data = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, chunk_usage=None):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                     "model": body["model"], "choices": choices, "usage": chunk_usage}
+            self._write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+
+        try:
+            for token in tokens:
+                time.sleep(TOKEN_DELAY)
+                event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                SSEHandler.tokens_sent += 1
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if body.get("stream_options", {}).get("include_usage"):
+                event([], usage)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def timed_call(structured, stream):
+    pipeline.STREAM_RESPONSES = stream
+    marks = {}
+    start = time.perf_counter()
+
+    def on_progress(text, keywords):
+        if keywords:
+            marks.setdefault("first", time.perf_counter() - start)
+        if len(keywords) == 5:
+            marks.setdefault("all", time.perf_counter() - start)
+
+    response_format = RESPONSE_FORMAT if structured else None
+    text = pipeline.call_llm("sk-stub", "prompt", use_cache=False, response_format=response_format,
+                             on_progress=on_progress)
+    elapsed = time.perf_counter() - start
+    time.sleep(TOKEN_DELAY * 3)
+    keywords, method = pipeline.keywords_from_response(text, structured)
+    # Without streaming, nothing shows until the call returns
+    return keywords, method, marks.get("first", elapsed), marks.get("all", elapsed), elapsed, SSEHandler.tokens_sent
+
+
+def main():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SSEHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = get_openai_client("sk-stub")
+    client.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    print(f"{'':<22}{'first kw':>10}{'all 5 kw':>10}{'returned':>10}{'tokens':>8}")
+    for structured in (False, True):
+        label = "json" if structured else "text"
+        for stream in (False, True):
+            _, _, first, all_five, elapsed, tokens = timed_call(structured, stream)
+            mode = "streamed" if stream else "blocking"
+            print(f"{label + ' ' + mode:<22}{first * 1000:>8.0f}ms{all_five * 1000:>8.0f}ms"
+                  f"{elapsed * 1000:>8.0f}ms{tokens:>8}")
+
+
+if __name__ == "__main__":
+    main()
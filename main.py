@@ -1,9 +1,79 @@
+import importlib.util
+import io
+import time
+from collections import deque
+
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
-from openai import OpenAI
-import re
+
+from prospecting_keywords.batch import (
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_LLM_CONCURRENCY,
+    ROW_STATES,
+    STATE_FAILED,
+    parse_url_list,
+    read_url_csv,
+    row_to_record,
+)
+from prospecting_keywords.cache import clear_all as clear_cache
+from prospecting_keywords.domains import group_by_domain
+from prospecting_keywords.jobs import get_job_store, run_job
+from prospecting_keywords.meta import (
+    META_SOURCES,
+    SOURCE_HEADINGS,
+    SOURCE_JSON_LD,
+    SOURCE_PARAGRAPHS,
+    SOURCE_TITLE,
+)
+from prospecting_keywords.metrics import recording, registry, waterfall
+from prospecting_keywords.pipeline import (
+    METHOD_REUSED,
+    OUTPUT_FORMATS,
+    REUSE,
+    REUSE_ADAPT,
+    REUSE_KEYWORDS,
+    REUSE_OFF,
+    STRUCTURED_OUTPUT,
+    average_completion_tokens,
+    extract_root_domain,
+    fallback_description,
+    fetch_page_description,
+    generate_keywords,
+    usage_totals,
+)
+from prospecting_keywords.structured import METHOD_JSON
+
+SOURCE_LABELS = {
+    SOURCE_TITLE: "title",
+    SOURCE_JSON_LD: "structured data",
+    SOURCE_HEADINGS: "headings",
+    SOURCE_PARAGRAPHS: "opening paragraphs",
+}
+# Rows shown in the live table while a bulk job runs
+RECENT_ROWS = 200
+REUSE_LABELS = {
+    REUSE_OFF: "Always run the full prompt",
+    REUSE_KEYWORDS: "Reuse their keywords",
+    REUSE_ADAPT: "Adapt their keywords (short prompt)",
+}
+
+
+def export_csv_text(job_store, job_id):
+    output = io.StringIO()
+    job_store.export_csv(job_id, output)
+    return output.getvalue()
+
+
+def export_parquet_bytes(job_store, job_id):
+    output = io.BytesIO()
+    job_store.export_parquet(job_id, output)
+    return output.getvalue()
+
+
+def export_keyword_index_text(job_store, job_id):
+    output = io.StringIO()
+    job_store.export_keyword_index(job_id, output)
+    return output.getvalue()
+
 
 # Set page configuration
 st.set_page_config(
@@ -16,196 +86,162 @@ st.set_page_config(
 st.title("Link Building Prospecting Keywords Tool")
 st.markdown("Generate targeted prospecting keywords for link building based on a website's meta description.")
 
+# Cached pages and GPT-4o responses are reused across reruns and restarts
+with st.sidebar:
+    st.subheader("Cache")
+    if st.button("Clear cached results"):
+        clear_cache()
+        st.success("Cache cleared.")
+
+    st.subheader("Output format")
+    structured = st.checkbox("Structured JSON output", value=STRUCTURED_OUTPUT,
+                             help="Ask GPT-4o for a JSON object instead of tagged step-by-step lists.")
+
+    # The similarity index needs the optional numpy package
+    reuse = REUSE_OFF
+    if importlib.util.find_spec("numpy") is not None:
+        st.subheader("Near-duplicate sites")
+        reuse = st.selectbox("For sites nearly identical to one already analyzed:", list(REUSE_LABELS),
+                             index=list(REUSE_LABELS).index(REUSE), format_func=REUSE_LABELS.get)
+
+    # Average completion tokens per uncached call, per output format
+    averages = {fmt: average_completion_tokens(fmt) for fmt in OUTPUT_FORMATS}
+    for fmt, average in averages.items():
+        if average is not None:
+            st.caption(f"{fmt.upper()} output: {average:.0f} completion tokens per call")
+    if averages["json"] is not None and averages["text"]:
+        saved = averages["text"] - averages["json"]
+        st.caption(f"JSON output saves {saved:.0f} tokens per call ({saved / averages['text']:.0%}).")
+    prompt_tokens = sum(totals["prompt_tokens"] for totals in usage_totals.values())
+    if prompt_tokens:
+        cached_tokens = sum(totals["cached_tokens"] for totals in usage_totals.values())
+        st.caption(f"{cached_tokens / prompt_tokens:.0%} of prompt tokens served from OpenAI's prompt cache.")
+
+    # Stage latencies across every session served by this process
+    latency = registry.latency_summary()
+    if latency:
+        with st.expander("Stage latency (p50 / p95)"):
+            st.dataframe([{"stage": stage["stage"], "calls": stage["count"],
+                           "p50 ms": round(stage["p50_ms"], 1), "p95 ms": round(stage["p95_ms"], 1)}
+                          for stage in latency], hide_index=True, width="stretch")
+            methods = registry.counter_values("extraction_method_total")
+            if methods:
+                st.caption("Extraction methods: " + ", ".join(
+                    f"{dict(labels)['method']} {count}" for labels, count in sorted(methods.items())))
+            st.download_button("Download metrics (Prometheus)", registry.prometheus_text(),
+                               file_name="prospecting_metrics.txt", mime="text/plain")
+
+# Choose between a single URL and a bulk list
+mode = st.radio("Mode:", ["Single URL", "Bulk"], horizontal=True)
+
 # Create two columns for input
 col1, col2 = st.columns(2)
 
 # Input for URL and API key
 with col1:
-    url = st.text_input("Enter a URL to analyze:", placeholder="https://example.com")
-    
+    if mode == "Single URL":
+        url = st.text_input("Enter a URL to analyze:", placeholder="https://example.com")
+        refresh = st.button("Re-analyze without cache")
+    else:
+        url = ""
+        uploaded_file = st.file_uploader("Upload a CSV of URLs:", type=["csv", "txt"])
+        pasted_urls = st.text_area("...or paste one URL per line:", height=150)
+        refresh = st.checkbox("Skip cached results")
+
 with col2:
     api_key = st.text_input("Enter your OpenAI API key:", type="password", placeholder="sk-...")
+    if mode == "Bulk":
+        fetch_concurrency = st.number_input("Concurrent page fetches:", min_value=1, max_value=64,
+                                            value=DEFAULT_FETCH_CONCURRENCY)
+        llm_concurrency = st.number_input("Concurrent GPT-4o calls:", min_value=1, max_value=32,
+                                          value=DEFAULT_LLM_CONCURRENCY)
 
 # Process when both inputs are provided
 if url and api_key:
     # Create a container for results with a spinner
-    with st.spinner("Processing URL and generating keywords..."):
+    spans = []
+    with st.spinner("Processing URL and generating keywords..."), recording(spans):
         try:
             # Extract root domain
-            parsed_url = urlparse(url)
-            root_domain = parsed_url.netloc
-            if root_domain.startswith('www.'):
-                root_domain = root_domain[4:]
-            
+            root_domain = extract_root_domain(url)
             st.write(f"Root Domain: **{root_domain}**")
-            
-            # Scrape meta description
-            response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            meta_description = ""
-            
-            # Try different meta tags to find description
-            meta_tags = [
-                soup.find('meta', attrs={'name': 'description'}),
-                soup.find('meta', attrs={'property': 'og:description'}),
-                soup.find('meta', attrs={'name': 'twitter:description'})
-            ]
-            
-            for meta_tag in meta_tags:
-                if meta_tag and meta_tag.get('content'):
-                    meta_description = meta_tag.get('content')
-                    break
-            
-            if meta_description:
+
+            # Scrape meta description, or the best text the page has instead
+            meta_description, source = fetch_page_description(url, use_cache=not refresh)
+
+            if source in META_SOURCES:
                 st.write("**Meta Description:**")
                 st.info(meta_description)
+            elif meta_description:
+                st.write(f"**Description** (no meta description; taken from the page's {SOURCE_LABELS[source]}):")
+                st.info(meta_description)
             else:
-                st.warning("No meta description found for this URL. Using domain name only.")
-                meta_description = f"Website with domain {root_domain}"
-            
-            # Create prompt for GPT-4o
-            prompt = f"""# Task Instructions 
-You are a Link Builder for {root_domain}. Your task is to create a list of 5 prospecting keywords that, when searched in Google, will help you find blogs and websites that are relevant to {root_domain}'s products. These blogs should be potential candidates for link building opportunities.
-First, review the website's meta description to better understand the website's products and industry.
-<meta_description>
-{meta_description}
-</meta_description>
-Next, follow these instructions step-by-step. 
-Step 1. Identify the 3 most relevant keywords that describe the website's main top-level categories.
-Step 2. Identify the 3 most relevant keywords that describe the website's specific product categories.
-Step 3. Identify the 3 most relevant keywords that describe the website's broader categories.
-Step 4. Identify the 3 most relevant industry the website belongs to.
-Step 5. Review the final list of all keywords and select just the top 5 most relevant keywords that would match relevant article titles.
-Guidelines
- - All keywords must be short and only contain 1-2 words so they can match more relevant articles.
- - Skip any overly general keywords that could return irrelevant blogs and websites for a different search intent.
- - Avoid the use of adjectives (cheap, used, etc.). 
- - Avoid overly generic terms or common words that have multiple meanings/applications and could match irrelevant articles (equipment, tools, DIY, solutions).
-# Output Format 
-Provide a separate list for each of the steps above. Present your list of keywords in the following format:
-<step_1_keywords>
-1. [Keyword 1]
-2. [Keyword 2]
-3. [Keyword 3]
-...
-</step_1_keywords>
-<step_2_keywords>
-1. [Keyword 1]
-2. [Keyword 2]
-3. [Keyword 3]
-...
-</step_2_keywords>
-Remember to focus on keywords that will help you find relevant articles that are likely to be interested in the client's products and could potentially become link building partners.
-"""
-            
-            # Make OpenAI API call
-            try:
-                # For newer versions of OpenAI Python library
-                client = OpenAI(api_key=api_key)
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful link building assistant."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-            except TypeError:
-                # For older versions of OpenAI Python library
-                import openai
-                openai.api_key = api_key
-                response = openai.ChatCompletion.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful link building assistant."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                response.choices[0].message = type('obj', (object,), {
-                    'content': response.choices[0].message.content
-                })
-            
-            # Extract response
-            gpt_response = response.choices[0].message.content
-            
-            # Extract keywords using multiple fallback methods
-            keywords = []
-            
-            # Method 1: Try to extract from step_5_keywords tags
-            step_5_pattern = r'<step_5_keywords>(.*?)</step_5_keywords>'
-            final_keywords_match = re.search(step_5_pattern, gpt_response, re.DOTALL)
-            
-            if final_keywords_match:
-                final_keywords_text = final_keywords_match.group(1).strip()
-                lines = final_keywords_text.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line and re.match(r'^\d+\.', line):
-                        # Extract keyword - try with brackets format first
-                        keyword_match = re.search(r'\[(.*?)\]', line)
-                        if keyword_match:
-                            keywords.append(keyword_match.group(1).strip())
-                        else:
-                            # If no brackets, just take what's after the number and period
-                            keyword = re.sub(r'^\d+\.\s*', '', line).strip()
-                            keywords.append(keyword)
-            
-            # Method 2: Look for "Step 5" or "Top 5" heading if no keywords found yet
-            if not keywords:
-                # Various patterns to match step 5 section
-                step5_patterns = [
-                    r'Step 5[\s\-\:\.]+([^#]+)',
-                    r'top 5 most relevant keywords[\s\-\:\.]+([^#]+)', 
-                    r'final list of.*?keywords[\s\-\:\.]+([^#]+)'
-                ]
-                
-                for pattern in step5_patterns:
-                    match = re.search(pattern, gpt_response, re.IGNORECASE | re.DOTALL)
-                    if match:
-                        section_text = match.group(1).strip()
-                        lines = section_text.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if line and re.match(r'^\d+[\.\)]', line):
-                                # Try extracting with various formats
-                                keyword_match = re.search(r'\[(.*?)\]', line)
-                                if keyword_match:
-                                    keywords.append(keyword_match.group(1).strip())
-                                else:
-                                    # Extract what's after the number and period/parenthesis
-                                    keyword = re.sub(r'^\d+[\.\)]\s*', '', line).strip()
-                                    # Remove other formatting like quotes or extra brackets
-                                    keyword = re.sub(r'^["\'`\[]|["\'`\]]
-                
-                # Display results
-                st.subheader("Top 5 Prospecting Keywords:")
-                
-                if keywords:
-                    # Create columns for keyword display
-                    keyword_cols = st.columns(5)
-                    for i, kw in enumerate(keywords):
-                        with keyword_cols[i]:
-                            st.metric(f"Keyword {i+1}", kw)
-                    
-                    # Show comma-separated list
-                    st.success(", ".join(keywords))
-                    
-                    # Create a download button for the keywords
-                    st.download_button(
-                        label="Download Keywords as CSV",
-                        data=",".join(keywords),
-                        file_name=f"{root_domain}_keywords.csv",
-                        mime="text/csv"
-                    )
+                st.warning("No meta description or page text found for this URL. Using domain name only.")
+                meta_description = fallback_description(root_domain)
+
+            # Display results; the keyword tiles fill in while GPT-4o is still writing
+            st.subheader("Top 5 Prospecting Keywords:")
+            keyword_tiles = [col.empty() for col in st.columns(5)]
+            live_response = st.empty()
+            shown = {"keywords": 0, "rendered_at": 0.0}
+
+            def show_progress(text, partial_keywords):
+                # Starts again from nothing when the answer goes to a bigger model
+                if len(partial_keywords) < shown["keywords"]:
+                    for tile in keyword_tiles:
+                        tile.empty()
+                    shown["keywords"] = 0
+                for i in range(shown["keywords"], len(partial_keywords)):
+                    keyword_tiles[i].metric(f"Keyword {i+1}", partial_keywords[i])
+                shown["keywords"] = len(partial_keywords)
+                # Redraw the streamed text a few times a second at most
+                if time.monotonic() - shown["rendered_at"] > 0.1:
+                    live_response.text(text)
+                    shown["rendered_at"] = time.monotonic()
+
+            # Create prompt, make OpenAI API call and extract keywords
+            keywords, method, gpt_response, model, similar = generate_keywords(
+                api_key, root_domain, meta_description, use_cache=not refresh, structured=structured,
+                on_progress=show_progress, reuse=reuse)
+            live_response.empty()
+
+            if keywords:
+                for i, kw in enumerate(keywords):
+                    keyword_tiles[i].metric(f"Keyword {i+1}", kw)
+
+                # Show comma-separated list
+                st.success(", ".join(keywords))
+                if similar is None:
+                    st.caption(f"Answered by {model}")
+                elif method == METHOD_REUSED:
+                    st.caption(f"Reused from {similar['root_domain']} ({similar['similarity']:.0%} similar "
+                               f"description), answered by {model}")
                 else:
-                    st.error("Could not parse keywords from the response.")
-                
+                    st.caption(f"Adapted by {model} from {similar['root_domain']}'s keywords "
+                               f"({similar['similarity']:.0%} similar description)")
+
+                # Create a download button for the keywords
+                st.download_button(
+                    label="Download Keywords as CSV",
+                    data=",".join(keywords),
+                    file_name=f"{root_domain}_keywords.csv",
+                    mime="text/csv"
+                )
+
                 # Show full analysis
                 with st.expander("View complete keyword analysis"):
-                    st.write(gpt_response)
+                    if method == METHOD_JSON:
+                        st.json(gpt_response)
+                    elif method == METHOD_REUSED:
+                        st.write(f"**Description of {similar['root_domain']}:** {similar['meta_description']}")
+                    else:
+                        st.write(gpt_response)
             else:
+                for tile in keyword_tiles:
+                    tile.empty()
                 st.warning("Keyword extraction had limited results. Please check the complete response.")
                 st.text_area("GPT-4o Response for Manual Review:", value=gpt_response, height=300)
-                
+
                 # Add instructions for manual extraction
                 st.info("""
                 It appears the AI didn't format the response as expected. To manually extract keywords:
@@ -213,71 +249,17 @@ Remember to focus on keywords that will help you find relevant articles that are
                 2. Identify numbered lists with short 1-2 word phrases
                 3. Select the 5 most relevant keywords from the response
                 """)
-                
+
                 # Add a form for manual keyword entry
                 with st.form("manual_keywords"):
                     st.subheader("Enter Keywords Manually")
                     manual_keywords = st.text_input("Enter up to 5 keywords separated by commas:")
                     submit_button = st.form_submit_button("Save Keywords")
-                    
-                    if submit_button and manual_keywords:
-                        keywords = [k.strip() for k in manual_keywords.split(",")][:5]
-                        st.success(f"Manually added keywords: {', '.join(keywords)}")
-                        
-                        # Create a download button for the keywords
-                        st.download_button(
-                            label="Download Keywords as CSV",
-                            data=",".join(keywords),
-                            file_name=f"{root_domain}_keywords.csv",
-                            mime="text/csv"
-                        )
-                
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            if "Invalid API key" in str(e):
-                st.warning("Please check your OpenAI API key. Make sure it has access to the GPT-4o model.")
-
-# Add instructions and information
-st.markdown("""
----
-### How to use this tool:
-1. Enter a URL you want to analyze
-2. Provide your OpenAI API key (it's only used for this request and not stored)
-3. The tool will extract the root domain and meta description from the URL
-4. It will generate prospecting keywords using GPT-4o
-5. The results will show the top 5 keywords for link building opportunities
 
-### Requirements:
-- OpenAI API key with access to the GPT-4o model
-- Valid URL with meta description (or at least accessible website)
-""")
+                if submit_button and manual_keywords:
+                    keywords = [k.strip() for k in manual_keywords.split(",")][:5]
+                    st.success(f"Manually added keywords: {', '.join(keywords)}")
 
-# Add footer
-st.markdown("---")
-st.markdown("🔗 Link Building Prospecting Keywords Tool | Built with Streamlit + OpenAI")
-, '', keyword).strip()
-                                    if keyword:
-                                        keywords.append(keyword)
-                        break  # Stop after finding the first matching pattern
-            
-            # Method 3: Last resort - look for any numbered list with short entries
-            if not keywords:
-                # Find all numbered lists in the response
-                list_pattern = r'^\d+[\.\)]\s*(.*?)
-                
-                # Display results
-                st.subheader("Top 5 Prospecting Keywords:")
-                
-                if keywords:
-                    # Create columns for keyword display
-                    keyword_cols = st.columns(5)
-                    for i, kw in enumerate(keywords):
-                        with keyword_cols[i]:
-                            st.metric(f"Keyword {i+1}", kw)
-                    
-                    # Show comma-separated list
-                    st.success(", ".join(keywords))
-                    
                     # Create a download button for the keywords
                     st.download_button(
                         label="Download Keywords as CSV",
@@ -285,162 +267,126 @@ st.markdown("🔗 Link Building Prospecting Keywords Tool | Built with Streamlit
                         file_name=f"{root_domain}_keywords.csv",
                         mime="text/csv"
                     )
-                else:
-                    st.error("Could not parse keywords from the response.")
-                
-                # Show full analysis
-                with st.expander("View complete keyword analysis"):
-                    st.write(gpt_response)
-            else:
-                st.error("Could not find the final keywords section in the GPT response.")
-                with st.expander("View GPT response"):
-                    st.write(gpt_response)
-                
+
         except Exception as e:
             st.error(f"An error occurred: {str(e)}")
             if "Invalid API key" in str(e):
                 st.warning("Please check your OpenAI API key. Make sure it has access to the GPT-4o model.")
 
-# Add instructions and information
-st.markdown("""
----
-### How to use this tool:
-1. Enter a URL you want to analyze
-2. Provide your OpenAI API key (it's only used for this request and not stored)
-3. The tool will extract the root domain and meta description from the URL
-4. It will generate prospecting keywords using GPT-4o
-5. The results will show the top 5 keywords for link building opportunities
+    # Where the time went, stage by stage
+    if spans:
+        with st.expander("Timing"):
+            steps = waterfall(spans)
+            st.vega_lite_chart({
+                "data": {"values": [{**step, "label": "  " * step["depth"] + step["stage"]} for step in steps]},
+                "mark": {"type": "bar", "tooltip": True},
+                "encoding": {
+                    "y": {"field": "label", "type": "nominal", "sort": None, "title": None},
+                    "x": {"field": "start_ms", "type": "quantitative", "title": "ms"},
+                    "x2": {"field": "end_ms"},
+                    "color": {"field": "stage", "type": "nominal", "legend": None},
+                },
+            }, width="stretch")
+            st.dataframe([{key: round(value, 1) if isinstance(value, float) else value
+                           for key, value in step.items()} for step in steps],
+                         hide_index=True, width="stretch")
 
-### Requirements:
-- OpenAI API key with access to the GPT-4o model
-- Valid URL with meta description (or at least accessible website)
-""")
+# Bulk mode: run the whole list through the concurrent pipeline, checkpointing
+# each row in the job store so a refresh or restart loses nothing
+if mode == "Bulk":
+    job_store = get_job_store()
 
-# Add footer
-st.markdown("---")
-st.markdown("🔗 Link Building Prospecting Keywords Tool | Built with Streamlit + OpenAI")
+    def run_and_show(job_id, retry_failed=False):
+        total = job_store.unfinished_count(job_id, retry_failed)
+        progress = st.progress(0.0)
+        table = st.empty()
+        # Only the latest rows are kept for the table; the rest are in the store
+        recent = deque(maxlen=RECENT_ROWS)
+        done = 0
+        last_render = 0.0
+        for row in run_job(job_store, job_id, api_key, int(fetch_concurrency), int(llm_concurrency),
+                           use_cache=not refresh, retry_failed=retry_failed, reuse=reuse):
+            done += 1
+            recent.appendleft(row_to_record(row))
+            # Re-render the table at most a few times per second
+            if time.monotonic() - last_render > 0.5 or done == total:
+                progress.progress(min(done / total, 1.0), text=f"{done} / {total} sites done")
+                table.dataframe(list(recent), width="stretch")
+                last_render = time.monotonic()
 
-                all_items = re.findall(list_pattern, gpt_response, re.MULTILINE)
-                
-                # Filter to short entries that are likely keywords (1-3 words)
-                potential_keywords = [item.strip() for item in all_items if len(item.split()) <= 3]
-                
-                # Clean up formatting
-                for item in potential_keywords:
-                    clean_item = re.sub(r'^["\'`\[]|["\'`\]]
-                
-                # Display results
-                st.subheader("Top 5 Prospecting Keywords:")
-                
-                if keywords:
-                    # Create columns for keyword display
-                    keyword_cols = st.columns(5)
-                    for i, kw in enumerate(keywords):
-                        with keyword_cols[i]:
-                            st.metric(f"Keyword {i+1}", kw)
-                    
-                    # Show comma-separated list
-                    st.success(", ".join(keywords))
-                    
-                    # Create a download button for the keywords
-                    st.download_button(
-                        label="Download Keywords as CSV",
-                        data=",".join(keywords),
-                        file_name=f"{root_domain}_keywords.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.error("Could not parse keywords from the response.")
-                
-                # Show full analysis
-                with st.expander("View complete keyword analysis"):
-                    st.write(gpt_response)
-            else:
-                st.error("Could not find the final keywords section in the GPT response.")
-                with st.expander("View GPT response"):
-                    st.write(gpt_response)
-                
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            if "Invalid API key" in str(e):
-                st.warning("Please check your OpenAI API key. Make sure it has access to the GPT-4o model.")
+if mode == "Bulk" and api_key:
+    urls = []
+    if uploaded_file is not None:
+        urls.extend(read_url_csv(uploaded_file.getvalue()))
+    if pasted_urls:
+        urls.extend(parse_url_list(pasted_urls))
 
-# Add instructions and information
-st.markdown("""
----
-### How to use this tool:
-1. Enter a URL you want to analyze
-2. Provide your OpenAI API key (it's only used for this request and not stored)
-3. The tool will extract the root domain and meta description from the URL
-4. It will generate prospecting keywords using GPT-4o
-5. The results will show the top 5 keywords for link building opportunities
+    if urls:
+        # Each site is fetched and analyzed once, however many of its URLs are listed
+        st.caption(f"{len(urls)} URLs on {len(group_by_domain(urls))} unique domains")
 
-### Requirements:
-- OpenAI API key with access to the GPT-4o model
-- Valid URL with meta description (or at least accessible website)
-""")
+    if urls and st.button(f"Analyze {len(urls)} URLs"):
+        name = uploaded_file.name if uploaded_file is not None else f"{len(urls)} pasted URLs"
+        st.session_state["job_id"] = job_store.create_job(urls, structured=structured, name=name)
+        run_and_show(st.session_state["job_id"])
 
-# Add footer
-st.markdown("---")
-st.markdown("🔗 Link Building Prospecting Keywords Tool | Built with Streamlit + OpenAI")
-, '', item).strip()
-                    if clean_item and clean_item not in keywords:
-                        keywords.append(clean_item)
-            
-            # Method 4: If still nothing, try to find any short phrases that look like keywords
-            if not keywords:
-                # Look for phrases in quotes or brackets that are 1-3 words
-                quote_patterns = [r'"([^"]{1,30})"', r"'([^']{1,30})'", r"\[([^\]]{1,30})\]"]
-                for pattern in quote_patterns:
-                    potential_words = re.findall(pattern, gpt_response)
-                    for word in potential_words:
-                        if len(word.split()) <= 3 and word.strip() not in keywords:
-                            keywords.append(word.strip())
-            
-            # Ensure we have only 5 keywords
-            keywords = keywords[:5]
-            
-            # If still no keywords, add debugging message
-            if not keywords:
-                st.warning("Could not automatically extract keywords. Please check the GPT-4o response below and manually identify keywords.")
-                # Display the GPT-4o response for the user to see
-                st.text_area("GPT-4o Response:", value=gpt_response, height=400)
-                
-                # Display results
-                st.subheader("Top 5 Prospecting Keywords:")
-                
-                if keywords:
-                    # Create columns for keyword display
-                    keyword_cols = st.columns(5)
-                    for i, kw in enumerate(keywords):
-                        with keyword_cols[i]:
-                            st.metric(f"Keyword {i+1}", kw)
-                    
-                    # Show comma-separated list
-                    st.success(", ".join(keywords))
-                    
-                    # Create a download button for the keywords
-                    st.download_button(
-                        label="Download Keywords as CSV",
-                        data=",".join(keywords),
-                        file_name=f"{root_domain}_keywords.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.error("Could not parse keywords from the response.")
-                
-                # Show full analysis
-                with st.expander("View complete keyword analysis"):
-                    st.write(gpt_response)
-            else:
-                st.error("Could not find the final keywords section in the GPT response.")
-                with st.expander("View GPT response"):
-                    st.write(gpt_response)
-                
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            if "Invalid API key" in str(e):
-                st.warning("Please check your OpenAI API key. Make sure it has access to the GPT-4o model.")
+if mode == "Bulk":
+    # Saved jobs outlive the session, so an interrupted run can be picked up after a refresh
+    saved_jobs = job_store.jobs()
+    if saved_jobs:
+        st.subheader("Jobs")
+        jobs_by_id = {job["id"]: job for job in saved_jobs}
+        job_ids = list(jobs_by_id)
+
+        def job_label(job_id):
+            job = jobs_by_id[job_id]
+            started = time.strftime("%Y-%m-%d %H:%M", time.localtime(job["created_at"]))
+            status = "finished" if job["finished"] else "unfinished"
+            return f"{job['name']} ({job['total']} URLs, {status}) - {started}"
+
+        current = st.session_state.get("job_id")
+        selected = st.selectbox("Job:", job_ids, index=job_ids.index(current) if current in job_ids else 0,
+                                format_func=job_label)
+        job = jobs_by_id[selected]
+        st.caption(" · ".join(f"{job['counts'].get(state, 0)} {state}" for state in ROW_STATES))
+
+        failed = job["counts"].get(STATE_FAILED, 0)
+        resume_col, retry_col = st.columns(2)
+        if not job["finished"] and resume_col.button("Resume job", disabled=not api_key):
+            run_and_show(selected)
+            st.rerun()
+        if failed and retry_col.button(f"Re-run {failed} failed rows", disabled=not api_key):
+            run_and_show(selected, retry_failed=True)
+            st.rerun()
+        if not api_key and (failed or not job["finished"]):
+            st.caption("Enter your OpenAI API key to resume this job.")
+
+        # The exports are only built when a button is clicked
+        csv_col, parquet_col, index_col = st.columns(3)
+        with csv_col:
+            st.download_button(
+                label="Download All Keywords as CSV",
+                data=lambda: export_csv_text(job_store, selected),
+                file_name="prospecting_keywords.csv",
+                mime="text/csv"
+            )
+        # Parquet needs the optional pyarrow package
+        if importlib.util.find_spec("pyarrow") is not None:
+            parquet_col.download_button(
+                label="Download as Parquet",
+                data=lambda: export_parquet_bytes(job_store, selected),
+                file_name="prospecting_keywords.parquet",
+                mime="application/octet-stream"
+            )
+        # Each keyword with the domains that share it; needs the optional numpy package
+        if importlib.util.find_spec("numpy") is not None:
+            index_col.download_button(
+                label="Download Keyword Index",
+                data=lambda: export_keyword_index_text(job_store, selected),
+                file_name="prospecting_keyword_index.csv",
+                mime="text/csv",
+                help="Each keyword once, with how many domains share it, their names and search footprints"
+            )
 
 # Add instructions and information
 st.markdown("""
@@ -449,9 +395,30 @@ st.markdown("""
 1. Enter a URL you want to analyze
 2. Provide your OpenAI API key (it's only used for this request and not stored)
 3. The tool will extract the root domain and meta description from the URL
-4. It will generate prospecting keywords using GPT-4o
+4. It will generate prospecting keywords with a fast model, handing over to GPT-4o when the first
+   answer looks weak, and show the response as it is written
 5. The results will show the top 5 keywords for link building opportunities
 
+For client lists, switch to **Bulk** mode and upload a CSV (or paste a list) of URLs. Rows are
+fetched and analyzed concurrently, shown in the table as they finish, and exported as one CSV
+(or Parquet). Each row is saved as it goes, so if the page is refreshed or the server restarts,
+pick the job under **Jobs** and resume it; failed rows can be re-run on their own.
+URLs on the same domain (e.g. `shop.example.co.uk` and `www.example.co.uk`) are analyzed once.
+
+Fetched meta descriptions are cached for an hour and GPT-4o responses are cached until cleared, so
+reruns and repeat analyses of the same site don't call OpenAI again.
+
+Pages without a meta description are described by their title, structured data, headings or opening
+paragraphs instead; the CSV records which one was used in `description_source`.
+
+Under **Near-duplicate sites** in the sidebar, a site whose description is nearly the same as one
+already analyzed can take that site's keywords, or have them adapted in a much shorter prompt; the
+CSV names the site they came from in `reused_from`.
+
+Keywords are lowercased and cleaned of numbering, quotes and brackets, and variants of one keyword
+(e.g. "dog toy" and "Dog Toys") count once per site. **Download Keyword Index** lists every keyword of
+a job once, with how many domains share it, which ones, and search footprints for finding prospects.
+
 ### Requirements:
 - OpenAI API key with access to the GPT-4o model
 - Valid URL with meta description (or at least accessible website)
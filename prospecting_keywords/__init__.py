@@ -0,0 +1 @@
+"""Link building prospecting keywords: the scrape -> prompt -> GPT-4o -> extraction pipeline."""
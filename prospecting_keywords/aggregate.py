@@ -0,0 +1,221 @@
+"""Keywords across a batch: which domains share each keyword, and how many.
+
+A ``KeywordIndex`` takes the (domain, keywords) results of a job and keeps one
+row per keyword as two integer columns, domain and spelling ids, with each
+distinct domain and spelling stored once and mapped to its keyword. Each distinct
+spelling is cleaned and keyed (see postprocess.py) the first time it is seen,
+so a million keyword rows with a few thousand distinct spellings cost a few
+thousand normalizations. Counting then runs on the columns with NumPy:
+
+- a domain counts once per keyword, however many of its URLs or spellings
+  gave it
+- the inverted index is the (keyword, domain) pairs sorted by keyword, with an
+  offset per keyword into them
+- each keyword is shown in its most common spelling
+
+``export_csv`` writes one line per keyword, the most widespread first, with its
+domain count and share, its spellings, example domains and search footprints:
+queries that find pages likely to take a link for that keyword.
+
+Needs NumPy: ``pip install prospecting-keywords[aggregate]``.
+"""
+
+import csv
+from array import array
+
+import numpy as np
+
+from .postprocess import clean_keyword, keyword_key
+
+# Search queries for link prospects on a keyword; {keyword} is filled in
+FOOTPRINTS = (
+    '"{keyword}" "write for us"',
+    '"{keyword}" intitle:"guest post"',
+    '"{keyword}" inurl:resources',
+    '"{keyword}" "submit a site"',
+)
+# Domains listed per keyword in the export; the count covers them all
+MAX_EXAMPLE_DOMAINS = 20
+AGGREGATE_COLUMNS = ["keyword", "domains", "domain_share", "spellings", "example_domains", "footprints"]
+# Spelling id for something that cleaned down to nothing, e.g. "Keyword 1"
+DROPPED = -1
+# Rows per step when deduplicating the (keyword, domain) pairs
+BUILD_CHUNK = 65_536
+
+
+def _drop_repeats(pairs):
+    """Move the distinct values of a sorted column to its front; returns how many there are."""
+    kept = 0
+    for start in range(0, len(pairs), BUILD_CHUNK):
+        chunk = pairs[start:start + BUILD_CHUNK]
+        unique = chunk[1:][chunk[1:] != chunk[:-1]]
+        if start == 0 or chunk[0] != pairs[start - 1]:
+            unique = np.concatenate((chunk[:1], unique))
+        # Compacting forwards never overwrites a value not yet read
+        pairs[kept:kept + len(unique)] = unique
+        kept += len(unique)
+    return kept
+
+
+def _split_pairs(pairs, domain_count, key_count):
+    """Domain ids of sorted keyword * domain_count + domain pairs, and the pairs per keyword."""
+    pair_domains = np.empty(len(pairs), dtype=np.uint32)
+    domain_counts = np.zeros(key_count, dtype=np.int64)
+    for start in range(0, len(pairs), BUILD_CHUNK):
+        chunk = pairs[start:start + BUILD_CHUNK]
+        pair_domains[start:start + len(chunk)] = chunk % domain_count
+        domain_counts += np.bincount(chunk // domain_count, minlength=key_count)
+    return pair_domains, domain_counts
+
+
+class KeywordIndex:
+    """Keyword -> domains over a batch's results, in integer columns."""
+
+    def __init__(self):
+        self._domain_ids = {}
+        self.domains = []
+        # Raw keyword as extracted, and its cleaned spelling -> spelling id; one
+        # dict for both, since most keywords come back already clean
+        self._spelling_ids = {}
+        self.spellings = []
+        self._spelling_keys = array("i")
+        self._key_ids = {}
+        self._key_count = 0
+        # One entry per keyword row
+        self._row_domains = array("I")
+        self._row_spellings = array("I")
+        self._built = None
+
+    def __len__(self):
+        return len(self._row_domains)
+
+    def _spelling_id(self, raw):
+        spelling_id = self._spelling_ids.get(raw)
+        if spelling_id is None:
+            # Cleaning is idempotent, so a raw keyword equal to a cleaned spelling maps to it
+            cleaned = clean_keyword(raw)
+            key = keyword_key(cleaned)
+            if not cleaned or not key:
+                spelling_id = DROPPED
+            else:
+                # Unchanged text keeps the string already held, rather than a copy
+                cleaned = raw if cleaned == raw else cleaned
+                key = cleaned if key == cleaned else key
+                spelling_id = self._spelling_ids.get(cleaned)
+                if spelling_id is None:
+                    spelling_id = self._spelling_ids[cleaned] = len(self.spellings)
+                    self.spellings.append(cleaned)
+                    key_id = self._key_ids.get(key)
+                    if key_id is None:
+                        key_id = self._key_ids[key] = self._key_count
+                        self._key_count += 1
+                    self._spelling_keys.append(key_id)
+            self._spelling_ids[raw] = spelling_id
+        return spelling_id
+
+    def add(self, domain, keywords):
+        """Add one domain's keywords."""
+        domain_id = self._domain_ids.get(domain)
+        if domain_id is None:
+            domain_id = self._domain_ids[domain] = len(self.domains)
+            self.domains.append(domain)
+        for keyword in keywords:
+            spelling_id = self._spelling_id(keyword)
+            if spelling_id != DROPPED:
+                self._row_domains.append(domain_id)
+                self._row_spellings.append(spelling_id)
+        self._built = None
+
+    def add_rows(self, rows):
+        """Add the keywords of result rows (see batch.new_row); rows without any are skipped."""
+        for row in rows:
+            if row.get("keywords") and row.get("root_domain"):
+                self.add(row["root_domain"], row["keywords"])
+        return self
+
+    def _build(self):
+        if self._built is not None:
+            return self._built
+        # Views of the columns, not copies
+        domains = np.frombuffer(self._row_domains, dtype=np.uint32)
+        spellings = np.frombuffer(self._row_spellings, dtype=np.uint32)
+        spelling_keys = np.frombuffer(self._spelling_keys, dtype=np.int32).astype(np.int64)
+        domain_count = max(len(self.domains), 1)
+
+        # One (keyword, domain) pair per domain, sorted by keyword, then domain,
+        # worked out in place in one int64 column. Every other step runs a
+        # chunk at a time: indexing with, or counting, a uint32 column makes an
+        # int64 copy of it, and the column is the only full-length temporary
+        pairs = np.empty(len(spellings), dtype=np.int64)
+        spelling_uses = np.zeros(len(self.spellings), dtype=np.int64)
+        for start in range(0, len(pairs), BUILD_CHUNK):
+            chunk = spellings[start:start + BUILD_CHUNK].astype(np.intp)
+            pairs[start:start + len(chunk)] = spelling_keys[chunk]
+            spelling_uses += np.bincount(chunk, minlength=len(self.spellings))
+        pairs *= domain_count
+        pairs += domains
+        pairs.sort()
+        kept = _drop_repeats(pairs)
+        pair_domains, domain_counts = _split_pairs(pairs[:kept], domain_count, self._key_count)
+        del pairs
+        offsets = np.zeros(self._key_count + 1, dtype=np.int64)
+        np.cumsum(domain_counts, out=offsets[1:])
+
+        # The most used spelling of each keyword: spellings sorted by keyword, most used first
+        order = np.lexsort((-spelling_uses, spelling_keys))
+        ordered_keys = spelling_keys[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = ordered_keys[1:] != ordered_keys[:-1]
+        display = np.empty(self._key_count, dtype=np.int64)
+        display[ordered_keys[first]] = order[first]
+        spelling_counts = np.bincount(spelling_keys, minlength=self._key_count)
+
+        self._built = {"offsets": offsets, "domains": pair_domains, "domain_counts": domain_counts,
+                       "display": display, "spelling_counts": spelling_counts, "spelling_order": order}
+        return self._built
+
+    def domains_for(self, keyword):
+        """The domains that have ``keyword`` or a variant of it, in the order they were added."""
+        key_id = self._key_ids.get(keyword_key(keyword))
+        if key_id is None:
+            return []
+        built = self._build()
+        start, end = built["offsets"][key_id], built["offsets"][key_id + 1]
+        return [self.domains[i] for i in built["domains"][start:end]]
+
+    def top(self, limit=None):
+        """(keyword, domain count) for the most widespread keywords, most domains first."""
+        built = self._build()
+        counts = built["domain_counts"]
+        # Stable, so ties stay in the order the keywords were first seen
+        order = np.argsort(-counts, kind="stable")[:limit]
+        return [(self.spellings[built["display"][key_id]], int(counts[key_id])) for key_id in order]
+
+    def records(self, limit=None, max_domains=MAX_EXAMPLE_DOMAINS):
+        """Yield one export record per keyword, most domains first."""
+        built = self._build()
+        counts = built["domain_counts"]
+        total_domains = len(self.domains)
+        # Each keyword's spellings, in one run per keyword
+        order = built["spelling_order"]
+        spelling_offsets = np.zeros(self._key_count + 1, dtype=np.int64)
+        np.cumsum(built["spelling_counts"], out=spelling_offsets[1:])
+        for key_id in np.argsort(-counts, kind="stable")[:limit]:
+            keyword = self.spellings[built["display"][key_id]]
+            start = built["offsets"][key_id]
+            examples = built["domains"][start:start + min(max_domains, counts[key_id])]
+            spellings = order[spelling_offsets[key_id]:spelling_offsets[key_id + 1]]
+            yield {
+                "keyword": keyword,
+                "domains": int(counts[key_id]),
+                "domain_share": f"{counts[key_id] / total_domains:.4f}",
+                "spellings": " | ".join(self.spellings[i] for i in spellings),
+                "example_domains": " ".join(self.domains[i] for i in examples),
+                "footprints": " | ".join(footprint.format(keyword=keyword) for footprint in FOOTPRINTS),
+            }
+
+    def export_csv(self, f, limit=None, max_domains=MAX_EXAMPLE_DOMAINS):
+        """Write the keyword index to a text file object as CSV."""
+        writer = csv.DictWriter(f, fieldnames=AGGREGATE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(self.records(limit, max_domains))
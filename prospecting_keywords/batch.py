@@ -0,0 +1,357 @@
+"""Bulk mode: run the single-URL pipeline over thousands of URLs concurrently.
+
+Fetching and GPT-4o calls run in two separate thread pools so each stage has its
+own concurrency limit: a fetched row is handed straight to the LLM pool, and
+finished rows are yielded as soon as they complete rather than in input order.
+URLs on the same registrable domain are collapsed before rows are made (see
+jobs.py), so each site is fetched and prompted once and ``fan_out`` copies its
+result to every matching row.
+
+Each row records how far it has got (``state``), so a row loaded back from a
+checkpoint (see jobs.py) carries on from its last finished step. A weak answer
+from a cheaper model sends the row back to be prompted again with the next
+model in the route (see routing.py). With reuse on, a near-duplicate of a site
+already analyzed skips the full prompt (see similar.py).
+"""
+
+import csv
+import io
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import recording
+from .meta import META_SOURCES
+from .pipeline import (
+    METHOD_REUSED,
+    REUSE,
+    REUSE_KEYWORDS,
+    REUSE_OFF,
+    SOURCE_DOMAIN,
+    STRUCTURED_OUTPUT,
+    adapt_response,
+    escalation,
+    extract_root_domain,
+    fallback_description,
+    fetch_page_description,
+    find_similar_site,
+    generate_response,
+    keywords_from_response,
+    remember_site,
+)
+from .routing import MIN_CONFIDENCE, ROUTE, keyword_confidence
+
+DEFAULT_FETCH_CONCURRENCY = 8
+DEFAULT_LLM_CONCURRENCY = 4
+KEYWORD_COLUMNS = [f"keyword_{i}" for i in range(1, 6)]
+RECORD_COLUMNS = ["url", "root_domain", "meta_description", "description_source", "model", "reused_from", "similarity"]
+CSV_COLUMNS = RECORD_COLUMNS + KEYWORD_COLUMNS + ["error"]
+URL_COLUMN_NAMES = ("url", "urls", "website", "domain", "site")
+# Rows waiting on a stage, per worker, before more are taken from the input
+IN_FLIGHT_PER_WORKER = 4
+
+# How far a row has got
+STATE_PENDING = "pending"
+STATE_FETCHED = "fetched"
+STATE_PROMPTED = "prompted"
+STATE_EXTRACTED = "extracted"
+STATE_FAILED = "failed"
+ROW_STATES = (STATE_PENDING, STATE_FETCHED, STATE_PROMPTED, STATE_EXTRACTED, STATE_FAILED)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_url(url):
+    url = url.strip().strip('"\'')
+    if url and "://" not in url:
+        url = f"https://{url}"
+    return url
+
+
+def parse_url_list(text):
+    # One URL per line; commas and whitespace also separate entries
+    urls = []
+    for line in text.splitlines():
+        for item in line.replace(",", " ").split():
+            if item.lower() in URL_COLUMN_NAMES:
+                continue
+            urls.append(normalize_url(item))
+    return urls
+
+
+def read_url_csv(data):
+    # Use the column named like "url"/"domain" if there is a header, else the first column
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig", errors="replace")
+    rows = [row for row in csv.reader(io.StringIO(data)) if row]
+    if not rows:
+        return []
+
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = 0
+    for name in URL_COLUMN_NAMES:
+        if name in header:
+            column = header.index(name)
+            rows = rows[1:]
+            break
+
+    urls = []
+    for row in rows:
+        if column < len(row) and row[column].strip():
+            urls.append(normalize_url(row[column]))
+    return urls
+
+
+def read_urls(path):
+    # CSV files go through read_url_csv, anything else is a plain list
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.lower().endswith(".csv"):
+        return read_url_csv(data)
+    return parse_url_list(data.decode("utf-8-sig", errors="replace"))
+
+
+def new_row(index, url):
+    return {
+        "index": index,
+        "url": url,
+        "state": STATE_PENDING,
+        "root_domain": "",
+        "meta_description": "",
+        "meta_found": False,
+        # Which part of the page the description came from, see meta.SOURCE_*
+        "description_source": "",
+        # The raw response, whether it's in the "json" or "text" format, and the
+        # model that wrote it (or is to be asked next)
+        "gpt_response": "",
+        "output_format": "",
+        "model": "",
+        "keywords": [],
+        # See routing.keyword_confidence
+        "confidence": None,
+        # The near-duplicate site whose keywords were reused or adapted, and how close it is
+        "reused_from": "",
+        "similarity": None,
+        "method": "",
+        "error": "",
+        # Stage timings, see metrics.span
+        "spans": [],
+    }
+
+
+def fetch_row(row, use_cache=True):
+    """Fill in the row's domain and meta description; returns False on failure."""
+    with recording(row["spans"]):
+        try:
+            row["root_domain"] = extract_root_domain(row["url"])
+            row["meta_description"], row["description_source"] = fetch_page_description(
+                row["url"], use_cache=use_cache)
+            row["meta_found"] = row["description_source"] in META_SOURCES
+            if not row["meta_description"]:
+                row["meta_description"] = fallback_description(row["root_domain"])
+                row["description_source"] = SOURCE_DOMAIN
+        except Exception as e:
+            row.update(error=str(e), state=STATE_FAILED)
+            return False
+    row["state"] = STATE_FETCHED
+    return True
+
+
+def prompt_row(row, api_key, use_cache=True, structured=STRUCTURED_OUTPUT, route=None):
+    """Fill in the row's raw response from its model; returns False on failure."""
+    model = row["model"] or (route or ROUTE)[0]
+    # A row that already has a response is being retried because nothing could
+    # be extracted from it, so the cached copy of that response is skipped
+    use_cache = use_cache and not row["gpt_response"]
+    with recording(row["spans"]):
+        try:
+            row["gpt_response"], structured = generate_response(
+                api_key, row["root_domain"], row["meta_description"], use_cache=use_cache, structured=structured,
+                model=model)
+        except Exception as e:
+            row.update(error=str(e), state=STATE_FAILED)
+            return False
+    row.update(model=model, output_format="json" if structured else "text", state=STATE_PROMPTED)
+    return True
+
+
+def reuse_row(row, api_key, use_cache=True, reuse=REUSE, route=None):
+    """Take a near-duplicate site's keywords, or a response adapting them; returns True if there was one.
+
+    Only tried before the row's first prompt, so a row whose adaptation was
+    too weak gets the full prompt instead.
+    """
+    if reuse == REUSE_OFF or not use_cache or row["model"] or row["description_source"] == SOURCE_DOMAIN:
+        return False
+    model = (route or ROUTE)[0]
+    with recording(row["spans"]):
+        try:
+            similar = find_similar_site(api_key, row["root_domain"], row["meta_description"])
+            if similar is None:
+                return False
+            row.update(reused_from=similar["root_domain"], similarity=similar["similarity"])
+            if reuse == REUSE_KEYWORDS:
+                row.update(keywords=similar["keywords"], method=METHOD_REUSED, model=similar["model"],
+                           state=STATE_EXTRACTED)
+                return True
+            row["gpt_response"] = adapt_response(api_key, row["root_domain"], row["meta_description"],
+                                                 similar["keywords"], use_cache, model=model)
+        except Exception as e:
+            row.update(error=str(e), state=STATE_FAILED)
+            return True
+    row.update(model=model, output_format="text", state=STATE_PROMPTED)
+    return True
+
+
+def remember_row(row, api_key, reuse=REUSE):
+    """Index an extracted row for near-duplicates to reuse, unless it was reused itself."""
+    if reuse == REUSE_OFF or row["reused_from"] or row["state"] != STATE_EXTRACTED:
+        return
+    try:
+        remember_site(api_key, row["root_domain"], row["meta_description"], row["keywords"], row["model"],
+                      row["confidence"])
+    except Exception:
+        # The row itself is fine; it just can't be reused
+        logger.exception("Could not index %s", row["root_domain"])
+
+
+def extract_row(row, route=None):
+    """Fill in the row's keywords from its response; returns False if there were none.
+
+    A weak answer with a model left in the route goes back to "fetched", to be
+    prompted again with that model; a weak adaptation of a similar site's
+    keywords goes back to be given the full prompt.
+    """
+    with recording(row["spans"]):
+        row["keywords"], row["method"] = keywords_from_response(row["gpt_response"], row["output_format"] == "json")
+    row["confidence"] = keyword_confidence(row["keywords"], row["method"], row["root_domain"])
+    if row["reused_from"] and row["confidence"] < MIN_CONFIDENCE:
+        row.update(reused_from="", similarity=None, gpt_response="", state=STATE_FETCHED)
+        return False
+    escalate_to = escalation(row["model"], row["confidence"], row["root_domain"], route)
+    if escalate_to is not None:
+        row.update(model=escalate_to, gpt_response="", state=STATE_FETCHED)
+        return False
+    if not row["keywords"]:
+        row.update(error="Could not parse keywords from the response.", state=STATE_FAILED)
+        return False
+    row["state"] = STATE_EXTRACTED
+    return True
+
+
+def generate_row(row, api_key, use_cache=True, structured=STRUCTURED_OUTPUT, route=None, reuse=REUSE):
+    """Fill in the row's keywords, moving up the model route as needed; returns False on failure."""
+    if reuse_row(row, api_key, use_cache, reuse, route) and row["state"] == STATE_PROMPTED:
+        extract_row(row, route)
+    while row["state"] == STATE_FETCHED and prompt_row(row, api_key, use_cache, structured, route):
+        extract_row(row, route)
+    remember_row(row, api_key, reuse)
+    return row["state"] == STATE_EXTRACTED
+
+
+def analyze_url(url, api_key, use_cache=True, structured=STRUCTURED_OUTPUT, index=0, route=None, reuse=REUSE):
+    """Run the whole pipeline for one URL and return its result row."""
+    row = new_row(index, url)
+    if fetch_row(row, use_cache):
+        generate_row(row, api_key, use_cache, structured, route, reuse)
+    return row
+
+
+def fan_out(row, index, url):
+    """Copy a site's result row for another URL on the same domain."""
+    # The copy did no work of its own, so it has no spans
+    return dict(row, index=index, url=url, keywords=list(row["keywords"]), spans=[])
+
+
+def run_rows(rows, api_key, fetch_concurrency=DEFAULT_FETCH_CONCURRENCY,
+             llm_concurrency=DEFAULT_LLM_CONCURRENCY, use_cache=True, structured=STRUCTURED_OUTPUT,
+             checkpoint=None, route=None, reuse=REUSE):
+    """Yield each row once it is extracted or failed, in completion order.
+
+    Rows are taken from ``rows`` (which may be a lazy iterable) only as fast as
+    the pools keep up, and each starts from its ``state``. ``checkpoint(row)``
+    is called on the worker thread after every step.
+    """
+    rows = iter(rows)
+    results = queue.Queue()
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix="fetch")
+    llm_pool = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="llm")
+    max_in_flight = IN_FLIGHT_PER_WORKER * (fetch_concurrency + llm_concurrency)
+
+    def save(row):
+        if checkpoint is not None:
+            checkpoint(row)
+
+    def llm_stage(row):
+        try:
+            if row["state"] == STATE_FETCHED and reuse_row(row, api_key, use_cache, reuse, route):
+                save(row)
+            # Round again for each model a weak answer is escalated to
+            while row["state"] in (STATE_FETCHED, STATE_PROMPTED):
+                if row["state"] == STATE_FETCHED:
+                    prompt_row(row, api_key, use_cache, structured, route)
+                    save(row)
+                if row["state"] == STATE_PROMPTED:
+                    extract_row(row, route)
+                    save(row)
+            remember_row(row, api_key, reuse)
+        except Exception as e:
+            # Only a failed checkpoint gets here; the step is redone on resume
+            logger.exception("Checkpoint for %s failed", row["url"])
+            row.update(error=str(e), state=STATE_FAILED)
+        results.put(row)
+
+    def fetch_stage(row):
+        try:
+            fetch_row(row, use_cache)
+            save(row)
+        except Exception as e:
+            logger.exception("Checkpoint for %s failed", row["url"])
+            row.update(error=str(e), state=STATE_FAILED)
+        if row["state"] == STATE_FETCHED:
+            llm_pool.submit(llm_stage, row)
+        else:
+            results.put(row)
+
+    in_flight = 0
+    try:
+        while True:
+            for row in rows:
+                if row["state"] == STATE_PENDING:
+                    fetch_pool.submit(fetch_stage, row)
+                elif row["state"] in (STATE_FETCHED, STATE_PROMPTED):
+                    llm_pool.submit(llm_stage, row)
+                else:
+                    results.put(row)
+                in_flight += 1
+                if in_flight >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            yield results.get()
+            in_flight -= 1
+    finally:
+        # Drop queued work if the caller stops consuming early
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        llm_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def row_to_record(row):
+    record = {column: row.get(column, "") for column in RECORD_COLUMNS}
+    # Every column is text, in Parquet exports too
+    record["similarity"] = "" if record["similarity"] in ("", None) else f"{record['similarity']:.3f}"
+    keywords = row.get("keywords") or []
+    for i, column in enumerate(KEYWORD_COLUMNS):
+        record[column] = keywords[i] if i < len(keywords) else ""
+    record["error"] = row.get("error", "")
+    return record
+
+
+def rows_to_csv(rows):
+    # Combined CSV in input order, regardless of completion order
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for row in sorted(rows, key=lambda row: row.get("index", 0)):
+        writer.writerow(row_to_record(row))
+    return output.getvalue()
@@ -0,0 +1,293 @@
+"""Offline keyword jobs through OpenAI's Batch API.
+
+A job lives in its own directory and moves through four checkpointed stages,
+so it can be killed at any point and resumed by running it again:
+
+1. fetch: the meta description of each registrable domain's first URL is
+   appended to ``rows.jsonl`` as soon as it is fetched; other URLs on the
+   same domain share that row
+2. submit: the prompts go into ``requests.jsonl``, which is uploaded and
+   submitted; the batch id is saved in ``job.json``
+3. poll: ``job.json`` tracks the batch status until it is finished
+4. collect: each output line is extracted and appended to ``results.jsonl``,
+   then the final CSV is written
+
+    python -m prospecting_keywords.batch_api urls.csv --job-dir jobs/acme -o acme.csv
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import DEFAULT_FETCH_CONCURRENCY, fan_out, fetch_row, new_row, read_urls, rows_to_csv
+from .cache import llm_cache, llm_cache_key
+from .clients import get_openai_client
+from .domains import group_by_domain
+from .pipeline import MODEL, STRUCTURED_OUTPUT, SYSTEM_MESSAGE, build_messages, keywords_from_response
+from .prompt import build_prompt
+from .structured import RESPONSE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+POLL_INTERVAL = 60
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+JOB_FILE = "job.json"
+ROWS_FILE = "rows.jsonl"
+REQUESTS_FILE = "requests.jsonl"
+RESULTS_FILE = "results.jsonl"
+
+
+class BatchJobError(Exception):
+    pass
+
+
+def _custom_id(index):
+    return f"row-{index}"
+
+
+def _index(custom_id):
+    return int(custom_id.rsplit("-", 1)[1])
+
+
+def _read_jsonl(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A line cut short by a crash; the row is simply redone
+                pass
+    return records
+
+
+class BatchJob:
+    def __init__(self, job_dir, urls=None, structured=STRUCTURED_OUTPUT):
+        self.job_dir = job_dir
+        os.makedirs(job_dir, exist_ok=True)
+        self.state = self._load_state()
+        if self.state is None:
+            if not urls:
+                raise BatchJobError(f"No job in {job_dir}; pass a URL list to start one")
+            self.state = {"urls": list(urls), "structured": structured, "model": MODEL,
+                          "batch_id": None, "input_file_id": None, "status": "new"}
+            self._save_state()
+        elif urls and list(urls) != self.state["urls"]:
+            raise BatchJobError(f"{job_dir} holds a job for a different URL list")
+        self._append_lock = threading.Lock()
+
+    @property
+    def urls(self):
+        return self.state["urls"]
+
+    def _path(self, name):
+        return os.path.join(self.job_dir, name)
+
+    def _load_state(self):
+        try:
+            with open(self._path(JOB_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self):
+        # Write-then-rename so a crash never leaves a half-written job file
+        tmp_path = self._path(JOB_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self._path(JOB_FILE))
+
+    def _append(self, name, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._append_lock, open(self._path(name), "a+b") as f:
+            # A line cut short by a crash is ended first, or this record would be lost with it
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+
+    def rows(self):
+        return {row["index"]: row for row in _read_jsonl(self._path(ROWS_FILE))}
+
+    def results(self):
+        return {result["index"]: result for result in _read_jsonl(self._path(RESULTS_FILE))}
+
+    def prompt(self, row):
+        return build_prompt(row["root_domain"], row["meta_description"], structured=self.state["structured"])
+
+    # Stage 1
+    def fetch(self, fetch_concurrency=DEFAULT_FETCH_CONCURRENCY):
+        done = self.rows()
+        groups = group_by_domain(self.urls)
+        pending = [new_row(indexes[0], self.urls[indexes[0]]) for indexes in groups.values()
+                   if indexes[0] not in done]
+        if not pending:
+            return
+        logger.info("Fetching %d of %d pages (%d URLs)", len(pending), len(groups), len(self.urls))
+
+        def fetch_and_checkpoint(row):
+            fetch_row(row)
+            self._append(ROWS_FILE, row)
+
+        with ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix="fetch") as pool:
+            list(pool.map(fetch_and_checkpoint, pending))
+
+    # Stage 2
+    def submit(self, client):
+        if self.state["batch_id"]:
+            return
+        results = self.results()
+        body_options = {"response_format": RESPONSE_FORMAT} if self.state["structured"] else {}
+        count = 0
+        with open(self._path(REQUESTS_FILE), "w", encoding="utf-8") as f:
+            for index, row in sorted(self.rows().items()):
+                if row["error"] or index in results:
+                    continue
+                request = {
+                    "custom_id": _custom_id(index),
+                    "method": "POST",
+                    "url": ENDPOINT,
+                    "body": {"model": self.state["model"], "messages": build_messages(self.prompt(row)),
+                             **body_options},
+                }
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+                count += 1
+        if not count:
+            self.state["status"] = "completed"
+            self._save_state()
+            return
+
+        if not self.state["input_file_id"]:
+            with open(self._path(REQUESTS_FILE), "rb") as f:
+                self.state["input_file_id"] = client.files.create(file=f, purpose="batch").id
+            self._save_state()
+        batch = client.batches.create(input_file_id=self.state["input_file_id"], endpoint=ENDPOINT,
+                                      completion_window=COMPLETION_WINDOW)
+        self.state.update(batch_id=batch.id, status=batch.status)
+        self._save_state()
+        logger.info("Submitted batch %s with %d requests", batch.id, count)
+
+    # Stage 3
+    def poll(self, client, poll_interval=POLL_INTERVAL):
+        while self.state["batch_id"] and self.state["status"] not in TERMINAL_STATUSES:
+            batch = client.batches.retrieve(self.state["batch_id"])
+            self.state.update(status=batch.status, output_file_id=batch.output_file_id,
+                              error_file_id=batch.error_file_id)
+            self._save_state()
+            counts = getattr(batch, "request_counts", None)
+            if counts is not None:
+                logger.info("Batch %s: %s (%s/%s done, %s failed)", batch.id, batch.status,
+                            counts.completed, counts.total, counts.failed)
+            if batch.status not in TERMINAL_STATUSES:
+                time.sleep(poll_interval)
+
+    # Stage 4
+    def collect(self, client):
+        rows = self.rows()
+        done = self.results()
+        structured = self.state["structured"]
+        for file_key in ("output_file_id", "error_file_id"):
+            file_id = self.state.get(file_key)
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                index = _index(record["custom_id"])
+                if index in done or index not in rows:
+                    continue
+                result = {"index": index, "model": self.state["model"], "keywords": [], "method": "", "error": ""}
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    gpt_response = response["body"]["choices"][0]["message"]["content"] or ""
+                    result["keywords"], result["method"] = keywords_from_response(gpt_response, structured)
+                    if not result["keywords"]:
+                        result["error"] = "Could not parse keywords from the response."
+                    # Interactive runs of the same site can reuse the answer
+                    key = llm_cache_key(self.state["model"], SYSTEM_MESSAGE, self.prompt(rows[index]))
+                    llm_cache.set(key, gpt_response)
+                else:
+                    error = record.get("error") or response.get("body", {}).get("error") or {}
+                    result["error"] = error.get("message") or f"Batch request failed ({response.get('status_code')})"
+                self._append(RESULTS_FILE, result)
+                done[index] = result
+
+    def merged_rows(self):
+        rows = self.rows()
+        results = self.results()
+        for index, result in results.items():
+            if index in rows:
+                rows[index].update(model=result.get("model", ""), keywords=result["keywords"],
+                                   method=result["method"], error=result["error"] or rows[index]["error"])
+        for index, row in rows.items():
+            if not row["error"] and index not in results:
+                row["error"] = f"No batch result (batch {self.state['status']})"
+        # Every URL gets the row fetched for its domain
+        merged = []
+        for indexes in group_by_domain(self.urls).values():
+            for index in indexes:
+                if index in rows:
+                    merged.append(rows[index])
+                elif indexes[0] in rows:
+                    merged.append(fan_out(rows[indexes[0]], index, self.urls[index]))
+        return merged
+
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(rows_to_csv(self.merged_rows()))
+
+    def run(self, client, output, poll_interval=POLL_INTERVAL, fetch_concurrency=DEFAULT_FETCH_CONCURRENCY):
+        self.fetch(fetch_concurrency)
+        self.submit(client)
+        self.poll(client, poll_interval)
+        self.collect(client)
+        self.write_csv(output)
+        if self.state["status"] != "completed":
+            raise BatchJobError(f"Batch {self.state['batch_id']} ended as {self.state['status']}; "
+                                f"partial results written to {output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a prospecting keywords job through the OpenAI Batch API.")
+    parser.add_argument("urls", nargs="?", help="CSV or text file of URLs (omit to resume an existing job)")
+    parser.add_argument("--job-dir", required=True, help="directory holding the job's checkpoints")
+    parser.add_argument("-o", "--output", required=True, help="CSV file to write")
+    parser.add_argument("--text-output", action="store_true", help="use the tagged text format instead of JSON")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--fetch-concurrency", type=int, default=DEFAULT_FETCH_CONCURRENCY)
+    parser.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL"), help="OpenAI-compatible API base")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("set OPENAI_API_KEY")
+
+    try:
+        job = BatchJob(args.job_dir, read_urls(args.urls) if args.urls else None, structured=not args.text_output)
+        job.run(get_openai_client(api_key, args.base_url), args.output, args.poll_interval, args.fetch_concurrency)
+    except BatchJobError as e:
+        logger.error("%s", e)
+        return 1
+    logger.info("Wrote %s", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
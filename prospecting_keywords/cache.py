@@ -0,0 +1,215 @@
+"""Two-tier result cache: an in-process LRU in front of a SQLite file.
+
+Streamlit re-executes main.py on every widget interaction, but imported modules
+stay loaded, so the caches created here outlive reruns and browser sessions.
+The SQLite tier also survives restarts. Values are stored as JSON.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "prospecting-keywords", "cache.sqlite3")
+# An empty PROSPECTING_KEYWORDS_CACHE keeps the caches in memory only
+CACHE_PATH = os.environ.get("PROSPECTING_KEYWORDS_CACHE", DEFAULT_CACHE_PATH)
+
+PAGE_TTL = 60 * 60
+LLM_TTL = None
+MEMORY_MAX_ENTRIES = 2048
+DISK_MAX_ENTRIES = 200_000
+# How many writes between disk eviction passes
+EVICT_EVERY = 500
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (namespace, accessed_at)")
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+            )
+            return value, expires_at
+
+    def set(self, namespace, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, expires_at, time.time()),
+            )
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def evict(self, namespace, max_entries):
+        # Drop expired rows, then the least recently used rows above the cap
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?",
+                (namespace, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key IN ("
+                " SELECT key FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (namespace, namespace, max_entries),
+            )
+
+    def count(self, namespace):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+class TieredCache:
+    """A namespaced cache that checks memory first, then disk."""
+
+    def __init__(self, namespace, store=None, ttl=None, memory_max_entries=MEMORY_MAX_ENTRIES,
+                 disk_max_entries=DISK_MAX_ENTRIES):
+        self.namespace = namespace
+        self.store = store
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.memory = LRUCache(memory_max_entries)
+        self._writes = 0
+
+    def get(self, key, default=None):
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.store is not None:
+            row = self.store.get(self.namespace, key)
+            if row is not None:
+                value = json.loads(row[0])
+                self.memory.set(key, value, row[1])
+                return value
+        return default
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        self.memory.set(key, value, expires_at)
+        if self.store is not None:
+            self.store.set(self.namespace, key, json.dumps(value), expires_at)
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self.store.evict(self.namespace, self.disk_max_entries)
+
+    def invalidate(self, key):
+        self.memory.delete(key)
+        if self.store is not None:
+            self.store.delete(self.namespace, key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear(self.namespace)
+
+
+def normalize_url_key(url):
+    # Scheme and host are case-insensitive; fragments never reach the server
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rpartition(":")[2]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rpartition(":")[0]
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def llm_cache_key(model, system_message, prompt):
+    payload = json.dumps([model, system_message, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _open_store():
+    if not CACHE_PATH:
+        return None
+    try:
+        return SQLiteStore(CACHE_PATH)
+    except (OSError, sqlite3.Error):
+        # Read-only or missing home directory: fall back to memory only
+        return None
+
+
+_store = _open_store()
+page_cache = TieredCache("page", _store, ttl=PAGE_TTL)
+llm_cache = TieredCache("llm", _store, ttl=LLM_TTL)
+
+
+def clear_all():
+    page_cache.clear()
+    llm_cache.clear()
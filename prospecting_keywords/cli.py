@@ -0,0 +1,128 @@
+"""Command line entry point: run a URL list through the pipeline without Streamlit.
+
+    prospect-keywords urls.txt -o out.csv --concurrency 8
+
+Every run is a job in the job store (see jobs.py), checkpointed row by row. If
+it is interrupted, ``--resume JOB_ID`` carries on where it stopped, and
+``--retry-failed`` also re-runs the rows that failed. An output path ending in
+``.parquet`` is written as Parquet.
+
+``--spans`` writes each URL's stage timings as one OTLP JSON document per line,
+ready for an OpenTelemetry collector; ``--metrics`` writes the run's latency
+histograms and counters in the Prometheus text format.
+
+``--reuse keywords`` gives a site that is a near-duplicate of one already
+analyzed the same keywords, and ``--reuse adapt`` has them adapted in a short
+prompt (see similar.py); the output's ``reused_from`` column names that site.
+
+``--keyword-index`` also writes every keyword of the job with the number of
+domains that share it, their names and search footprints (see aggregate.py).
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from .batch import (
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_LLM_CONCURRENCY,
+    STATE_EXTRACTED,
+    STATE_FAILED,
+    parse_url_list,
+    read_urls,
+)
+from .jobs import JobNotFound, get_job_store, run_job
+from .metrics import otel_trace, registry
+from .pipeline import REUSE, REUSE_MODES
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="prospect-keywords",
+                                     description="Generate link building prospecting keywords for a list of URLs.")
+    parser.add_argument("urls", nargs="?", help="CSV or text file of URLs ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="CSV or .parquet file to write (default: CSV on stdout)")
+    parser.add_argument("--resume", metavar="JOB_ID", help="carry on with an interrupted job instead")
+    parser.add_argument("--retry-failed", action="store_true", help="with --resume, also re-run failed rows")
+    parser.add_argument("--concurrency", type=int, help="concurrent GPT-4o calls (and page fetches)")
+    parser.add_argument("--fetch-concurrency", type=int, help="concurrent page fetches")
+    parser.add_argument("--text-output", action="store_true", help="use the tagged text format instead of JSON")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached pages and responses")
+    parser.add_argument("--reuse", choices=REUSE_MODES, default=REUSE,
+                        help="what to do with near-duplicates of sites already analyzed (needs numpy)")
+    parser.add_argument("--keyword-index", help="CSV file of each keyword and the domains that share it (needs numpy)")
+    parser.add_argument("--spans", help="JSON lines file for per-URL stage timings (OTLP JSON)")
+    parser.add_argument("--metrics", help="file for latency histograms and counters (Prometheus text)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't report progress on stderr")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(message)s")
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("set OPENAI_API_KEY")
+
+    if bool(args.urls) == bool(args.resume):
+        parser.error("give either a URL file or --resume JOB_ID")
+
+    store = get_job_store()
+    if args.resume:
+        job_id = args.resume
+        try:
+            store.job(job_id)
+        except JobNotFound as e:
+            parser.error(str(e))
+    else:
+        urls = parse_url_list(sys.stdin.read()) if args.urls == "-" else read_urls(args.urls)
+        job_id = store.create_job(urls, structured=not args.text_output, name=args.urls)
+    llm_concurrency = args.concurrency or DEFAULT_LLM_CONCURRENCY
+    fetch_concurrency = args.fetch_concurrency or max(llm_concurrency, DEFAULT_FETCH_CONCURRENCY)
+
+    # One row per domain is run; the job's other URLs share its results
+    total = store.unfinished_count(job_id, args.retry_failed)
+    if not args.quiet:
+        print(f"Job {job_id}: {total} sites to analyze. If interrupted, carry on with --resume {job_id}",
+              file=sys.stderr)
+    done = 0
+    spans_file = open(args.spans, "w", encoding="utf-8") if args.spans else None
+    try:
+        for row in run_job(store, job_id, api_key, fetch_concurrency, llm_concurrency,
+                           use_cache=not args.no_cache, retry_failed=args.retry_failed, reuse=args.reuse):
+            done += 1
+            if spans_file and row["spans"]:
+                trace = otel_trace(row["spans"], url=row["url"], method=row["method"], error=row["error"])
+                spans_file.write(json.dumps(trace, ensure_ascii=False) + "\n")
+            if not args.quiet:
+                status = f"error: {row['error']}" if row["error"] else ", ".join(row["keywords"])
+                if row["reused_from"] and not row["error"]:
+                    status += f" (from {row['reused_from']}, {row['similarity']:.2f} similar)"
+                print(f"[{done}/{total}] {row['url']}: {status}", file=sys.stderr)
+    finally:
+        if spans_file:
+            spans_file.close()
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(registry.prometheus_text())
+    if not args.quiet:
+        for stage in registry.latency_summary():
+            print(f"{stage['stage']:>10}: p50 {stage['p50_ms']:8.1f} ms  p95 {stage['p95_ms']:8.1f} ms  "
+                  f"({stage['count']} calls)", file=sys.stderr)
+
+    # Exported straight from the job store, so the output never sits in memory
+    if args.output.lower().endswith(".parquet"):
+        store.export_parquet(job_id, args.output)
+    elif args.output == "-":
+        store.export_csv(job_id, sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            store.export_csv(job_id, f)
+    if args.keyword_index:
+        with open(args.keyword_index, "w", encoding="utf-8", newline="") as f:
+            store.export_keyword_index(job_id, f)
+    counts = store.job(job_id)["counts"]
+    return 1 if counts.get(STATE_FAILED) and not counts.get(STATE_EXTRACTED) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
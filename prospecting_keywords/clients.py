@@ -0,0 +1,198 @@
+"""Shared, pooled HTTP and OpenAI clients.
+
+Both are created once per process and reused across Streamlit reruns, sessions
+and batch workers, so repeat requests skip DNS, TCP and TLS setup. Page fetches
+retry 429/5xx responses with jittered exponential backoff (honouring
+Retry-After) and are spaced out per host; OpenAI calls use the SDK's own
+retry logic, which does the same for api.openai.com.
+
+A page fetch can run under a ``deadline``: every connect and wait for a
+response on that thread is cut short to the time left, and a retry that would
+have to wait past it isn't made, so redirects, retries and slow servers
+together can't take longer than the deadline.
+"""
+
+import contextvars
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import span
+
+USER_AGENT = "Mozilla/5.0"
+POOL_CONNECTIONS = 64
+POOL_MAXSIZE = 32
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+BACKOFF_MAX = 20
+# Don't let a server park a worker for minutes with a large Retry-After
+MAX_RETRY_AFTER = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_REDIRECTS = 5
+# Minimum seconds between requests to the same host
+HOST_MIN_INTERVAL = 1.0
+
+
+# When the fetch running in this context has to be finished by, on the monotonic clock
+_deadline = contextvars.ContextVar("fetch_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The fetch ran out of time before it could connect or get a response."""
+
+
+@contextmanager
+def deadline(seconds):
+    """Bound every request made in the block to ``seconds`` in total."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds left before the current deadline, or None without one."""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def capped_timeout(timeout):
+    # A socket timeout no longer than the time left; raises once it has run out
+    left = time_left()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return left if not isinstance(timeout, (int, float)) else min(timeout, left)
+
+
+class HostRateLimiter:
+    """Spaces requests to each host at least ``min_interval`` seconds apart."""
+
+    def __init__(self, min_interval=HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not host or self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            with span("rate_limit", host=host):
+                time.sleep(slot - now)
+
+
+def _build_session():
+    # Imported here so importing the library stays cheap until the first fetch
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.exceptions import MaxRetryError, ResponseError
+    from urllib3.util.retry import Retry
+
+    class CappedRetry(Retry):
+        def get_retry_after(self, response):
+            retry_after = super().get_retry_after(response)
+            if retry_after is None:
+                return None
+            return min(retry_after, MAX_RETRY_AFTER)
+
+        def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+            retry = super().increment(method, url, response, error, _pool, _stacktrace)
+            # No retry whose wait runs past the deadline; the last response or error stands
+            left = time_left()
+            if left is not None:
+                wait = retry.get_retry_after(response) if response is not None else None
+                if (wait or retry.get_backoff_time()) >= left:
+                    reason = error or ResponseError(ResponseError.SPECIFIC_ERROR.format(status_code=response.status))
+                    raise MaxRetryError(_pool, url, reason)
+            return retry
+
+    # DNS, TCP and TLS setup get their own span, on the rare requests that open a connection.
+    # Connecting and waiting for the response are both cut short to the deadline, if any
+    class TimedHTTPConnection(HTTPConnection):
+        def connect(self):
+            self.timeout = capped_timeout(self.timeout)
+            with span("connect", host=self.host):
+                super().connect()
+
+        def getresponse(self):
+            self.timeout = capped_timeout(self.timeout)
+            return super().getresponse()
+
+    class TimedHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            self.timeout = capped_timeout(self.timeout)
+            with span("connect", host=self.host, tls=True):
+                super().connect()
+
+        def getresponse(self):
+            self.timeout = capped_timeout(self.timeout)
+            return super().getresponse()
+
+    # Same class names as urllib3's, since they show up in connection error messages
+    pool_classes = {
+        "http": type("HTTPConnectionPool", (HTTPConnectionPool,), {"ConnectionCls": TimedHTTPConnection}),
+        "https": type("HTTPSConnectionPool", (HTTPSConnectionPool,), {"ConnectionCls": TimedHTTPSConnection}),
+    }
+
+    class TimedHTTPAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    retry = CappedRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        backoff_max=BACKOFF_MAX,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    session.max_redirects = MAX_REDIRECTS
+    return session
+
+
+_lock = threading.Lock()
+_session = None
+_openai_clients = {}
+host_limiter = HostRateLimiter()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_openai_client(api_key, base_url=None):
+    # One client (and connection pool) per API key, without keeping raw keys as dict keys
+    from openai import OpenAI
+
+    key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), base_url)
+    client = _openai_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                client = OpenAI(api_key=api_key, base_url=base_url, max_retries=MAX_RETRIES)
+                _openai_clients[key] = client
+    return client
@@ -0,0 +1,132 @@
+"""Registrable domains from the Public Suffix List, for collapsing duplicate sites.
+
+``shop.example.co.uk:8443``, ``https://www.example.co.uk/`` and
+``example.co.uk`` are the same business, so they share one fetch and one
+GPT-4o call. The list is a bundled snapshot in ``data/`` so nothing is
+downloaded at run time; refresh it from https://publicsuffix.org/list/.
+"""
+
+import ipaddress
+import os
+import threading
+import unicodedata
+from urllib.parse import urlsplit
+
+PSL_PATH = os.path.join(os.path.dirname(__file__), "data", "public_suffix_list.dat")
+# Ideographic and full-width full stops that browsers treat as dots
+DOT_VARIANTS = str.maketrans({"。": ".", "．": ".", "｡": "."})
+
+_rules = None
+_rules_lock = threading.Lock()
+
+
+def load_rules(path=PSL_PATH):
+    """Return (rules, wildcards, exceptions) as sets of Unicode domain names.
+
+    ``*.ck`` is kept as ``ck`` in wildcards and ``!www.ck`` as ``www.ck`` in
+    exceptions. ICANN and private domains are both used, so each
+    ``*.myshopify.com`` store counts as its own site.
+    """
+    rules, wildcards, exceptions = set(), set(), set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rule = line.split(None, 1)[0] if line.strip() else ""
+            if not rule or rule.startswith("//"):
+                continue
+            rule = rule.lower()
+            if rule.startswith("!"):
+                exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                wildcards.add(rule[2:])
+            else:
+                rules.add(rule)
+    return rules, wildcards, exceptions
+
+
+def _get_rules():
+    global _rules
+    if _rules is None:
+        with _rules_lock:
+            if _rules is None:
+                _rules = load_rules()
+    return _rules
+
+
+def _to_unicode(host):
+    # The list is in Unicode, so punycode labels are decoded before lookup
+    labels = []
+    for label in host.split("."):
+        if label.startswith("xn--"):
+            try:
+                label = label.encode("ascii").decode("idna")
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return unicodedata.normalize("NFC", ".".join(labels))
+
+
+def hostname(url):
+    """Lower-case Unicode host of a URL or bare domain, without port or trailing dot."""
+    url = url.strip().translate(DOT_VARIANTS)
+    if "://" not in url:
+        url = "//" + url
+    try:
+        host = urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+    return _to_unicode(host.strip(".").lower())
+
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def public_suffix(host):
+    """Return the public suffix of a normalized host, e.g. ``co.uk``."""
+    rules, wildcards, exceptions = _get_rules()
+    labels = host.split(".")
+    # Longest name first, so the first match is the prevailing rule
+    for i in range(len(labels)):
+        name = ".".join(labels[i:])
+        if name in exceptions:
+            return ".".join(labels[i + 1:])
+        if name in rules:
+            return name
+        if i + 1 < len(labels) and ".".join(labels[i + 1:]) in wildcards:
+            return name
+    # The implicit "*" rule: an unlisted TLD is a public suffix
+    return labels[-1]
+
+
+def registrable_domain(url):
+    """Return the site's registrable domain, e.g. ``example.co.uk``.
+
+    IP addresses, single-label hosts and hosts that are themselves a public
+    suffix are returned as they are.
+    """
+    host = hostname(url)
+    if not host or "." not in host or is_ip_address(host):
+        return host
+    suffix = public_suffix(host)
+    if suffix == host:
+        return host
+    label = host[:-len(suffix) - 1].rsplit(".", 1)[-1]
+    return f"{label}.{suffix}"
+
+
+def group_by_domain(urls):
+    """Map each registrable domain to the indexes of its URLs, in input order.
+
+    The first index of each group is the URL that gets fetched and prompted;
+    every other index in the group reuses its result.
+    """
+    groups = {}
+    for index, url in enumerate(urls):
+        # Unparseable input keeps a group of its own and fails on its own
+        key = registrable_domain(url) or f"#{index}"
+        groups.setdefault(key, []).append(index)
+    return groups
@@ -0,0 +1,227 @@
+"""Keyword extraction from GPT responses.
+
+Well-formed responses are handled by a single compiled search for the
+``<step_5_keywords>`` block. Anything else is scanned once, with one compiled
+pattern, into tagged ``<step_N_keywords>`` sections, "Step 5"-style headings and
+numbered list items, and the fallback strategies run against that scan instead
+of re-reading the whole response each. The keywords are the same as the
+original chain of regex searches returned:
+
+1. ``step_5_tag``: numbered lines inside ``<step_5_keywords>``
+2. ``step5_patterns``: numbered lines after a "Step 5" / "top 5 most relevant
+   keywords" / "final list of ... keywords" heading, up to the next ``#``
+3. ``numbered_list``: any short numbered item in the response
+4. ``quotes``: short quoted or bracketed phrases
+"""
+
+import re
+
+METHOD_STEP5_TAG = "step_5_tag"
+METHOD_STEP5_PATTERNS = "step5_patterns"
+METHOD_NUMBERED_LIST = "numbered_list"
+METHOD_QUOTES = "quotes"
+METHOD_NONE = "none"
+
+MAX_KEYWORDS = 5
+
+# Numbered markers only match the marker itself, so tags and headings later on
+# the same line are still seen by the scan, which makes one left-to-right pass over
+# the string. The lookahead lets the engine skip most positions cheaply; it
+# lists every character an alternative can start with, including U+017F, which
+# matches "s" case-insensitively.
+TOKEN = re.compile(
+    r'(?=[\d<sStTfF\u017f])(?:'
+    r'^(?P<number>\d+[\.\)])'
+    r'|<(?P<close>/?)step_(?P<step>\d+)_keywords>'
+    r'|(?P<step5>(?i:step 5))'
+    r'|(?P<top5>(?i:top 5 most relevant keywords))'
+    r'|(?P<final>(?i:final list of)))',
+    re.MULTILINE,
+)
+STEP5_SECTION = re.compile(r'<step_5_keywords>(.*?)</step_5_keywords>', re.DOTALL)
+HEADING_KEYWORDS = re.compile(r'keywords', re.IGNORECASE)
+SEPARATORS = re.compile(r'[\s\-\:\.]+')
+NUMBERED_DOT = re.compile(r'\d+\.')
+NUMBERED = re.compile(r'\d+[\.\)]')
+NUMBER_PREFIX_DOT = re.compile(r'^\d+\.\s*')
+NUMBER_PREFIX = re.compile(r'^\d+[\.\)]\s*')
+BRACKETED = re.compile(r'\[(.*?)\]')
+WRAPPING = re.compile(r'^["\'`\[]|["\'`\]]$')
+QUOTED = (
+    re.compile(r'"([^"]{1,30})"'),
+    re.compile(r"'([^']{1,30})'"),
+    re.compile(r"\[([^\]]{1,30})\]"),
+)
+# Heading kinds in the order the original patterns were tried
+STEP5_HEADING, TOP5_HEADING, FINAL_LIST_HEADING = 1, 2, 3
+HEADING_KINDS = {"step5": STEP5_HEADING, "top5": TOP5_HEADING, "final": FINAL_LIST_HEADING}
+
+
+class Scan:
+    """Everything the strategies need, collected in one pass over the response."""
+
+    def __init__(self, text):
+        self.text = text
+        # step number (as written) -> [(start, end)] offsets of opening / closing tags
+        self.open_tags = {}
+        self.close_tags = {}
+        # heading kind -> [(start, end)] offsets, in document order
+        self.headings = {STEP5_HEADING: [], TOP5_HEADING: [], FINAL_LIST_HEADING: []}
+        # Offsets just past each "N." / "N)" marker in column 0
+        self.number_markers = []
+
+        for match in TOKEN.finditer(text):
+            kind = match.lastgroup
+            if kind == "number":
+                self.number_markers.append(match.end())
+            elif kind == "step":
+                tags = self.close_tags if match.group("close") else self.open_tags
+                tags.setdefault(match.group("step"), []).append(match.span())
+            else:
+                self.headings[HEADING_KINDS[kind]].append(match.span())
+
+    def numbered_items(self):
+        """Text after each column-0 numbered marker, stripped."""
+        text = self.text
+        items = []
+        consumed_until = -1
+        for pos in self.number_markers:
+            if pos <= consumed_until:
+                continue
+            end = text.find('\n', pos)
+            if end == -1:
+                end = len(text)
+            item = text[pos:end]
+            if not item.strip():
+                # The marker's trailing whitespace runs on into the next non-blank line
+                while end < len(text):
+                    next_end = text.find('\n', end + 1)
+                    if next_end == -1:
+                        next_end = len(text)
+                    if text[end + 1:next_end].strip():
+                        item = text[end + 1:next_end]
+                        end = next_end
+                        break
+                    end = next_end
+            items.append(item.strip())
+            consumed_until = end
+        return items
+
+    def section(self, step):
+        """Text of the first complete ``<step_N_keywords>`` block, or None."""
+        opens = self.open_tags.get(str(step))
+        if not opens:
+            return None
+        start = opens[0][1]
+        for close_start, _ in self.close_tags.get(str(step), ()):
+            if close_start >= start:
+                return self.text[start:close_start]
+        return None
+
+    def heading_section(self):
+        """Text following the first usable step 5 heading, up to the next '#'."""
+        for kind in (STEP5_HEADING, TOP5_HEADING, FINAL_LIST_HEADING):
+            for start, end in self.headings[kind]:
+                if kind == FINAL_LIST_HEADING:
+                    # "final list of ... keywords": the first "keywords" that is followed by a section
+                    for match in HEADING_KEYWORDS.finditer(self.text, end):
+                        section = self._section_after(match.end())
+                        if section is not None:
+                            return section
+                    # Later headings can only reach the same "keywords"
+                    break
+                section = self._section_after(end)
+                if section is not None:
+                    return section
+        return None
+
+    def _section_after(self, pos):
+        separators = SEPARATORS.match(self.text, pos)
+        if not separators:
+            return None
+        start = separators.end()
+        if start >= len(self.text) or self.text[start] == '#':
+            # Only usable if a separator can be given back as the section itself
+            if separators.end() - separators.start() < 2:
+                return None
+            return self.text[start - 1:start]
+        end = self.text.find('#', start)
+        return self.text[start:] if end == -1 else self.text[start:end]
+
+
+def tagged_items(section):
+    # Numbered "N." lines in a <step_N_keywords> block
+    keywords = []
+    for line in section.split('\n'):
+        line = line.strip()
+        if line and NUMBERED_DOT.match(line):
+            keyword_match = BRACKETED.search(line)
+            if keyword_match:
+                keywords.append(keyword_match.group(1).strip())
+            else:
+                keywords.append(NUMBER_PREFIX_DOT.sub('', line).strip())
+    return keywords
+
+
+def _heading_items(section):
+    keywords = []
+    for line in section.split('\n'):
+        line = line.strip()
+        if line and NUMBERED.match(line):
+            keyword_match = BRACKETED.search(line)
+            if keyword_match:
+                keywords.append(keyword_match.group(1).strip())
+            else:
+                keyword = WRAPPING.sub('', NUMBER_PREFIX.sub('', line).strip()).strip()
+                if keyword:
+                    keywords.append(keyword)
+    return keywords
+
+
+def _numbered_list_items(scan):
+    keywords = []
+    for item in scan.numbered_items():
+        if len(item.split()) <= 3:
+            clean_item = WRAPPING.sub('', item).strip()
+            if clean_item and clean_item not in keywords:
+                keywords.append(clean_item)
+    return keywords
+
+
+def _quoted_items(text):
+    keywords = []
+    for pattern in QUOTED:
+        for word in pattern.findall(text):
+            if len(word.split()) <= 3 and word.strip() not in keywords:
+                keywords.append(word.strip())
+    return keywords
+
+
+def extract(gpt_response, limit=MAX_KEYWORDS):
+    """Return (keywords, method) where method names the strategy that succeeded.
+
+    At most ``limit`` keywords are returned; None returns all the strategy found.
+    """
+    # Well-formed responses need nothing more than this one search
+    match = STEP5_SECTION.search(gpt_response)
+    if match:
+        keywords = tagged_items(match.group(1))
+        if keywords:
+            return keywords[:limit], METHOD_STEP5_TAG
+
+    scan = Scan(gpt_response)
+    section = scan.heading_section()
+    if section is not None:
+        keywords = _heading_items(section)
+        if keywords:
+            return keywords[:limit], METHOD_STEP5_PATTERNS
+
+    keywords = _numbered_list_items(scan)
+    if keywords:
+        return keywords[:limit], METHOD_NUMBERED_LIST
+
+    keywords = _quoted_items(gpt_response)
+    if keywords:
+        return keywords[:limit], METHOD_QUOTES
+
+    return [], METHOD_NONE
@@ -0,0 +1,159 @@
+"""Bounded page fetches.
+
+A fetch has FETCH_DEADLINE seconds in all: connecting, following redirects,
+retrying, waiting for the response and reading the body all count against it
+(see ``clients.deadline``), so one slow site holds a worker for no longer than
+that. At most ``clients.MAX_REDIRECTS`` redirects are followed. The body is
+read as it arrives rather than in full chunks, so a server trickling bytes
+can't hold a read past the deadline either; a page cut off by the deadline
+keeps what had been read, and the meta.py byte caps stop the read long before
+a huge page is downloaded.
+
+A fetch that fails raises one of the FetchError subclasses below, and its
+``reason`` is counted in ``fetch_errors_total``.
+"""
+
+import time
+from urllib.parse import urlsplit
+
+from .clients import DeadlineExceeded, deadline, get_session, host_limiter, time_left
+from .meta import CHUNK_SIZE, header_charset, read_description
+from .metrics import TimedIterator, annotate, increment, observe, span
+
+FETCH_DEADLINE = 10
+CONNECT_TIMEOUT = 5
+# Longest wait for any one read, within the deadline
+READ_TIMEOUT = 5
+# Content types worth parsing; a response without one is parsed too
+HTML_TYPES = ("text/", "application/xhtml", "application/xml")
+
+
+class FetchError(Exception):
+    reason = "request"
+
+
+class FetchTimeout(FetchError):
+    reason = "timeout"
+
+
+class TooManyRedirects(FetchError):
+    reason = "redirects"
+
+
+class ConnectionFailed(FetchError):
+    reason = "connection"
+
+
+class InvalidURL(FetchError):
+    reason = "url"
+
+
+class BadStatus(FetchError):
+    reason = "status"
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class NotHTML(FetchError):
+    reason = "content_type"
+
+
+class BodyReader:
+    """The response body in pieces as they arrive, until the deadline or a read times out."""
+
+    def __init__(self, response):
+        self._raw = response.raw
+        self.timed_out = False
+
+    def __iter__(self):
+        from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+        while True:
+            left = time_left()
+            if left is not None and left <= 0:
+                self.timed_out = True
+                return
+            # Each read waits no longer than the time left
+            connection = self._raw.connection
+            if connection is not None and connection.sock is not None:
+                connection.sock.settimeout(READ_TIMEOUT if left is None else min(READ_TIMEOUT, left))
+            try:
+                chunk = self._raw.read1(CHUNK_SIZE, decode_content=True)
+            except (ReadTimeoutError, TimeoutError):
+                self.timed_out = True
+                return
+            except ProtocolError:
+                # The connection dropped; whatever arrived before still counts
+                return
+            if not chunk:
+                return
+            yield chunk
+
+
+def fetch_description(url):
+    """Return (description, source) for a page, or raise a FetchError."""
+    try:
+        return _fetch_description(url)
+    except FetchError as e:
+        annotate(error=e.reason)
+        increment("fetch_errors_total", reason=e.reason)
+        raise
+
+
+def _fetch_description(url):
+    import requests
+    from urllib3.exceptions import ReadTimeoutError
+
+    # Waiting for the host's turn doesn't count against the deadline
+    host_limiter.wait(urlsplit(url).hostname)
+    with deadline(FETCH_DEADLINE):
+        # "request" covers connecting (its own "connect" span on a new
+        # connection), any redirects and waiting for the response headers
+        with span("request") as attributes:
+            try:
+                response = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=True)
+            except (requests.Timeout, DeadlineExceeded):
+                raise FetchTimeout(f"{url} took longer than {FETCH_DEADLINE}s to respond") from None
+            except requests.TooManyRedirects:
+                raise TooManyRedirects(f"{url} redirected more than {get_session().max_redirects} times") from None
+            except (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                    requests.exceptions.InvalidSchema) as e:
+                raise InvalidURL(f"Invalid URL {url}: {e}") from None
+            except requests.ConnectionError as e:
+                # With retries, a read timeout comes back wrapped in a connection error
+                if isinstance(getattr(e.args[0] if e.args else None, "reason", None), ReadTimeoutError):
+                    raise FetchTimeout(f"{url} took longer than {FETCH_DEADLINE}s to respond") from None
+                raise ConnectionFailed(f"Could not connect to {url}: {e}") from None
+            except requests.RequestException as e:
+                raise FetchError(f"Could not fetch {url}: {e}") from None
+            attributes["status"] = response.status_code
+            if response.history:
+                attributes["redirects"] = len(response.history)
+
+        with response:
+            if response.status_code >= 400:
+                raise BadStatus(f"{url} returned HTTP {response.status_code}", response.status_code)
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and not content_type.lower().startswith(HTML_TYPES):
+                raise NotHTML(f"{url} is not a web page ({content_type.split(';')[0]})")
+
+            # Stream the page and stop reading once the head (or, without a
+            # meta description, enough of the body) has been parsed
+            with span("read_page") as attributes:
+                started = time.perf_counter()
+                body = BodyReader(response)
+                chunks = TimedIterator(body)
+                description, source, bytes_read = read_description(chunks, header_charset(content_type))
+                if body.timed_out and not bytes_read:
+                    raise FetchTimeout(f"{url} sent nothing within {FETCH_DEADLINE}s")
+                # Reading and parsing interleave, so they're split by time spent waiting on the socket
+                parse_ms = (time.perf_counter() - started) * 1000 - chunks.wait_ms
+                attributes.update(bytes=bytes_read, download_ms=round(chunks.wait_ms, 3),
+                                  parse_ms=round(parse_ms, 3), source=source or "none", timed_out=body.timed_out)
+    observe("download", chunks.wait_ms)
+    observe("parse", parse_ms)
+    increment("bytes_downloaded_total", bytes_read)
+    increment("description_source_total", source=source or "none")
+    return description, source
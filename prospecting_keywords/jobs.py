@@ -0,0 +1,296 @@
+"""Resumable bulk jobs, checkpointed row by row in a SQLite file.
+
+A job is a URL list whose rows move through pending -> fetched -> prompted ->
+extracted, or end up failed. Each step is written as soon as it finishes,
+together with what it produced: the description, the raw GPT-4o response and
+the keywords. If the browser tab, the process or the machine goes away
+mid-run, running the job again picks every row up from its last checkpoint.
+Failed rows are only re-run when asked to.
+
+Only the first URL of each registrable domain is run; the other rows on that
+domain point at it through ``source_index`` and get a copy of each checkpoint.
+
+Rows are read back a page at a time, for resuming and for exports alike, so
+a job of any size runs and exports to CSV or Parquet in constant memory.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .batch import (
+    CSV_COLUMNS,
+    DEFAULT_FETCH_CONCURRENCY,
+    DEFAULT_LLM_CONCURRENCY,
+    STATE_EXTRACTED,
+    STATE_FAILED,
+    STATE_FETCHED,
+    STATE_PENDING,
+    new_row,
+    row_to_record,
+    run_rows,
+)
+from .cache import DEFAULT_CACHE_PATH
+from .domains import group_by_domain
+from .pipeline import REUSE, STRUCTURED_OUTPUT
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "jobs.sqlite3")
+# An empty PROSPECTING_KEYWORDS_JOBS keeps jobs in memory, for this process only
+JOBS_PATH = os.environ.get("PROSPECTING_KEYWORDS_JOBS", DEFAULT_JOBS_PATH)
+PAGE_SIZE = 1000
+PARQUET_ROW_GROUP = 10_000
+
+# Row fields written at each checkpoint, in column order
+CHECKPOINT_FIELDS = ("state", "root_domain", "meta_description", "description_source", "meta_found",
+                     "output_format", "gpt_response", "model", "keywords", "confidence", "method", "error",
+                     "reused_from", "similarity")
+# Columns added since the first version of the table, with their definitions
+ADDED_COLUMNS = (
+    ("model", "TEXT NOT NULL DEFAULT ''"),
+    ("confidence", "REAL"),
+    ("reused_from", "TEXT NOT NULL DEFAULT ''"),
+    ("similarity", "REAL"),
+)
+ROW_COLUMNS = ("idx", "url") + CHECKPOINT_FIELDS
+
+
+class JobNotFound(Exception):
+    pass
+
+
+def _row_from_record(record):
+    row = new_row(record[0], record[1])
+    row.update(zip(CHECKPOINT_FIELDS, record[2:]))
+    row["meta_found"] = bool(row["meta_found"])
+    row["keywords"] = json.loads(row["keywords"])
+    return row
+
+
+def _unfinished(retry_failed):
+    # Rows that share another row's results are never run themselves
+    states = (STATE_EXTRACTED,) if retry_failed else (STATE_EXTRACTED, STATE_FAILED)
+    return f"source_index IS NULL AND state NOT IN ({', '.join('?' * len(states))})", states
+
+
+class JobStore:
+    def __init__(self, path):
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " structured INTEGER NOT NULL,"
+            " total INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_rows ("
+            " job_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " url TEXT NOT NULL,"
+            # The row this one copies its results from; NULL for rows that are run
+            " source_index INTEGER,"
+            " state TEXT NOT NULL,"
+            " root_domain TEXT NOT NULL DEFAULT '',"
+            " meta_description TEXT NOT NULL DEFAULT '',"
+            " description_source TEXT NOT NULL DEFAULT '',"
+            " meta_found INTEGER NOT NULL DEFAULT 0,"
+            " output_format TEXT NOT NULL DEFAULT '',"
+            " gpt_response TEXT NOT NULL DEFAULT '',"
+            " model TEXT NOT NULL DEFAULT '',"
+            " keywords TEXT NOT NULL DEFAULT '[]',"
+            " confidence REAL,"
+            " method TEXT NOT NULL DEFAULT '',"
+            " error TEXT NOT NULL DEFAULT '',"
+            " reused_from TEXT NOT NULL DEFAULT '',"
+            " similarity REAL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (job_id, idx))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_rows_source ON job_rows (job_id, source_index)")
+        columns = {column[1] for column in self._conn.execute("PRAGMA table_info(job_rows)")}
+        for name, definition in ADDED_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE job_rows ADD COLUMN {name} {definition}")
+
+    def create_job(self, urls, structured=STRUCTURED_OUTPUT, name=""):
+        """Add a job for a URL list and return its id."""
+        urls = list(urls)
+        job_id = uuid.uuid4().hex[:12]
+        source = {}
+        for indexes in group_by_domain(urls).values():
+            for index in indexes[1:]:
+                source[index] = indexes[0]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, name, structured, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, name or f"{len(urls)} URLs", int(structured), len(urls), now, now),
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_rows (job_id, idx, url, source_index, state, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    ((job_id, index, url, source.get(index), STATE_PENDING, now) for index, url in enumerate(urls)),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def job(self, job_id):
+        """Return the job's details and per-state row counts."""
+        with self._lock:
+            record = self._conn.execute(
+                "SELECT id, name, structured, total, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if record is None:
+                raise JobNotFound(f"No job {job_id}")
+            counts = dict(self._conn.execute(
+                "SELECT state, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY state", (job_id,)
+            ).fetchall())
+        job = dict(zip(("id", "name", "structured", "total", "created_at", "updated_at"), record))
+        job["structured"] = bool(job["structured"])
+        job["counts"] = counts
+        job["finished"] = counts.get(STATE_EXTRACTED, 0) + counts.get(STATE_FAILED, 0) == job["total"]
+        return job
+
+    def jobs(self, limit=20):
+        """Return the most recently updated jobs, newest first."""
+        with self._lock:
+            ids = [job_id for job_id, in self._conn.execute(
+                "SELECT id FROM jobs ORDER BY updated_at DESC LIMIT ?", (limit,))]
+        return [self.job(job_id) for job_id in ids]
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM job_rows WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.execute("COMMIT")
+
+    def _pages(self, job_id, where, params=(), page_size=PAGE_SIZE):
+        # Keyset pagination: each page is a short read, so checkpoints written
+        # between pages are never blocked or skipped
+        last = -1
+        while True:
+            with self._lock:
+                records = self._conn.execute(
+                    f"SELECT {', '.join(ROW_COLUMNS)} FROM job_rows"
+                    f" WHERE job_id = ? AND idx > ? AND {where} ORDER BY idx LIMIT ?",
+                    (job_id, last, *params, page_size),
+                ).fetchall()
+            if not records:
+                return
+            yield records
+            last = records[-1][0]
+
+    def unfinished_count(self, job_id, retry_failed=False):
+        """How many rows unfinished_rows() will yield (one per domain, not per URL)."""
+        where, states = _unfinished(retry_failed)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND {where}", (job_id, *states)
+            ).fetchone()[0]
+
+    def unfinished_rows(self, job_id, retry_failed=False):
+        """Yield the rows still to run, each ready to carry on from its last checkpoint."""
+        where, states = _unfinished(retry_failed)
+        for records in self._pages(job_id, where, states):
+            for record in records:
+                row = _row_from_record(record)
+                if row["state"] == STATE_FAILED:
+                    # Start again after the last step that worked
+                    row.update(state=STATE_FETCHED if row["description_source"] else STATE_PENDING, error="")
+                yield row
+
+    def rows(self, job_id):
+        """Yield every row of the job in input order."""
+        for records in self._pages(job_id, "1"):
+            for record in records:
+                yield _row_from_record(record)
+
+    def save_row(self, job_id, row):
+        """Checkpoint a row, and the rows on its domain that share its results."""
+        values = [row[field] for field in CHECKPOINT_FIELDS]
+        values[CHECKPOINT_FIELDS.index("meta_found")] = int(row["meta_found"])
+        values[CHECKPOINT_FIELDS.index("keywords")] = json.dumps(row["keywords"], ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                f"UPDATE job_rows SET {', '.join(f'{field} = ?' for field in CHECKPOINT_FIELDS)}, updated_at = ?"
+                # Spelled out so each side of the OR uses its own index
+                " WHERE (job_id = ? AND idx = ?) OR (job_id = ? AND source_index = ?)",
+                (*values, now, job_id, row["index"], job_id, row["index"]),
+            )
+            self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+            self._conn.execute("COMMIT")
+
+    def export_csv(self, job_id, f):
+        """Write the job's results to a text file object as CSV, in input order."""
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for row in self.rows(job_id):
+            writer.writerow(row_to_record(row))
+
+    def export_parquet(self, job_id, path_or_file):
+        """Write the job's results as Parquet, one row group at a time (needs pyarrow)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow: pip install 'prospecting-keywords[parquet]'")
+        schema = pa.schema([(column, pa.string()) for column in CSV_COLUMNS])
+        with pq.ParquetWriter(path_or_file, schema) as writer:
+            records = []
+            for row in self.rows(job_id):
+                records.append(row_to_record(row))
+                if len(records) >= PARQUET_ROW_GROUP:
+                    writer.write_table(pa.Table.from_pylist(records, schema=schema))
+                    records = []
+            if records:
+                writer.write_table(pa.Table.from_pylist(records, schema=schema))
+
+    def export_keyword_index(self, job_id, f):
+        """Write each keyword of the job with the domains that share it as CSV (needs numpy, see aggregate.py)."""
+        try:
+            from .aggregate import KeywordIndex
+        except ImportError:
+            raise ImportError("The keyword index needs numpy: pip install 'prospecting-keywords[aggregate]'")
+        KeywordIndex().add_rows(self.rows(job_id)).export_csv(f)
+
+
+def run_job(store, job_id, api_key, fetch_concurrency=DEFAULT_FETCH_CONCURRENCY,
+            llm_concurrency=DEFAULT_LLM_CONCURRENCY, use_cache=True, retry_failed=False, reuse=REUSE):
+    """Run the job's unfinished rows, yielding each as it is extracted or fails."""
+    job = store.job(job_id)
+    return run_rows(store.unfinished_rows(job_id, retry_failed), api_key, fetch_concurrency, llm_concurrency,
+                    use_cache, job["structured"], checkpoint=lambda row: store.save_row(job_id, row), reuse=reuse)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """The process-wide job store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(JOBS_PATH or ":memory:")
+        return _store
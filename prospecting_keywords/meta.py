@@ -0,0 +1,334 @@
+"""Streaming page description extraction.
+
+Feeds the response body chunk by chunk into an incremental HTML parser and stops
+as soon as the head is over (``</head>`` or the first ``<body>``), so large pages
+are never downloaded or parsed in full.
+
+Pages without a meta description fall back, in order, to the ``<title>``, a
+JSON-LD ``description``, the first ``<h1>``/``<h2>`` headings and the first few
+paragraphs of visible text. The first of those with at least
+MIN_FALLBACK_CHARS characters wins (else the first non-empty one). The parser
+only carries on into the body when the head had nothing usable. It stops at
+the first tier with enough text (paragraphs: once PARAGRAPH_TARGET_CHARS or
+MAX_PARAGRAPHS are in), and never reads more than
+MAX_FALLBACK_BYTES of body or past the time budget.
+
+The encoding comes from a byte order mark, the Content-Type charset or a
+``<meta charset>`` in the first SNIFF_BYTES, in that order, else UTF-8; there
+is no statistical detection. Latin-1 and ASCII labels are read as
+windows-1252, as browsers do, and a page said (or assumed) to be UTF-8 that
+turns out not to be is read as windows-1252 from the first invalid byte on.
+"""
+
+import codecs
+import itertools
+import json
+import re
+import time
+from html.parser import HTMLParser
+
+# Same order as the original BeautifulSoup lookups: the first tag with content wins
+META_PRIORITY = (
+    ("name", "description"),
+    ("property", "og:description"),
+    ("name", "twitter:description"),
+)
+CHUNK_SIZE = 16 * 1024
+MAX_HEAD_BYTES = 512 * 1024
+MAX_FALLBACK_BYTES = 128 * 1024
+# Wall-clock limit on reading and parsing one page, on top of the request timeout
+READ_TIME_BUDGET = 2.0
+DEFAULT_ENCODING = "utf-8"
+# Browsers read these labels as windows-1252, its superset
+WINDOWS_1252 = "cp1252"
+WINDOWS_1252_ALIASES = frozenset(("ascii", "iso8859-1"))
+# How far into the page a <meta charset> is looked for
+SNIFF_BYTES = 1024
+META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Where a description came from, recorded with each result
+SOURCE_META = "meta_description"
+SOURCE_OG = "og_description"
+SOURCE_TWITTER = "twitter_description"
+SOURCE_TITLE = "title"
+SOURCE_JSON_LD = "json_ld"
+SOURCE_HEADINGS = "headings"
+SOURCE_PARAGRAPHS = "paragraphs"
+META_SOURCES = (SOURCE_META, SOURCE_OG, SOURCE_TWITTER)
+
+MIN_FALLBACK_CHARS = 50
+MAX_HEADINGS = 3
+MAX_PARAGRAPHS = 3
+# Paragraphs keep being collected until there are MAX_PARAGRAPHS or this much text
+PARAGRAPH_TARGET_CHARS = 300
+# Shorter paragraphs are mostly buttons, prices and cookie notices
+MIN_PARAGRAPH_CHARS = 40
+MAX_CAPTURE_CHARS = 1000
+
+WHITESPACE = re.compile(r'\s+')
+# Text in these is never visible
+SKIPPED_TAGS = frozenset(("script", "style", "noscript", "template", "svg"))
+
+
+def json_ld_description(data):
+    """Return the first non-empty "description" in a JSON-LD document, breadth first."""
+    queue = [data]
+    while queue:
+        item = queue.pop(0)
+        if isinstance(item, dict):
+            description = item.get("description")
+            if isinstance(description, str) and description.strip():
+                return description.strip()
+            queue.extend(value for value in item.values() if isinstance(value, (dict, list)))
+        elif isinstance(item, list):
+            queue.extend(item)
+    return None
+
+
+class HeadParser(HTMLParser):
+    def __init__(self, fallback=False):
+        super().__init__(convert_charrefs=True)
+        self.fallback = fallback
+        self.found = {}
+        self.done = False
+        self.in_body = False
+        self.title = ""
+        self.json_ld = ""
+        self.headings = []
+        self.paragraphs = []
+        # Tag whose text is being collected, and the text so far
+        self._capture = None
+        self._text = []
+        self._text_length = 0
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            attrs = dict(attrs)
+            for priority, (attr, value) in enumerate(META_PRIORITY):
+                # Only the first tag of each kind counts, as with soup.find()
+                if priority not in self.found and attrs.get(attr) == value:
+                    self.found[priority] = attrs.get("content") or ""
+            # Nothing can outrank a non-empty <meta name="description">
+            if self.found.get(0):
+                self.done = True
+            return
+        if tag == "body":
+            self._end_head()
+            return
+        if self.done:
+            return
+
+        if tag == "script" and "ld+json" in (dict(attrs).get("type") or "").lower():
+            if not self.json_ld:
+                self._start_capture(tag)
+        elif tag in SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag == "title" and not self.in_body and not self.title:
+            self._start_capture(tag)
+        elif tag in ("h1", "h2") and self.in_body and len(self.headings) < MAX_HEADINGS:
+            self._start_capture(tag)
+        elif tag == "p" and self.in_body and not self._paragraphs_full():
+            # An unclosed <p> ends at the next one
+            if self._capture == "p":
+                self._end_capture()
+            self._start_capture(tag)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._end_head()
+        elif tag == self._capture:
+            self._end_capture()
+        elif tag in SKIPPED_TAGS and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if self._capture is None or (self._skipping and self._capture != "script"):
+            return
+        if self._text_length < MAX_CAPTURE_CHARS or self._capture == "script":
+            self._text.append(data)
+            self._text_length += len(data)
+
+    def _paragraphs_full(self):
+        return len(self.paragraphs) >= MAX_PARAGRAPHS or len(" ".join(self.paragraphs)) >= PARAGRAPH_TARGET_CHARS
+
+    def _start_capture(self, tag):
+        if self._capture is None:
+            self._capture = tag
+            self._text = []
+            self._text_length = 0
+
+    def finish(self):
+        """End a capture cut off by the byte or time budget; what was read still counts."""
+        if self._capture in ("title", "h1", "h2", "p"):
+            self._end_capture()
+
+    def _end_capture(self):
+        tag, raw = self._capture, "".join(self._text)
+        self._capture = None
+        self._text = []
+        if tag == "script":
+            try:
+                self.json_ld = json_ld_description(json.loads(raw)) or ""
+            except ValueError:
+                pass
+        else:
+            text = WHITESPACE.sub(" ", raw).strip()[:MAX_CAPTURE_CHARS]
+            if tag == "title":
+                self.title = text
+            elif tag in ("h1", "h2") and text:
+                self.headings.append(text)
+            elif tag == "p" and len(text) >= MIN_PARAGRAPH_CHARS:
+                self.paragraphs.append(text)
+        self._check_body_done()
+
+    def _end_head(self):
+        if self.in_body:
+            return
+        self.in_body = True
+        if self._capture in ("title", "script"):
+            self._end_capture()
+        # A meta tag, or a usable title, and the body isn't needed
+        if not self.fallback or any(self.found.values()) or len(self.title) >= MIN_FALLBACK_CHARS:
+            self.done = True
+        else:
+            self._check_body_done()
+
+    def _check_body_done(self):
+        if not self.in_body or self.done:
+            return
+        # Stop at the first tier with enough text; later tiers can't outrank it
+        # (a JSON-LD block further down the body is the one thing missed)
+        text, source = self.result()
+        if len(text) < MIN_FALLBACK_CHARS:
+            return
+        if source in (SOURCE_JSON_LD, SOURCE_HEADINGS) or (source == SOURCE_PARAGRAPHS and self._paragraphs_full()):
+            self.done = True
+
+    def result(self):
+        """Return (description, source), or ("", "") if the page had nothing usable."""
+        for priority, source in enumerate(META_SOURCES):
+            if self.found.get(priority):
+                return self.found[priority], source
+        if not self.fallback:
+            return "", ""
+        candidates = (
+            (self.title, SOURCE_TITLE),
+            (self.json_ld, SOURCE_JSON_LD),
+            (". ".join(heading.rstrip(".") for heading in self.headings), SOURCE_HEADINGS),
+            (" ".join(self.paragraphs), SOURCE_PARAGRAPHS),
+        )
+        for text, source in candidates:
+            if len(text) >= MIN_FALLBACK_CHARS:
+                return text, source
+        for text, source in candidates:
+            if text:
+                return text, source
+        return "", ""
+
+
+def header_charset(content_type):
+    for param in (content_type or "").split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            return value.strip().strip('"\'')
+    return None
+
+
+def _codec_name(label):
+    # The canonical codec name for a charset label, or None if Python doesn't know it
+    try:
+        name = codecs.lookup(label.decode("ascii") if isinstance(label, bytes) else label).name
+    except (LookupError, UnicodeError):
+        return None
+    return WINDOWS_1252 if name in WINDOWS_1252_ALIASES else name
+
+
+def sniff_charset(data, declared=None):
+    """The encoding of a page starting with ``data``, given the Content-Type charset ``declared``."""
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    encoding = _codec_name(declared) if declared else None
+    if encoding is None:
+        match = META_CHARSET.search(data, 0, SNIFF_BYTES)
+        encoding = _codec_name(match.group(1)) if match else None
+        # A <meta> that could be read as ASCII can't be in UTF-16
+        if encoding and encoding.startswith("utf-16"):
+            encoding = DEFAULT_ENCODING
+    return encoding or DEFAULT_ENCODING
+
+
+class Utf8Decoder:
+    """Incremental UTF-8 that switches to windows-1252 at the first invalid byte."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def decode(self, data, final=False):
+        try:
+            return self._decoder.decode(data, final)
+        except UnicodeDecodeError as e:
+            # A page mislabelled as UTF-8 is most often windows-1252
+            self._decoder = codecs.getincrementaldecoder(WINDOWS_1252)(errors="replace")
+            return e.object[:e.start].decode("utf-8") + self._decoder.decode(e.object[e.start:], final)
+
+
+def _decoder(encoding):
+    if codecs.lookup(encoding).name == "utf-8":
+        return Utf8Decoder()
+    return codecs.getincrementaldecoder(encoding)(errors="replace")
+
+
+def _sniffed(chunks, encoding):
+    # (decoder, chunks): enough of the page is held back to sniff its encoding first
+    chunks = iter(chunks)
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+    return _decoder(sniff_charset(head, encoding)), itertools.chain((head,), chunks)
+
+
+def read_description(chunks, encoding=None, max_bytes=MAX_HEAD_BYTES, max_seconds=READ_TIME_BUDGET,
+                     fallback=True, max_fallback_bytes=MAX_FALLBACK_BYTES):
+    """Return (description, source, bytes_read) from an iterable of byte chunks.
+
+    ``encoding`` is the charset from the Content-Type header, if any.
+    """
+    parser = HeadParser(fallback)
+    deadline = time.monotonic() + max_seconds
+    decoder, chunks = _sniffed(chunks, encoding)
+    bytes_read = 0
+    body_start = None
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            bytes_read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or bytes_read >= max_bytes or time.monotonic() >= deadline:
+                break
+            if parser.in_body:
+                if body_start is None:
+                    body_start = bytes_read
+                elif bytes_read - body_start >= max_fallback_bytes:
+                    break
+    except AssertionError:
+        # html.parser gives up on some malformed markup; keep what was found
+        pass
+    parser.finish()
+    description, source = parser.result()
+    return description, source, bytes_read
+
+
+def read_meta_description(chunks, encoding=None, max_bytes=MAX_HEAD_BYTES):
+    """Return (meta_description, bytes_read) from an iterable of byte chunks."""
+    description, _, bytes_read = read_description(chunks, encoding, max_bytes, fallback=False)
+    return description, bytes_read
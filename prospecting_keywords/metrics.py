@@ -0,0 +1,277 @@
+"""Per-stage timings, counters and latency histograms.
+
+Pipeline stages run inside ``span(name)`` blocks. Each finished span is
+observed in a process-wide latency histogram, so p50/p95 build up across
+Streamlit sessions and batch runs, and is appended to the span list of the
+run being recorded, if any, for the per-run waterfall. Span lists are plain
+JSON-friendly dicts, so they can ride along on batch rows.
+
+    spans = []
+    with recording(spans):
+        with span("fetch", url=url) as attributes:
+            ...
+            attributes["bytes"] = bytes_read
+
+Histograms and counters render in the Prometheus text format, and a run's
+spans convert to OpenTelemetry (OTLP JSON) form.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+SERVICE_NAME = "prospecting-keywords"
+# Upper bounds of the latency buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current_spans = contextvars.ContextVar("current_spans", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with Prometheus-style quantiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation,
+        # kept within the smallest and largest values actually seen
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else 0
+                value = lower + (self.buckets[i] - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.latency = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, duration_ms):
+        with self._lock:
+            histogram = self.latency.get(stage)
+            if histogram is None:
+                histogram = self.latency[stage] = Histogram()
+            histogram.observe(duration_ms)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+
+    def latency_summary(self):
+        """Return one {stage, count, p50_ms, p95_ms, mean_ms} dict per stage."""
+        with self._lock:
+            return [{
+                "stage": stage,
+                "count": histogram.count,
+                "p50_ms": histogram.quantile(0.5),
+                "p95_ms": histogram.quantile(0.95),
+                "mean_ms": histogram.sum / histogram.count,
+            } for stage, histogram in sorted(self.latency.items())]
+
+    def counter_values(self, name):
+        """Return {labels: value} for one counter, labels as a tuple of pairs."""
+        with self._lock:
+            return {labels: value for (counter, labels), value in self.counters.items() if counter == name}
+
+    def prometheus_text(self):
+        lines = ["# TYPE prospecting_stage_duration_ms histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                bounds = [f"{bound:g}" for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'prospecting_stage_duration_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'prospecting_stage_duration_ms_sum{{stage="{stage}"}} {histogram.sum:.3f}')
+                lines.append(f'prospecting_stage_duration_ms_count{{stage="{stage}"}} {histogram.count}')
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE prospecting_{name} counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter != name:
+                        continue
+                    label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+                    lines.append(f"prospecting_{name}{{{label_text}}} {value}" if label_text
+                                 else f"prospecting_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide, so it outlives Streamlit reruns and sessions
+registry = Registry()
+
+
+@contextmanager
+def recording(spans):
+    """Append every span finished in this block (and this thread) to ``spans``."""
+    token = _current_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_spans.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage; yields its attribute dict so the block can add to it."""
+    parent = _current_span.get()
+    span_id = os.urandom(8).hex()
+    token = _current_span.set((span_id, attributes))
+    start = time.time()
+    started = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        registry.observe(name, duration_ms)
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append({
+                "id": span_id,
+                "parent": parent[0] if parent else None,
+                "name": name,
+                "start": start,
+                "duration_ms": duration_ms,
+                "attributes": attributes,
+            })
+
+
+def annotate(**attributes):
+    """Add attributes to the innermost open span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current[1].update(attributes)
+
+
+def observe(stage, duration_ms):
+    # For stage times that aren't a single block, e.g. parsing interleaved with downloading
+    registry.observe(stage, duration_ms)
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+
+class TimedIterator:
+    """Wraps an iterator and adds up the time spent waiting on it, e.g. for network reads."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.wait_ms = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.wait_ms += (time.perf_counter() - started) * 1000
+
+
+def waterfall(spans):
+    """Return the spans sorted by start, with offsets in ms from the first and their nesting depth."""
+    if not spans:
+        return []
+    origin = min(s["start"] for s in spans)
+    parents = {s["id"]: s["parent"] for s in spans}
+
+    def depth(span_id):
+        level = 0
+        while parents.get(span_id) in parents:
+            span_id = parents[span_id]
+            level += 1
+        return level
+
+    return [{
+        "stage": s["name"],
+        "depth": depth(s["id"]),
+        "start_ms": (s["start"] - origin) * 1000,
+        "end_ms": (s["start"] - origin) * 1000 + s["duration_ms"],
+        "duration_ms": s["duration_ms"],
+        **s["attributes"],
+    } for s in sorted(spans, key=lambda s: (s["start"], -s["duration_ms"]))]
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otel_trace(spans, name="analyze", **attributes):
+    """Return a run's spans as an OTLP JSON ``resourceSpans`` document under one root span."""
+    trace_id = os.urandom(16).hex()
+    root_id = os.urandom(8).hex()
+    start = min((s["start"] for s in spans), default=time.time())
+    end = max((s["start"] + s["duration_ms"] / 1000 for s in spans), default=start)
+    span_ids = {s["id"] for s in spans}
+
+    def otel_span(span_id, parent_id, span_name, span_start, span_end, span_attributes):
+        otel = {
+            "traceId": trace_id,
+            "spanId": span_id,
+            "name": span_name,
+            "startTimeUnixNano": str(int(span_start * 1e9)),
+            "endTimeUnixNano": str(int(span_end * 1e9)),
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in span_attributes.items()],
+        }
+        if parent_id:
+            otel["parentSpanId"] = parent_id
+        return otel
+
+    otel_spans = [otel_span(root_id, None, name, start, end, attributes)]
+    for s in spans:
+        # Spans whose parent isn't in this run hang off the root
+        parent_id = s["parent"] if s["parent"] in span_ids else root_id
+        otel_spans.append(otel_span(s["id"], parent_id, s["name"], s["start"],
+                                    s["start"] + s["duration_ms"] / 1000, s["attributes"]))
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": otel_spans}],
+    }]}
@@ -0,0 +1,344 @@
+"""The single-URL pipeline used by both the interactive page and bulk mode.
+
+Each stage runs in a ``metrics.span``: fetch (request, then read_page; see fetch.py), llm
+(completion) and extract, so every run can be shown as a waterfall and the
+stage latencies add up in process-wide histograms.
+
+GPT-4o responses are streamed. An ``on_progress(text, keywords)`` callback sees
+the text and the final keyword list as they grow, and a text-format stream is
+closed as soon as ``</step_5_keywords>`` has arrived.
+
+Keywords come from the models in ``routing.ROUTE``, cheapest first; a weak
+answer is passed up to the next model (see routing.py).
+
+With ``REUSE`` on, a site whose description is nearly the same as one already
+analyzed takes that site's keywords, as they are or adapted in a short
+prompt (see similar.py).
+"""
+
+import logging
+import os
+import threading
+import time
+
+from .cache import llm_cache, llm_cache_key, normalize_url_key, page_cache
+from .clients import get_openai_client
+from .domains import registrable_domain
+from .extract import MAX_KEYWORDS, extract
+from .fetch import fetch_description
+from .metrics import annotate, increment, observe, span
+from .postprocess import normalize_keywords
+from .prompt import build_adapt_prompt, build_prompt, count_tokens, normalize_description
+from .routing import MIN_CONFIDENCE, ROUTE, keyword_confidence, next_model, token_cost
+from .streaming import StreamExtractor
+from .structured import (
+    FINAL_STEP_KEY,
+    METHOD_JSON,
+    RESPONSE_FORMAT,
+    StructuredOutputUnsupported,
+    parse_structured_response,
+)
+
+# The most capable model, used for Batch API jobs and as the default for single calls
+MODEL = "gpt-4o"
+SYSTEM_MESSAGE = "You are a helpful link building assistant."
+# Ask for a JSON schema response by default; the text format stays for older clients
+STRUCTURED_OUTPUT = True
+STREAM_RESPONSES = True
+OUTPUT_FORMATS = ("json", "text")
+# What to do with a near-duplicate of a site already analyzed: nothing, take its
+# keywords as they are, or have the first model in the route adapt them
+REUSE_OFF = "off"
+REUSE_KEYWORDS = "keywords"
+REUSE_ADAPT = "adapt"
+REUSE_MODES = (REUSE_OFF, REUSE_KEYWORDS, REUSE_ADAPT)
+REUSE = os.environ.get("PROSPECTING_KEYWORDS_REUSE", REUSE_OFF).strip().lower()
+# Method recorded for keywords taken as they are from a similar site
+METHOD_REUSED = "reused"
+
+logger = logging.getLogger(__name__)
+
+if REUSE not in REUSE_MODES:
+    # The app's selectbox and the CLI's --reuse choices both expect one of the modes
+    logger.warning("Ignoring PROSPECTING_KEYWORDS_REUSE=%r, which is not one of %s; reuse is off",
+                   REUSE, ", ".join(REUSE_MODES))
+    REUSE = REUSE_OFF
+
+# Tokens spent per output format, for comparing the two (cache hits cost nothing)
+usage_totals = {
+    fmt: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0} for fmt in OUTPUT_FORMATS
+}
+_usage_lock = threading.Lock()
+
+
+def extract_root_domain(url):
+    # The registrable domain, so subdomains, ports and www. all map to one site
+    return registrable_domain(url)
+
+
+def fetch_page_description(url, use_cache=True):
+    """Return (description, source) for a page; source is one of the meta.SOURCE_* names, or ""."""
+    # An empty description is cached too, so pages without one aren't refetched
+    key = normalize_url_key(url)
+    with span("fetch", cache="miss") as attributes:
+        if use_cache:
+            cached = page_cache.get(key)
+            # Entries cached before sources were recorded are plain strings, and refetched
+            if isinstance(cached, dict):
+                attributes["cache"] = "hit"
+                increment("cache_requests_total", cache="page", result="hit")
+                return cached["description"], cached["source"]
+        increment("cache_requests_total", cache="page", result="miss")
+        description, source = fetch_description(url)
+        page_cache.set(key, {"description": description, "source": source})
+        return description, source
+
+
+# Source recorded when the page gave nothing and only the domain goes into the prompt
+SOURCE_DOMAIN = "domain"
+
+
+def fallback_description(root_domain):
+    return f"Website with domain {root_domain}"
+
+
+def generate_keywords(api_key, root_domain, meta_description, use_cache=True, structured=STRUCTURED_OUTPUT,
+                      on_progress=None, route=None, reuse=REUSE):
+    """Return (keywords, method, gpt_response, model, similar) for one site.
+
+    Each model in the route is asked in turn until one answers with at least
+    MIN_CONFIDENCE; ``on_progress`` starts again from no keywords when a
+    model's answer is passed up to the next one. ``similar`` is the
+    near-duplicate site whose keywords were reused or adapted, or None.
+    """
+    route = route or ROUTE
+    similar = find_similar_site(api_key, root_domain, meta_description) if use_cache and reuse != REUSE_OFF else None
+    if similar is not None and reuse == REUSE_KEYWORDS:
+        return similar["keywords"], METHOD_REUSED, "", similar["model"], similar
+    if similar is not None:
+        gpt_response = adapt_response(api_key, root_domain, meta_description, similar["keywords"], use_cache,
+                                      on_progress, route[0])
+        keywords, method = keywords_from_response(gpt_response)
+        if keyword_confidence(keywords, method, root_domain) >= MIN_CONFIDENCE:
+            return keywords, method, gpt_response, route[0], similar
+        # A poor adaptation: run the full prompt instead
+        if on_progress is not None:
+            on_progress("", [])
+
+    model = route[0]
+    while True:
+        gpt_response, used_structured = generate_response(api_key, root_domain, meta_description, use_cache,
+                                                          structured, on_progress, model)
+        keywords, method = keywords_from_response(gpt_response, used_structured)
+        confidence = keyword_confidence(keywords, method, root_domain)
+        escalate_to = escalation(model, confidence, root_domain, route)
+        if escalate_to is None:
+            if reuse != REUSE_OFF:
+                remember_site(api_key, root_domain, meta_description, keywords, model, confidence)
+            return keywords, method, gpt_response, model, None
+        if on_progress is not None:
+            on_progress("", [])
+        model = escalate_to
+
+
+def escalation(model, confidence, root_domain="", route=None):
+    """The next model to ask if an answer isn't confident enough, else None."""
+    if confidence >= MIN_CONFIDENCE:
+        return None
+    escalate_to = next_model(model, route)
+    if escalate_to is not None:
+        logger.info("%s answer for %s scored %.2f; asking %s", model, root_domain, confidence, escalate_to)
+        increment("model_escalations_total", model=model)
+    return escalate_to
+
+
+def generate_response(api_key, root_domain, meta_description, use_cache=True, structured=STRUCTURED_OUTPUT,
+                      on_progress=None, model=MODEL):
+    """Return (gpt_response, structured); structured is False if the text format was used instead."""
+    if structured:
+        prompt = build_prompt(root_domain, meta_description, structured=True)
+        try:
+            return call_llm(api_key, prompt, use_cache, response_format=RESPONSE_FORMAT,
+                            on_progress=on_progress, model=model), True
+        except StructuredOutputUnsupported:
+            pass
+    return call_llm(api_key, build_prompt(root_domain, meta_description), use_cache, on_progress=on_progress,
+                    model=model), False
+
+
+def find_similar_site(api_key, root_domain, meta_description):
+    """The indexed site closest to this description, if it is similar enough to reuse, else None."""
+    # Every site described only by its domain would look alike
+    if meta_description == fallback_description(root_domain):
+        return None
+    from .similar import embed, get_similarity_index
+    with span("similar") as attributes:
+        similar = get_similarity_index().nearest(embed(normalize_description(meta_description), api_key),
+                                                 exclude=root_domain)
+        attributes["match"] = similar["root_domain"] if similar else "none"
+    increment("similar_sites_total", result="hit" if similar else "miss")
+    if similar is not None:
+        logger.info("%s is %.2f similar to %s", root_domain, similar["similarity"], similar["root_domain"])
+    return similar
+
+
+def remember_site(api_key, root_domain, meta_description, keywords, model, confidence):
+    """Index a site's keywords for near-duplicates to reuse, if they are confident enough."""
+    if confidence < MIN_CONFIDENCE or meta_description == fallback_description(root_domain):
+        return
+    from .similar import embed, get_similarity_index
+    description = normalize_description(meta_description)
+    get_similarity_index().add(root_domain, description, keywords, model, embed(description, api_key))
+
+
+def adapt_response(api_key, root_domain, meta_description, keywords, use_cache=True, on_progress=None,
+                   model=MODEL):
+    """Return a text-format response adapting a similar site's keywords to this one."""
+    prompt = build_adapt_prompt(root_domain, meta_description, keywords)
+    return call_llm(api_key, prompt, use_cache, on_progress=on_progress, model=model)
+
+
+def keywords_from_response(gpt_response, structured=False):
+    """Return (keywords, method) from a JSON or text response, cleaned and deduplicated (see postprocess.py)."""
+    with span("extract") as attributes:
+        keywords, method = _keywords_from_response(gpt_response, structured)
+        attributes.update(method=method, keywords=len(keywords))
+    increment("extraction_method_total", method=method)
+    return keywords, method
+
+
+def _keywords_from_response(gpt_response, structured):
+    if structured:
+        try:
+            steps = parse_structured_response(gpt_response)
+        except ValueError:
+            # e.g. a refusal in prose: still worth a look for keywords
+            pass
+        else:
+            return normalize_keywords(steps[FINAL_STEP_KEY])[:MAX_KEYWORDS], METHOD_JSON
+    # Cleaned before the cut, so variants of one keyword don't take up several places
+    keywords, method = extract(gpt_response, limit=None)
+    return normalize_keywords(keywords)[:MAX_KEYWORDS], method
+
+
+def call_llm(api_key, prompt, use_cache=True, response_format=None, on_progress=None, model=MODEL):
+    # Responses don't depend on the API key, so they're shared between users
+    key = llm_cache_key(model, SYSTEM_MESSAGE, prompt)
+    output_format = "json" if response_format else "text"
+    with span("llm", model=model, format=output_format, cache="miss") as attributes:
+        if use_cache:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                attributes["cache"] = "hit"
+                increment("cache_requests_total", cache="llm", result="hit")
+                return cached
+        increment("cache_requests_total", cache="llm", result="miss")
+        with span("completion"):
+            gpt_response, usage = _complete(api_key, prompt, response_format, on_progress, model)
+        record_usage(output_format, usage, model)
+        llm_cache.set(key, gpt_response)
+        return gpt_response
+
+
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _complete(api_key, prompt, response_format=None, on_progress=None, model=MODEL):
+    messages = build_messages(prompt)
+    options = {"response_format": response_format} if response_format else {}
+    stream = STREAM_RESPONSES
+    try:
+        # For newer versions of OpenAI Python library
+        client = get_openai_client(api_key)
+        if stream:
+            options.update(stream=True, stream_options={"include_usage": True})
+        response = client.chat.completions.create(model=model, messages=messages, **options)
+    except (ImportError, TypeError):
+        # For older versions of OpenAI Python library, which can't request a JSON schema
+        if response_format:
+            raise StructuredOutputUnsupported()
+        import openai
+        openai.api_key = api_key
+        response = openai.ChatCompletion.create(model=model, messages=messages)
+        response.choices[0].message = type('obj', (object,), {
+            'content': response.choices[0].message.content
+        })
+        stream = False
+
+    if stream:
+        return _read_stream(response, prompt, bool(response_format), on_progress)
+    return response.choices[0].message.content or "", getattr(response, "usage", None)
+
+
+def _read_stream(stream, prompt, structured, on_progress=None):
+    """Return (content, usage) from a streamed completion, stopping once the keywords are complete."""
+    extractor = StreamExtractor(structured)
+    usage = None
+    started = time.perf_counter()
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if not extractor.text:
+                first_token_ms = (time.perf_counter() - started) * 1000
+                annotate(first_token_ms=round(first_token_ms, 3))
+                observe("first_token", first_token_ms)
+            keywords = extractor.feed(chunk.choices[0].delta.content)
+            if on_progress is not None:
+                on_progress(extractor.text, keywords)
+            if extractor.can_stop:
+                annotate(stopped_early=True)
+                break
+    finally:
+        # Drops the connection if the response is still coming
+        stream.close()
+    if usage is None:
+        # Stopped before the usage chunk, so the counts are estimates
+        usage = {"prompt_tokens": count_tokens(SYSTEM_MESSAGE + prompt),
+                 "completion_tokens": count_tokens(extractor.text)}
+    return extractor.text, usage
+
+
+def _usage_value(usage, name):
+    # The legacy library returns usage as a dict, the current one as an object
+    if isinstance(usage, dict):
+        return usage.get(name) or 0
+    return getattr(usage, name, 0) or 0
+
+
+def record_usage(output_format, usage, model=MODEL):
+    if usage is None:
+        return
+    prompt_tokens = _usage_value(usage, "prompt_tokens")
+    completion_tokens = _usage_value(usage, "completion_tokens")
+    # Prompt tokens served from the provider's prefix cache
+    cached_tokens = _usage_value(_usage_value(usage, "prompt_tokens_details") or {}, "cached_tokens")
+    logger.info("%s %s call: %d prompt tokens (%d cached), %d completion tokens",
+                model, output_format, prompt_tokens, cached_tokens, completion_tokens)
+    annotate(prompt_tokens=prompt_tokens, cached_tokens=cached_tokens, completion_tokens=completion_tokens)
+    increment("llm_tokens_total", prompt_tokens, kind="prompt", model=model)
+    increment("llm_tokens_total", cached_tokens, kind="cached", model=model)
+    increment("llm_tokens_total", completion_tokens, kind="completion", model=model)
+    cost = token_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+    if cost is not None:
+        annotate(cost_usd=round(cost, 6))
+        increment("llm_cost_usd_total", cost, model=model)
+    with _usage_lock:
+        totals = usage_totals[output_format]
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["cached_tokens"] += cached_tokens
+        totals["completion_tokens"] += completion_tokens
+
+
+def average_completion_tokens(output_format):
+    totals = usage_totals[output_format]
+    if not totals["calls"]:
+        return None
+    return totals["completion_tokens"] / totals["calls"]
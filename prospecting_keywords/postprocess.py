@@ -0,0 +1,88 @@
+"""Keyword clean-up: one spelling per keyword, and one keyword per meaning on a site.
+
+The fallback extraction strategies pick up whatever the response had around
+a keyword, so ``clean_keyword`` lowercases it and takes off list numbering,
+quotes, brackets, a trailing note in parentheses and end punctuation, and
+drops placeholders such as "Keyword 1". ``keyword_key`` folds a keyword's
+inflections (plurals, possessives, a final "e" or "y") into one key, with a
+few suffix rules in place of a full lemmatizer: "Dog Toys", "dog toy" and
+"[dog-toys]" share a key, so ``normalize_keywords`` keeps only the first of
+them for a site.
+"""
+
+import re
+import unicodedata
+
+# Numbering and bullets in front of a keyword: "1.", "2)", "-", "*", "•"
+LIST_MARKER = re.compile(r'^(?:\d+[\.\)]|[-*•·])\s*')
+WRAPPERS = "\"'`“”‘’«»[](){}<>*_"
+TRAILING_NOTE = re.compile(r'\s*\([^()]*\)$')
+END_PUNCTUATION = ".,;:!?"
+# Brackets and double quotes left inside, e.g. "(organic) coffee"; apostrophes stay
+STRAY_MARKS = re.compile(r'[\[\](){}<>"“”«»`]')
+WHITESPACE = re.compile(r'\s+')
+# Template text a model sometimes returns instead of keywords, as the whole keyword:
+# "keyword", "Keyword 1", "kw_2", "Term #3", "N/A"; a bare "term" or "example" is a real word
+PLACEHOLDER = re.compile(r'keywords?|(?:keyword|kw|term|phrase|example)s?\s*[#_-]?\s*\d+|n/a|tbd|\W*')
+# A word, with a trailing "+" or "#" kept so "c++" and "c#" aren't "c"
+KEY_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?[+#]*")
+# Words ending in "s" that aren't plurals, or whose singular wouldn't be wanted
+UNCHANGED_WORDS = frozenset(("news", "series", "species", "physics", "mathematics", "athletics", "gymnastics",
+                             "economics", "politics", "ethics", "aerobics", "diabetes", "lens", "chaos", "canvas"))
+
+
+def clean_keyword(keyword):
+    """The keyword in lowercase without numbering, quotes or brackets; "" for a placeholder."""
+    text = WHITESPACE.sub(" ", unicodedata.normalize("NFKC", keyword)).strip()
+    text = LIST_MARKER.sub("", text)
+    # Wrappers can nest, e.g. "[\"dog toys\"]", and a note can follow: "dog toys (high volume)"
+    while True:
+        stripped = TRAILING_NOTE.sub("", text) if not text.startswith("(") else text
+        stripped = stripped.strip(WRAPPERS + END_PUNCTUATION + " ")
+        if stripped == text:
+            break
+        text = stripped
+    text = WHITESPACE.sub(" ", STRAY_MARKS.sub("", text)).strip().lower()
+    return "" if PLACEHOLDER.fullmatch(text) else text
+
+
+def _word_key(word):
+    if word in UNCHANGED_WORDS or len(word) <= 3:
+        return word
+    if word.endswith("'s"):
+        word = word[:-2]
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith(("xes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    # Singulars and what's left of plurals end the same way from here: "movie"
+    # and "movies", "accessory" and "accessories" both end in "i"
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith(("y", "i")):
+        word = word[:-1] + "i"
+    return word
+
+
+def _cleaned_key(cleaned):
+    return " ".join(_word_key(word) for word in KEY_WORD.findall(cleaned))
+
+
+def keyword_key(keyword):
+    """The key a keyword's variants share: its words, in order, with inflections folded."""
+    return _cleaned_key(clean_keyword(keyword))
+
+
+def normalize_keywords(keywords):
+    """Clean the keywords and keep the first of any that share a key, in order."""
+    normalized = []
+    seen = set()
+    for keyword in keywords:
+        cleaned = clean_keyword(keyword)
+        key = _cleaned_key(cleaned)
+        if cleaned and key and key not in seen:
+            seen.add(key)
+            normalized.append(cleaned)
+    return normalized
@@ -0,0 +1,151 @@
+"""Prompt building: meta description clean-up, token budgets and a cacheable prefix.
+
+All static instructions come first and the site-specific domain and
+description last, so every request with the same output format shares an
+identical prefix that the provider can cache. Descriptions are decoded,
+whitespace-collapsed, de-duplicated and cut to a token budget before they go in.
+"""
+
+import html
+import re
+
+from .structured import JSON_OUTPUT_FORMAT, TEXT_OUTPUT_FORMAT
+
+ENCODING_MODEL = "gpt-4o"
+DESCRIPTION_TOKEN_BUDGET = 150
+# Rough size of a token when tiktoken isn't available
+CHARS_PER_TOKEN = 4
+ELLIPSIS = "…"
+
+WHITESPACE = re.compile(r'\s+')
+# A phrase up to and including its separator: a comma-like mark, or a sentence end
+SEGMENT = re.compile(r'.+?(?:[,;|•·]|[.!?](?=\s)|$)', re.DOTALL)
+SEGMENT_PUNCTUATION = " ,;|•·.!?"
+
+PROMPT_PREFIX = """# Task Instructions
+You are a Link Builder for the website described at the end of this message. Your task is to create a list of 5 prospecting keywords that, when searched in Google, will help you find blogs and websites that are relevant to the website's products. These blogs should be potential candidates for link building opportunities.
+First, review the website's meta description, given at the end of this message, to better understand the website's products and industry.
+Next, follow these instructions step-by-step.
+Step 1. Identify the 3 most relevant keywords that describe the website's main top-level categories.
+Step 2. Identify the 3 most relevant keywords that describe the website's specific product categories.
+Step 3. Identify the 3 most relevant keywords that describe the website's broader categories.
+Step 4. Identify the 3 most relevant industry the website belongs to.
+Step 5. Review the final list of all keywords and select just the top 5 most relevant keywords that would match relevant article titles.
+Guidelines
+ - All keywords must be short and only contain 1-2 words so they can match more relevant articles.
+ - Skip any overly general keywords that could return irrelevant blogs and websites for a different search intent.
+ - Avoid the use of adjectives (cheap, used, etc.).
+ - Avoid overly generic terms or common words that have multiple meanings/applications and could match irrelevant articles (equipment, tools, DIY, solutions).
+{output_format}
+Remember to focus on keywords that will help you find relevant articles that are likely to be interested in the client's products and could potentially become link building partners.
+"""
+
+PROMPT_SUFFIX = """# Website
+<domain>
+{root_domain}
+</domain>
+<meta_description>
+{meta_description}
+</meta_description>
+"""
+
+# For a site whose description is nearly the same as one already analyzed: the
+# other site's keywords are adapted instead of running the five steps again
+ADAPT_PROMPT_PREFIX = """# Task Instructions
+You are a Link Builder for the website described at the end of this message. The 5 prospecting keywords below were chosen for a website with a very similar meta description. Adapt them to this website: keep the keywords that fit its products, and replace the ones that don't with keywords that, when searched in Google, will help you find blogs and websites relevant to this website's products.
+Guidelines
+ - All keywords must be short and only contain 1-2 words so they can match more relevant articles.
+ - Avoid brand names, adjectives (cheap, used, etc.) and overly generic terms (equipment, tools, DIY, solutions).
+# Output Format
+Respond with the 5 keywords only, in the following format:
+<step_5_keywords>
+1. [Keyword 1]
+2. [Keyword 2]
+3. [Keyword 3]
+4. [Keyword 4]
+5. [Keyword 5]
+</step_5_keywords>
+"""
+
+ADAPT_PROMPT_KEYWORDS = """# Keywords for the similar website
+<similar_keywords>
+{keywords}
+</similar_keywords>
+"""
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    # tiktoken is optional, and may need to download its tables on first use
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(ENCODING_MODEL)
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is None:
+        cut = text[:max_tokens * CHARS_PER_TOKEN]
+    else:
+        cut = encoding.decode(encoding.encode(text)[:max_tokens])
+    # Don't end on half a word
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(SEGMENT_PUNCTUATION) + ELLIPSIS
+
+
+def dedupe_phrases(text):
+    # Keyword-stuffed descriptions repeat the same phrases over and over
+    seen = set()
+    kept = []
+    for segment in SEGMENT.findall(text):
+        key = segment.strip(SEGMENT_PUNCTUATION).lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        kept.append(segment)
+    return "".join(kept).strip(" ,;|•·")
+
+
+def normalize_description(meta_description, max_tokens=DESCRIPTION_TOKEN_BUDGET):
+    text = html.unescape(meta_description)
+    text = WHITESPACE.sub(" ", text).strip()
+    text = WHITESPACE.sub(" ", dedupe_phrases(text)).strip()
+    return truncate_to_tokens(text, max_tokens)
+
+
+def prompt_prefix(structured=False):
+    return PROMPT_PREFIX.format(output_format=JSON_OUTPUT_FORMAT if structured else TEXT_OUTPUT_FORMAT)
+
+
+def build_prompt(root_domain, meta_description, structured=False, max_description_tokens=DESCRIPTION_TOKEN_BUDGET):
+    return prompt_prefix(structured) + PROMPT_SUFFIX.format(
+        root_domain=root_domain,
+        meta_description=normalize_description(meta_description, max_description_tokens),
+    )
+
+
+def build_adapt_prompt(root_domain, meta_description, keywords, max_description_tokens=DESCRIPTION_TOKEN_BUDGET):
+    return ADAPT_PROMPT_PREFIX + ADAPT_PROMPT_KEYWORDS.format(
+        keywords="\n".join(f"{i}. {keyword}" for i, keyword in enumerate(keywords, 1)),
+    ) + PROMPT_SUFFIX.format(
+        root_domain=root_domain,
+        meta_description=normalize_description(meta_description, max_description_tokens),
+    )
@@ -0,0 +1,91 @@
+"""Model routing: ask a cheaper model first and escalate when its answer looks weak.
+
+The route is a list of models, cheapest first. Each answer gets a confidence
+score from what the prompt asks for: five keywords, read from the structured
+output or the step 5 block, of one or two words each, no repeats, and none of
+the brand names, adjectives or generic terms the guidelines rule out. An
+answer below MIN_CONFIDENCE (including one with no keywords at all) goes to
+the next model in the route; the last model's answer is always kept.
+
+Set the route with PROSPECTING_KEYWORDS_MODELS, e.g. ``gpt-4o`` alone to turn
+routing off. MIN_CONFIDENCE was picked with benchmarks/bench_routing.py.
+"""
+
+import os
+
+from .extract import MAX_KEYWORDS, METHOD_NUMBERED_LIST, METHOD_QUOTES, METHOD_STEP5_PATTERNS, METHOD_STEP5_TAG
+from .structured import METHOD_JSON
+
+DEFAULT_ROUTE = ("gpt-4o-mini", "gpt-4o")
+ROUTE = tuple(model.strip() for model in os.environ.get("PROSPECTING_KEYWORDS_MODELS", "").split(",")
+              if model.strip()) or DEFAULT_ROUTE
+MIN_CONFIDENCE = 0.8
+
+# How much each extraction method can be trusted to have found the final list
+METHOD_CONFIDENCE = {
+    METHOD_JSON: 1.0,
+    METHOD_STEP5_TAG: 1.0,
+    METHOD_STEP5_PATTERNS: 0.8,
+    METHOD_NUMBERED_LIST: 0.5,
+    METHOD_QUOTES: 0.4,
+}
+MAX_KEYWORD_WORDS = 2
+# Shorter domain names would be found inside too many ordinary keywords
+MIN_BRAND_CHARS = 4
+# Words the prompt's guidelines ask the model to avoid
+AVOIDED_WORDS = frozenset((
+    "cheap", "used", "best", "top", "affordable", "quality", "online", "shop", "store",
+    "equipment", "tools", "diy", "solutions", "products", "services",
+))
+
+# USD per million tokens: (input, cached input, output), at list prices
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+
+def keyword_confidence(keywords, method, root_domain=""):
+    """Score a keyword list from 0 to 1 by how closely it follows the prompt."""
+    if not keywords:
+        return 0.0
+    score = METHOD_CONFIDENCE.get(method, 0.5)
+    score *= min(len(keywords), MAX_KEYWORDS) / MAX_KEYWORDS
+
+    normalized = [" ".join(keyword.lower().split()) for keyword in keywords]
+    score *= len(set(normalized)) / len(normalized)
+
+    # The site's own name finds the site, not prospects
+    brand = root_domain.split(".")[0].lower()
+    usable = 0
+    for keyword in normalized:
+        words = keyword.split()
+        if len(words) > MAX_KEYWORD_WORDS or AVOIDED_WORDS.intersection(words):
+            continue
+        if len(brand) >= MIN_BRAND_CHARS and brand in keyword.replace(" ", "").replace("-", ""):
+            continue
+        usable += 1
+    score *= 0.5 + 0.5 * usable / len(normalized)
+    return round(score, 3)
+
+
+def next_model(model, route=None):
+    """The model to escalate to after ``model``, or None at the end of the route."""
+    route = route or ROUTE
+    if model not in route:
+        return None
+    position = route.index(model)
+    return route[position + 1] if position + 1 < len(route) else None
+
+
+def token_cost(model, prompt_tokens=0, cached_tokens=0, completion_tokens=0):
+    """Cost of a call in USD, or None for a model without a known price."""
+    prices = PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
@@ -0,0 +1,225 @@
+"""A small asyncio HTTP service in front of the pipeline.
+
+    POST /keywords        {"url": "https://example.com"}
+    POST /keywords/batch  {"urls": ["https://example.com", ...]}
+    GET  /healthz
+    GET  /metrics         stage latency histograms and counters, Prometheus text format
+
+Both POST endpoints accept an optional ``"structured": false`` to use the
+tagged text format. A batch analyzes each registrable domain once and copies
+its result to every URL on that domain. The pipeline itself is blocking, so each URL runs on a
+worker thread; a semaphore caps how many run at once, per process. Scale out
+by running more processes behind the queue or load balancer. ``--reuse``
+answers near-duplicates of sites already analyzed from their keywords (see
+similar.py); each result's ``reused_from`` names the site they came from.
+
+    python -m prospecting_keywords.service --port 8080 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+from .batch import DEFAULT_LLM_CONCURRENCY, analyze_url, normalize_url
+from .domains import group_by_domain
+from .metrics import registry
+from .pipeline import REUSE, REUSE_MODES, STRUCTURED_OUTPUT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_URLS = 1000
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 30
+RESULT_FIELDS = ("url", "root_domain", "meta_description", "description_source", "model", "keywords", "confidence",
+                 "method", "reused_from", "similarity", "error")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _result(row):
+    return {field: row[field] for field in RESULT_FIELDS}
+
+
+class KeywordService:
+    def __init__(self, api_key, concurrency=DEFAULT_LLM_CONCURRENCY, reuse=REUSE):
+        self.api_key = api_key
+        self.reuse = reuse
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pipeline")
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(self, url, structured):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            row = await loop.run_in_executor(self.executor, partial(
+                analyze_url, normalize_url(url), self.api_key, structured=structured, reuse=self.reuse))
+        return _result(row)
+
+    async def dispatch(self, method, path, body):
+        if path == "/healthz":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return {"status": "ok"}
+        if path == "/metrics":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET")
+            return registry.prometheus_text()
+        if path not in ("/keywords", "/keywords/batch"):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        if method != "POST":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        structured = bool(payload.get("structured", STRUCTURED_OUTPUT))
+
+        if path == "/keywords":
+            url = payload.get("url")
+            if not isinstance(url, str) or not url.strip():
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "'url' is required")
+            return await self.analyze(url, structured)
+
+        urls = payload.get("urls")
+        if not isinstance(urls, list) or not all(isinstance(url, str) and url.strip() for url in urls):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'urls' must be a list of URLs")
+        if len(urls) > MAX_BATCH_URLS:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_URLS} URLs per request")
+        groups = list(group_by_domain(urls).values())
+        unique = await asyncio.gather(*(self.analyze(urls[indexes[0]], structured) for indexes in groups))
+        results = [None] * len(urls)
+        for indexes, result in zip(groups, unique):
+            for index in indexes:
+                results[index] = dict(result, url=normalize_url(urls[index]))
+        return {"results": results}
+
+    async def read_request(self, reader, request_line):
+        """Return (method, path, version, headers, body) for a request, or raise HTTPError."""
+        if request_line is None:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request line too long")
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        method, path, version = parts
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Longer than the stream reader's limit
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Header line too long") from None
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, colon, value = line.decode("latin-1").partition(":")
+            if not colon or not name.strip():
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed header line")
+            headers[name.strip().lower()] = value.strip()
+
+        # Only bodies with a Content-Length are read, so a chunked body can't be
+        # mistaken for the next request
+        length = headers.get("content-length")
+        if "transfer-encoding" in headers or (length is None and method == "POST"):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "Send the body with a Content-Length")
+        if length is not None and not (length.isascii() and length.isdigit()):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        length = int(length or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, path, version, headers, body
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    # Longer than the stream reader's limit
+                    request_line = None
+                if request_line is not None and not request_line.strip():
+                    break
+                # Until the request is read in full, an error leaves the
+                # connection at an unknown point, so it is closed after the response
+                path, keep_alive = "", False
+                try:
+                    method, path, version, headers, body = await self.read_request(reader, request_line)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    status, payload = HTTPStatus.OK, await self.dispatch(method, path.split("?", 1)[0], body)
+                except HTTPError as e:
+                    status, payload = HTTPStatus(e.status), {"error": str(e)}
+                except asyncio.IncompleteReadError:
+                    raise
+                except Exception:
+                    logger.exception("Request to %s failed", path)
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"}
+
+                # Text payloads are the Prometheus metrics, everything else is JSON
+                if isinstance(payload, str):
+                    content_type, data = "text/plain; version=0.0.4", payload.encode("utf-8")
+                else:
+                    content_type, data = "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info("Listening on %s", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the prospecting keywords pipeline over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="URLs analyzed at once by this process")
+    parser.add_argument("--reuse", choices=REUSE_MODES, default=REUSE,
+                        help="what to do with near-duplicates of sites already analyzed (needs numpy)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("set OPENAI_API_KEY")
+
+    async def run():
+        await KeywordService(api_key, args.concurrency, args.reuse).serve(args.host, args.port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
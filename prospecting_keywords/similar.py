@@ -0,0 +1,247 @@
+"""Near-duplicate sites: a cosine index over the descriptions already analyzed.
+
+Many prospects are stores on the same theme with the same niche copy. Every
+site whose keywords come back confident enough is added to an index of
+description embeddings, and a new description whose nearest neighbour is at
+least SIMILARITY_THRESHOLD (cosine) can take that site's keywords instead of a
+full prompt (see ``pipeline.REUSE``).
+
+Embeddings are local by default: signed, hashed counts of the description's
+words and word pairs, leaving out function words and the shipping and
+checkout copy that every store theme repeats. They are deterministic and need
+no network, and near-identical copy is exactly what they match. Set
+PROSPECTING_KEYWORDS_EMBEDDINGS to an OpenAI embedding model, e.g.
+``text-embedding-3-small``, to match on meaning instead; each embedding model
+keeps its own entries.
+
+The vectors live in one NumPy matrix, searched exhaustively: at MAX_ENTRIES a
+lookup is a single matrix-vector product of a few milliseconds (see
+benchmarks/bench_similar.py). Entries are saved to SQLite as they are added,
+and once the index is full the least recently matched one is evicted.
+
+Needs NumPy: ``pip install prospecting-keywords[similar]``.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from .cache import DEFAULT_CACHE_PATH, LRUCache
+from .clients import get_openai_client
+
+DEFAULT_SIMILAR_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "similar.sqlite3")
+# An empty PROSPECTING_KEYWORDS_SIMILAR keeps the index in memory, for this process only
+SIMILAR_PATH = os.environ.get("PROSPECTING_KEYWORDS_SIMILAR", DEFAULT_SIMILAR_PATH)
+LOCAL_EMBEDDINGS = "local"
+EMBEDDINGS = os.environ.get("PROSPECTING_KEYWORDS_EMBEDDINGS", LOCAL_EMBEDDINGS)
+EMBEDDING_DIM = 512
+# Picked with benchmarks/bench_similar.py, for the local embeddings
+SIMILARITY_THRESHOLD = 0.6
+MAX_ENTRIES = 20_000
+EMBEDDING_CACHE_ENTRIES = 1024
+
+WORD = re.compile(r"[^\W\d_]+")
+# Words that say nothing about what a site sells: English function words and
+# the boilerplate of store themes
+IGNORED_WORDS = frozenset("""
+a about all an and any are as at be by can for from get has have in into is it its more most my no not of on
+or our out over than that the their this to up us we with you your yours
+buy day days delivery discover explore find free just new next now off offer online order orders range
+returns sale save shipping shop shopping shops site store stores today uk usa visit website welcome worldwide
+""".split())
+
+_embeddings = LRUCache(EMBEDDING_CACHE_ENTRIES)
+
+
+def _feature_slot(feature):
+    # A stable hash, unlike hash(), so vectors are the same in every process
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % EMBEDDING_DIM, 1.0 if value >> 63 else -1.0
+
+
+def local_embedding(text):
+    """A unit vector of hashed word and word-pair counts."""
+    words = []
+    for word in WORD.findall(text.casefold()):
+        if len(word) < 2 or word in IGNORED_WORDS:
+            continue
+        # Plurals count as the singular
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    features = Counter(words)
+    features.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature, count in features.items():
+        slot, sign = _feature_slot(feature)
+        # Repeated words count, but not linearly
+        vector[slot] += sign * (1 + math.log(count))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def openai_embedding(api_key, text, model):
+    response = get_openai_client(api_key).embeddings.create(model=model, input=text)
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def embed(text, api_key=None, embeddings=EMBEDDINGS):
+    """The description's embedding, from the local hash or the OpenAI model named by ``embeddings``."""
+    key = (embeddings, text)
+    vector = _embeddings.get(key)
+    if vector is None:
+        if embeddings == LOCAL_EMBEDDINGS:
+            vector = local_embedding(text)
+        else:
+            vector = openai_embedding(api_key, text, embeddings)
+        _embeddings.set(key, vector)
+    return vector
+
+
+class SimilarityIndex:
+    """Sites' descriptions, keywords and embeddings, searched by cosine similarity."""
+
+    def __init__(self, path=":memory:", embeddings=EMBEDDINGS, max_entries=MAX_ENTRIES):
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS similar_sites ("
+            " id INTEGER PRIMARY KEY,"
+            " embeddings TEXT NOT NULL,"
+            " root_domain TEXT NOT NULL,"
+            " meta_description TEXT NOT NULL,"
+            " keywords TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " used_at REAL NOT NULL,"
+            " UNIQUE (embeddings, root_domain))"
+        )
+        # Row i of the matrix is site i; rows past _size are spare capacity
+        self._vectors = None
+        self._used_at = np.zeros(0)
+        self._sites = []
+        self._positions = {}
+        self._size = 0
+
+        records = self._conn.execute(
+            "SELECT id, root_domain, meta_description, keywords, model, vector, used_at FROM similar_sites"
+            " WHERE embeddings = ? ORDER BY used_at DESC LIMIT ?", (embeddings, max_entries)
+        ).fetchall()
+        for record_id, root_domain, meta_description, keywords, model, vector, used_at in reversed(records):
+            site = {"id": record_id, "root_domain": root_domain, "meta_description": meta_description,
+                    "keywords": json.loads(keywords), "model": model}
+            self._append(site, np.frombuffer(vector, dtype=np.float32), used_at)
+        # Entries beyond the cap, e.g. after it was lowered
+        self._conn.execute(
+            "DELETE FROM similar_sites WHERE embeddings = ? AND id NOT IN ("
+            " SELECT id FROM similar_sites WHERE embeddings = ? ORDER BY used_at DESC LIMIT ?)",
+            (embeddings, embeddings, max_entries),
+        )
+
+    def __len__(self):
+        return self._size
+
+    def _append(self, site, vector, used_at):
+        if self._vectors is None:
+            self._vectors = np.zeros((16, len(vector)), dtype=np.float32)
+            self._used_at = np.zeros(16)
+        elif self._size == len(self._vectors):
+            # Doubling keeps appends cheap on average
+            capacity = min(2 * len(self._vectors), max(self.max_entries, 16))
+            self._vectors = np.resize(self._vectors, (capacity, self._vectors.shape[1]))
+            self._used_at = np.resize(self._used_at, capacity)
+        self._vectors[self._size] = vector
+        self._used_at[self._size] = used_at
+        self._sites.append(site)
+        self._positions[site["root_domain"]] = self._size
+        self._size += 1
+
+    def _remove(self, position):
+        # The last site moves into the gap, so the matrix stays dense
+        site = self._sites[position]
+        last = self._size - 1
+        if position != last:
+            self._vectors[position] = self._vectors[last]
+            self._used_at[position] = self._used_at[last]
+            self._sites[position] = self._sites[last]
+            self._positions[self._sites[position]["root_domain"]] = position
+        self._sites.pop()
+        del self._positions[site["root_domain"]]
+        self._size = last
+        self._conn.execute("DELETE FROM similar_sites WHERE id = ?", (site["id"],))
+
+    def add(self, root_domain, meta_description, keywords, model, vector):
+        """Index a site's keywords, replacing its earlier entry if it has one."""
+        now = time.time()
+        with self._lock:
+            if root_domain in self._positions:
+                self._remove(self._positions[root_domain])
+            elif self._size >= self.max_entries:
+                self._remove(int(np.argmin(self._used_at[:self._size])))
+            record_id = self._conn.execute(
+                "INSERT INTO similar_sites (embeddings, root_domain, meta_description, keywords, model, vector,"
+                " used_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.embeddings, root_domain, meta_description, json.dumps(keywords, ensure_ascii=False), model,
+                 np.asarray(vector, dtype=np.float32).tobytes(), now),
+            ).lastrowid
+            site = {"id": record_id, "root_domain": root_domain, "meta_description": meta_description,
+                    "keywords": list(keywords), "model": model}
+            self._append(site, vector, now)
+
+    def nearest(self, vector, threshold=SIMILARITY_THRESHOLD, exclude=""):
+        """The closest other site at or above ``threshold``, with its ``similarity``, or None."""
+        with self._lock:
+            if not self._size:
+                return None
+            similarities = self._vectors[:self._size] @ vector
+            if exclude in self._positions:
+                similarities[self._positions[exclude]] = -1.0
+            position = int(np.argmax(similarities))
+            similarity = float(similarities[position])
+            if similarity < threshold:
+                return None
+            site = self._sites[position]
+            # A match counts as a use for eviction
+            now = time.time()
+            self._used_at[position] = now
+            self._conn.execute("UPDATE similar_sites SET used_at = ? WHERE id = ?", (now, site["id"]))
+            return dict(site, keywords=list(site["keywords"]), similarity=round(similarity, 4))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM similar_sites WHERE embeddings = ?", (self.embeddings,))
+            self._vectors = None
+            self._used_at = np.zeros(0)
+            self._sites = []
+            self._positions = {}
+            self._size = 0
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """The process-wide index, opened on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex(SIMILAR_PATH or ":memory:")
+        return _index
@@ -0,0 +1,110 @@
+"""Incremental keyword extraction over a streamed GPT-4o response.
+
+``StreamExtractor`` is fed the response a delta at a time and keeps the final
+keyword list as far as it has been written, cleaned and deduplicated like the
+final one (see postprocess.py), so the page can show each keyword as soon as
+its line is complete. In the text format the list is done at
+``</step_5_keywords>``, and the rest of the response (usually a closing
+paragraph) isn't needed; in the JSON format ``step_5_keywords`` is the last
+key, so the list is done when its array closes.
+
+Only the step 5 block is read here. Once the stream ends (or is cut off), the
+whole text still goes through ``keywords_from_response`` for the final answer,
+which returns the same list whenever the block was complete.
+"""
+
+import json
+import re
+
+from .extract import MAX_KEYWORDS, tagged_items
+from .postprocess import normalize_keywords
+from .structured import FINAL_STEP_KEY
+
+OPEN_TAG = "<step_5_keywords>"
+CLOSE_TAG = "</step_5_keywords>"
+FINAL_ARRAY = re.compile(r'"%s"\s*:\s*\[' % FINAL_STEP_KEY)
+ARRAY_SEPARATORS = " \t\r\n,"
+KEY_LOOKBEHIND = 64
+
+
+class StreamExtractor:
+    def __init__(self, structured=False):
+        self.structured = structured
+        self.text = ""
+        self.keywords = []
+        # JSON: the list's items as written, before clean-up
+        self._items = []
+        # True once the final list is closed
+        self.done = False
+        # Offset of the step 5 list body, once its opening has streamed in
+        self._start = None
+        # JSON: offset just past the last complete array item
+        self._pos = None
+
+    @property
+    def can_stop(self):
+        """Whether the rest of the stream can be dropped without changing the result."""
+        # In JSON only the closing brace is left, and a complete document is cached
+        return self.done and bool(self.keywords) and not self.structured
+
+    def feed(self, delta):
+        """Add a delta and return the keywords found so far."""
+        if self.done or not delta:
+            self.text += delta or ""
+            return self.keywords
+        previous_length = len(self.text)
+        self.text += delta
+        if self.structured:
+            self._feed_json(previous_length)
+        else:
+            self._feed_tagged(previous_length)
+        return self.keywords
+
+    def _feed_tagged(self, previous_length):
+        if self._start is None:
+            # The tag may have been split across deltas
+            start = self.text.find(OPEN_TAG, max(0, previous_length - len(OPEN_TAG)))
+            if start == -1:
+                return
+            self._start = start + len(OPEN_TAG)
+            previous_length = self._start
+        end = self.text.find(CLOSE_TAG, max(self._start, previous_length - len(CLOSE_TAG)))
+        if end != -1:
+            self.done = True
+            section = self.text[self._start:end]
+        else:
+            # Only whole lines; the last one may still be growing
+            section = self.text[self._start:self.text.rfind("\n", self._start) + 1]
+        if "\n" in self.text[previous_length:] or self.done:
+            self.keywords = normalize_keywords(tagged_items(section))[:MAX_KEYWORDS]
+
+    def _feed_json(self, previous_length):
+        if self._pos is None:
+            # Back up far enough to catch a key split across deltas
+            match = FINAL_ARRAY.search(self.text, max(0, previous_length - KEY_LOOKBEHIND))
+            if match is None:
+                return
+            self._pos = match.end()
+        text = self.text
+        while True:
+            pos = self._pos
+            while pos < len(text) and text[pos] in ARRAY_SEPARATORS:
+                pos += 1
+            if pos >= len(text):
+                return
+            if text[pos] == "]":
+                self.done = True
+                return
+            if text[pos] != '"':
+                # Not a list of strings; leave it to the full parse
+                self.done = True
+                return
+            try:
+                value, end = json.decoder.scanstring(text, pos + 1)
+            except ValueError:
+                # The string hasn't finished streaming
+                return
+            if value.strip() and len(self.keywords) < MAX_KEYWORDS:
+                self._items.append(value)
+                self.keywords = normalize_keywords(self._items)[:MAX_KEYWORDS]
+            self._pos = end
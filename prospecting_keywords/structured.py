@@ -0,0 +1,66 @@
+"""Structured (JSON schema) output for the GPT-4o call.
+
+Instead of the ``<step_N_keywords>`` blocks, the model is asked for a JSON
+object with one keyword list per step, which is validated and read directly.
+Clients that can't send a ``response_format`` fall back to the text prompt and
+the regex extraction in ``extract``.
+"""
+
+import json
+
+METHOD_JSON = "json"
+STEP_KEYS = tuple(f"step_{step}_keywords" for step in range(1, 6))
+FINAL_STEP_KEY = STEP_KEYS[-1]
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {key: {"type": "array", "items": {"type": "string"}} for key in STEP_KEYS},
+    "required": list(STEP_KEYS),
+    "additionalProperties": False,
+}
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "prospecting_keywords", "strict": True, "schema": RESPONSE_SCHEMA},
+}
+
+TEXT_OUTPUT_FORMAT = """# Output Format 
+Provide a separate list for each of the steps above. Present your list of keywords in the following format:
+<step_1_keywords>
+1. [Keyword 1]
+2. [Keyword 2]
+3. [Keyword 3]
+...
+</step_1_keywords>
+<step_2_keywords>
+1. [Keyword 1]
+2. [Keyword 2]
+3. [Keyword 3]
+...
+</step_2_keywords>"""
+
+JSON_OUTPUT_FORMAT = """# Output Format
+Respond with a JSON object only, with no explanation. It must have the keys step_1_keywords, step_2_keywords, step_3_keywords, step_4_keywords and step_5_keywords, each a list of the keywords chosen in that step. step_5_keywords must contain exactly 5 keywords."""
+
+
+class StructuredOutputUnsupported(Exception):
+    """The installed OpenAI library can't request a JSON schema response."""
+
+
+def parse_structured_response(content):
+    """Validate a JSON response and return {step key: [keywords]}; raises ValueError."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Response is not valid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+
+    steps = {}
+    for key in STEP_KEYS:
+        values = data.get(key)
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"{key} must be a list of strings")
+        steps[key] = [value.strip() for value in values if value.strip()]
+    if not steps[FINAL_STEP_KEY]:
+        raise ValueError(f"{FINAL_STEP_KEY} is empty")
+    return steps
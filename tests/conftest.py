@@ -0,0 +1,6 @@
+import os
+
+# Keep the tests' pages, responses, jobs and similar sites out of the real
+# stores; set before any test module imports the package
+for name in ("PROSPECTING_KEYWORDS_CACHE", "PROSPECTING_KEYWORDS_JOBS", "PROSPECTING_KEYWORDS_SIMILAR"):
+    os.environ[name] = ""
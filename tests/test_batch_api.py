@@ -0,0 +1,333 @@
+"""Batch API jobs against a local fake files/batches endpoint.
+
+A few sites are served from their own loopback addresses (so each is its own
+registrable domain), next to a fake OpenAI API with ``/v1/files`` and
+``/v1/batches``: the upload is parsed, the batch goes through "validating"
+and "in_progress" to "completed", and the output and error files hold one
+line per request, with the request for one site failing. A site with nothing
+listening stands in for one that can't be reached.
+
+The job is also killed and resumed at each stage: part way through fetching
+(with a line cut short), after submitting, and part way through collecting.
+Every resume must carry on from its checkpoints (only lost rows fetched again,
+one upload, one batch) and end with the same CSV as a run straight through.
+"""
+
+import csv
+import email
+import email.policy
+import http.server
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+import pytest
+
+from prospecting_keywords import batch_api, clients
+from prospecting_keywords.batch_api import RESULTS_FILE, ROWS_FILE, BatchJob
+from prospecting_keywords.cache import llm_cache, page_cache
+from prospecting_keywords.clients import get_openai_client
+from prospecting_keywords.structured import STEP_KEYS
+
+# Loopback address -> (description, keywords GPT-4o gives for it)
+SITES = {
+    "127.0.0.2": ("Handmade oak dining tables and chairs", ["oak dining tables", "handmade furniture",
+                                                            "dining chairs", "solid wood tables", "oak furniture"]),
+    "127.0.0.3": ("Single origin coffee beans roasted to order", ["coffee beans", "single origin coffee",
+                                                                  "coffee roasters", "espresso beans",
+                                                                  "fresh roasted coffee"]),
+    "127.0.0.4": ("Natural dog treats and chews", ["dog treats", "natural dog chews", "pet food",
+                                                   "dog snacks", "puppy treats"]),
+}
+# The site whose batch request fails, and the address with nothing listening
+FAILING_SITE = "127.0.0.4"
+UNREACHABLE = "127.0.0.9"
+FAILED_MESSAGE = "The model produced invalid content."
+POLL_INTERVAL = 0.01
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    hits = Counter()
+
+    def do_GET(self):
+        host = self.server.server_address[0]
+        SiteHandler.hits[host] += 1
+        description = SITES[host][0]
+        body = f'<html><head><meta name="description" content="{description}"></head></html>'.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def completion(custom_id, body):
+    # The answer for whichever site the prompt is about
+    prompt = body["messages"][-1]["content"]
+    host = next(host for host, (description, _) in SITES.items() if description in prompt)
+    if host == FAILING_SITE:
+        return None, {"status_code": 500, "request_id": f"req-{custom_id}",
+                      "body": {"error": {"message": FAILED_MESSAGE, "type": "server_error"}}}
+    keywords = SITES[host][1]
+    content = json.dumps({key: keywords for key in STEP_KEYS})
+    return {"status_code": 200, "request_id": f"req-{custom_id}", "body": {
+        "id": f"chatcmpl-{custom_id}", "object": "chat.completion", "created": 0, "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    }}, None
+
+
+class FakeOpenAI(http.server.BaseHTTPRequestHandler):
+    """Just enough of /v1/files and /v1/batches for BatchJob."""
+
+    protocol_version = "HTTP/1.1"
+    files = {}
+    batches = {}
+    calls = Counter()
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def add_file(self, content, purpose):
+        file_id = f"file-{len(FakeOpenAI.files) + 1}"
+        FakeOpenAI.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                "filename": "requests.jsonl", "purpose": purpose, "status": "processed"}
+
+    def batch_object(self, batch):
+        return {"id": batch["id"], "object": "batch", "endpoint": batch_api.ENDPOINT, "created_at": 0,
+                "input_file_id": batch["input_file_id"], "completion_window": batch_api.COMPLETION_WINDOW,
+                "status": batch["status"], "output_file_id": batch.get("output_file_id"),
+                "error_file_id": batch.get("error_file_id"),
+                "request_counts": {"total": batch["total"], "completed": batch.get("completed", 0),
+                                   "failed": batch.get("failed", 0)}}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/v1/files":
+            FakeOpenAI.calls["files.create"] += 1
+            # The multipart form, parsed as a MIME message
+            message = email.message_from_bytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode("ascii") + b"\r\n\r\n" + body,
+                policy=email.policy.HTTP)
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                      for part in message.iter_parts()}
+            self.send_json(self.add_file(fields["file"], fields["purpose"].decode("utf-8")))
+        elif self.path == "/v1/batches":
+            FakeOpenAI.calls["batches.create"] += 1
+            request = json.loads(body)
+            lines = FakeOpenAI.files[request["input_file_id"]].decode("utf-8").splitlines()
+            batch = {"id": f"batch-{len(FakeOpenAI.batches) + 1}", "input_file_id": request["input_file_id"],
+                     "status": "validating", "total": len(lines), "lines": lines, "polls": 0}
+            FakeOpenAI.batches[batch["id"]] = batch
+            self.send_json(self.batch_object(batch))
+        else:
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+        if match:
+            FakeOpenAI.calls["batches.retrieve"] += 1
+            batch = FakeOpenAI.batches[match.group(1)]
+            batch["polls"] += 1
+            if batch["polls"] == 1:
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                self.finish_batch(batch)
+            self.send_json(self.batch_object(batch))
+            return
+        match = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+        if match:
+            FakeOpenAI.calls["files.content"] += 1
+            content = FakeOpenAI.files[match.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self.send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def finish_batch(self, batch):
+        output, errors = [], []
+        for line in batch["lines"]:
+            request = json.loads(line)
+            response, error_response = completion(request["custom_id"], request["body"])
+            record = {"id": f"batch_req-{request['custom_id']}", "custom_id": request["custom_id"],
+                      "response": response or error_response, "error": None}
+            (output if response else errors).append(json.dumps(record))
+        batch.update(status="completed", completed=len(output), failed=len(errors),
+                     output_file_id=self.add_file(("\n".join(output) + "\n").encode("utf-8"),
+                                                  "batch_output")["id"],
+                     error_file_id=self.add_file(("\n".join(errors) + "\n").encode("utf-8"),
+                                                 "batch_output")["id"] if errors else None)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(handler, host="127.0.0.1"):
+    server = http.server.ThreadingHTTPServer((host, 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def kill():
+    # A killed job's process loses its in-memory caches
+    page_cache.clear()
+    llm_cache.clear()
+    SiteHandler.hits.clear()
+    FakeOpenAI.calls.clear()
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def cut_short(path, keep):
+    # Keep the first ``keep`` lines and half of the next, as a kill mid-write would
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:keep])
+        if len(lines) > keep:
+            f.write(lines[keep][:len(lines[keep]) // 2])
+    return len(lines)
+
+
+def check_results(rows, urls, fetched_sites):
+    by_url = {row["url"]: row for row in rows}
+    assert [row["url"] for row in rows] == urls, [row["url"] for row in rows]
+    for host, (_, keywords) in SITES.items():
+        row = by_url[fetched_sites[host]]
+        if host == FAILING_SITE:
+            assert row["error"] == FAILED_MESSAGE and not row["keyword_1"], row
+        else:
+            assert not row["error"] and [row[f"keyword_{i}"] for i in range(1, 6)] == keywords, row
+    unreachable = by_url[fetched_sites[UNREACHABLE]]
+    assert unreachable["error"] and not unreachable["keyword_1"], unreachable
+    # The second URL on the first site shares its row
+    first = next(iter(SITES))
+    assert by_url[fetched_sites[first] + "about"]["keyword_1"] == SITES[first][1][0]
+
+
+def run_job(job_dir, urls, client, output, stop_after=None):
+    job = BatchJob(job_dir, urls)
+    if stop_after is None:
+        job.run(client, output, POLL_INTERVAL)
+        return job
+    for stage in ("fetch", "submit", "poll", "collect"):
+        if stage == "fetch":
+            job.fetch()
+        elif stage == "poll":
+            job.poll(client, POLL_INTERVAL)
+        else:
+            getattr(job, stage)(client)
+        if stage == stop_after:
+            return job
+
+
+@pytest.fixture(scope="module")
+def setup():
+    """(client, URL per site, the job's URLs) with the sites and the fake API running."""
+    site_servers = [serve(SiteHandler, host) for host in SITES]
+    api = serve(FakeOpenAI)
+    client = get_openai_client("sk-test-batch", f"http://127.0.0.1:{api.server_port}/v1")
+    # A port with nothing listening on it
+    closed = http.server.HTTPServer((UNREACHABLE, 0), SiteHandler)
+    closed_port = closed.server_port
+    closed.server_close()
+
+    fetched_sites = {host: f"http://{host}:{server.server_port}/" for host, server in zip(SITES, site_servers)}
+    fetched_sites[UNREACHABLE] = f"http://{UNREACHABLE}:{closed_port}/"
+    first = next(iter(SITES))
+    urls = list(fetched_sites.values()) + [fetched_sites[first] + "about"]
+    yield client, fetched_sites, urls
+    for server in site_servers + [api]:
+        server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(clients.host_limiter, "min_interval", 0)
+    kill()
+
+
+@pytest.fixture(scope="module")
+def expected(setup, tmp_path_factory):
+    """The CSV of a run straight through."""
+    client, _, urls = setup
+    work = tmp_path_factory.mktemp("straight")
+    kill()
+    run_job(str(work / "job"), urls, client, str(work / "out.csv"))
+    return read_csv(str(work / "out.csv"))
+
+
+def test_run_straight_through(setup, tmp_path):
+    client, fetched_sites, urls = setup
+    job = run_job(str(tmp_path / "job"), urls, client, str(tmp_path / "out.csv"))
+    check_results(read_csv(str(tmp_path / "out.csv")), urls, fetched_sites)
+    # One request per reachable site; the unreachable one and the second URL aren't sent
+    assert FakeOpenAI.calls["files.create"] == FakeOpenAI.calls["batches.create"] == 1
+    assert FakeOpenAI.batches[job.state["batch_id"]]["total"] == len(SITES)
+    assert job.state["status"] == "completed" and FakeOpenAI.calls["batches.retrieve"] == 2
+    assert SiteHandler.hits == Counter(list(SITES))
+
+
+def test_resume_after_kill_mid_fetch(setup, expected, tmp_path):
+    client, fetched_sites, urls = setup
+    job_dir = str(tmp_path / "job")
+    run_job(job_dir, urls, client, None, stop_after="fetch")
+    # Killed with one row written and the next cut short
+    cut_short(os.path.join(job_dir, ROWS_FILE), 1)
+    kept = batch_api._read_jsonl(os.path.join(job_dir, ROWS_FILE))[0]["url"]
+    kill()
+    run_job(job_dir, None, client, str(tmp_path / "out.csv"))
+    # Only the rows lost with the kill are fetched again
+    assert SiteHandler.hits == Counter(host for host, url in fetched_sites.items() if host in SITES and url != kept)
+    assert read_csv(str(tmp_path / "out.csv")) == expected
+
+
+def test_resume_after_submit(setup, expected, tmp_path):
+    client, _, urls = setup
+    job_dir = str(tmp_path / "job")
+    batch_id = run_job(job_dir, urls, client, None, stop_after="submit").state["batch_id"]
+    kill()
+    job = run_job(job_dir, None, client, str(tmp_path / "out.csv"))
+    # The batch is polled, not fetched or submitted again
+    assert job.state["batch_id"] == batch_id and not SiteHandler.hits
+    assert FakeOpenAI.calls["files.create"] == FakeOpenAI.calls["batches.create"] == 0
+    assert read_csv(str(tmp_path / "out.csv")) == expected
+
+
+def test_resume_after_kill_mid_collect(setup, expected, tmp_path):
+    client, _, urls = setup
+    job_dir = str(tmp_path / "job")
+    run_job(job_dir, urls, client, str(tmp_path / "out.csv"))
+    cut_short(os.path.join(job_dir, RESULTS_FILE), 1)
+    kill()
+    run_job(job_dir, None, client, str(tmp_path / "out.csv"))
+    assert not SiteHandler.hits and not FakeOpenAI.calls["batches.create"]
+    results = batch_api._read_jsonl(os.path.join(job_dir, RESULTS_FILE))
+    assert sorted(result["index"] for result in results) == list(range(len(SITES)))
+    assert read_csv(str(tmp_path / "out.csv")) == expected
+
+
+def test_resume_needs_the_same_urls(setup, tmp_path):
+    _, _, urls = setup
+    BatchJob(str(tmp_path / "job"), urls)
+    with pytest.raises(batch_api.BatchJobError):
+        BatchJob(str(tmp_path / "job"), urls[:1])
+    with pytest.raises(batch_api.BatchJobError):
+        BatchJob(str(tmp_path / "empty"))
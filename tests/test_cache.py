@@ -0,0 +1,151 @@
+"""The two-tier cache against a SQLite file in a temporary directory."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from prospecting_keywords import cache
+from prospecting_keywords.cache import LRUCache, SQLiteStore, TieredCache, normalize_url_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake time.time for the cache module; advance it with ``clock.now += seconds``."""
+    fake = SimpleNamespace(now=1_000_000.0)
+    fake.time = lambda: fake.now
+    monkeypatch.setattr(cache, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache" / "cache.sqlite3")
+
+
+@pytest.fixture
+def store(path):
+    return SQLiteStore(path)
+
+
+def test_lru_drops_the_least_recently_used():
+    lru = LRUCache(max_entries=3)
+    for key in "abc":
+        lru.set(key, key.upper())
+    # Reading "a" makes "b" the oldest
+    assert lru.get("a") == "A"
+    lru.set("d", "D")
+    assert len(lru) == 3 and lru.get("b") is None
+    assert [lru.get(key) for key in "acd"] == ["A", "C", "D"]
+
+
+def test_memory_cap(store):
+    tiered = TieredCache("page", store, memory_max_entries=2)
+    for i in range(5):
+        tiered.set(f"k{i}", i)
+    assert len(tiered.memory) == 2
+    # The rest are still on disk, and a read brings them back into memory
+    assert tiered.get("k0") == 0 and tiered.memory.get("k0") == 0
+
+
+def test_expiry_in_memory(clock):
+    tiered = TieredCache("page", ttl=60)
+    tiered.set("key", "value")
+    clock.now += 59
+    assert tiered.get("key") == "value"
+    clock.now += 1
+    assert tiered.get("key", "gone") == "gone" and len(tiered.memory) == 0
+
+
+def test_expiry_on_disk(clock, store):
+    tiered = TieredCache("page", store, ttl=60)
+    tiered.set("key", "value")
+    tiered.memory.clear()
+    clock.now += 60
+    assert tiered.get("key") is None
+    # The expired row is deleted on read
+    assert store.count("page") == 0
+
+
+def test_no_ttl_never_expires(clock, store):
+    tiered = TieredCache("llm", store, ttl=None)
+    tiered.set("key", {"keywords": ["a"]})
+    clock.now += 10 ** 9
+    tiered.memory.clear()
+    assert tiered.get("key") == {"keywords": ["a"]}
+
+
+def test_disk_eviction_above_the_cap(clock, store, monkeypatch):
+    monkeypatch.setattr(cache, "EVICT_EVERY", 10)
+    tiered = TieredCache("page", store, disk_max_entries=4)
+    for i in range(9):
+        clock.now += 1
+        tiered.set(f"k{i}", i)
+    # Reading k0 from disk makes it recently used
+    tiered.memory.clear()
+    clock.now += 1
+    assert tiered.get("k0") == 0
+    assert store.count("page") == 9
+    clock.now += 1
+    tiered.set("k9", 9)
+    # The tenth write evicts down to the cap, oldest access first
+    assert store.count("page") == 4
+    assert [key for key in (f"k{i}" for i in range(10)) if store.get("page", key)] == ["k0", "k7", "k8", "k9"]
+
+
+def test_eviction_drops_expired_rows_first(clock, store):
+    tiered = TieredCache("page", store, ttl=60)
+    tiered.set("old", 1)
+    clock.now += 30
+    tiered.set("new", 2)
+    clock.now += 30
+    store.evict("page", 10)
+    assert store.count("page") == 1 and store.get("page", "new") is not None
+
+
+def test_invalidate(store):
+    tiered = TieredCache("page", store)
+    tiered.set("a", 1)
+    tiered.set("b", 2)
+    tiered.invalidate("a")
+    assert tiered.get("a") is None and tiered.get("b") == 2
+    assert store.get("page", "a") is None
+
+
+def test_clear_keeps_other_namespaces(store):
+    pages = TieredCache("page", store)
+    llm = TieredCache("llm", store)
+    pages.set("key", "page")
+    llm.set("key", "llm")
+    pages.clear()
+    assert pages.get("key") is None and len(pages.memory) == 0
+    assert llm.get("key") == "llm" and store.count("llm") == 1
+
+
+def test_survives_a_new_cache_on_the_same_file(path):
+    TieredCache("llm", SQLiteStore(path)).set("key", {"keywords": ["oak furniture"], "usage": None})
+    # A new process: a new store and an empty memory tier on the same file
+    reopened = TieredCache("llm", SQLiteStore(path))
+    assert len(reopened.memory) == 0
+    assert reopened.get("key") == {"keywords": ["oak furniture"], "usage": None}
+    assert reopened.memory.get("key") == {"keywords": ["oak furniture"], "usage": None}
+
+
+def test_memory_only_without_a_store():
+    tiered = TieredCache("page")
+    tiered.set("key", [1, 2])
+    tiered.invalidate("key")
+    assert tiered.get("key") is None
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://example.com", "https://example.com/"),
+    ("https://example.com:443/", "https://example.com/"),
+    ("http://example.com:80/a", "http://example.com/a"),
+    ("http://example.com:443/", "http://example.com:443/"),
+    ("https://example.com:8443/", "https://example.com:8443/"),
+    ("HTTPS://Example.COM/Path?Q=1", "https://example.com/Path?Q=1"),
+    ("https://example.com/page#section", "https://example.com/page"),
+    ("  https://example.com/?a=1#x  ", "https://example.com/?a=1"),
+], ids=["no-path", "https-port", "http-port", "other-default-port", "custom-port", "case", "fragment", "spaces"])
+def test_normalize_url_key(url, expected):
+    assert normalize_url_key(url) == expected
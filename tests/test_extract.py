@@ -0,0 +1,54 @@
+"""Keyword extraction against the recorded GPT responses and the original regex chain's results."""
+
+import json
+import os
+
+import pytest
+
+from prospecting_keywords.extract import (
+    METHOD_NUMBERED_LIST,
+    METHOD_QUOTES,
+    METHOD_STEP5_PATTERNS,
+    METHOD_STEP5_TAG,
+    extract,
+)
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "benchmarks", "fixtures", "gpt_responses.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("record", load_corpus(), ids=lambda record: record["id"])
+def test_recorded_responses(record):
+    assert extract(record["response"]) == (record["keywords"], record["method"])
+
+
+def test_limit():
+    response = "<step_5_keywords>\n" + "".join(f"{i}. [Keyword {i}]\n" for i in range(1, 8)) + "</step_5_keywords>"
+    assert extract(response) == ([f"Keyword {i}" for i in range(1, 6)], METHOD_STEP5_TAG)
+    assert extract(response, limit=None) == ([f"Keyword {i}" for i in range(1, 8)], METHOD_STEP5_TAG)
+
+
+def test_empty_tag_falls_back_to_heading():
+    response = "<step_5_keywords>\n</step_5_keywords>\nStep 5: \n1. Alpha\n# next\n2. Beta"
+    assert extract(response) == (["Alpha"], METHOD_STEP5_PATTERNS)
+
+
+def test_heading_matches_case_insensitively():
+    # U+017F (long s) matches "s" case-insensitively, as it did for the original patterns
+    assert extract("ſtep 5:\n1. Alpha\n2) Beta\n") == (["Alpha", "Beta"], METHOD_STEP5_PATTERNS)
+
+
+def test_long_untagged_response():
+    # The worst case for the "final list of.*?keywords" heading, which never matches here
+    response = "Reviewing the final list of products, keywords, and categories.\n" * 300 + "1. Garden Tools\n"
+    assert extract(response) == (["Garden Tools"], METHOD_NUMBERED_LIST)
+
+
+def test_quotes_skip_long_phrases():
+    response = 'Try "dog toys" or [cat beds], not "a phrase that is much too long to be a keyword".'
+    assert extract(response) == (["dog toys", "cat beds"], METHOD_QUOTES)
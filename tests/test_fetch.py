@@ -0,0 +1,225 @@
+"""Bounded page fetches against a local server of misbehaving sites.
+
+Each site is slow to answer, trickles or stalls its body, is far too big,
+redirects forever, fails, isn't HTML, or is in another encoding than the one
+it declares. Every fetch must end with the expected description or FetchError
+subclass within the deadline, which is shortened here so the run is quick.
+"""
+
+import gzip
+import http.server
+import threading
+import time
+
+import pytest
+
+from prospecting_keywords import clients, fetch
+from prospecting_keywords.fetch import (
+    BadStatus,
+    ConnectionFailed,
+    FetchTimeout,
+    InvalidURL,
+    NotHTML,
+    TooManyRedirects,
+    fetch_description,
+)
+from prospecting_keywords.meta import CHUNK_SIZE, MAX_HEAD_BYTES, SOURCE_META, SOURCE_TITLE
+from prospecting_keywords.metrics import recording
+
+DEADLINE = 1.0
+# Allowance over the deadline for thread scheduling and closing the connection
+SLACK = 0.5
+
+DESCRIPTION = "Handmade oak furniture, built to order in Yorkshire"
+PAGE = f'<html><head><title>Oak</title><meta name="description" content="{DESCRIPTION}"></head><body></body></html>'
+ACCENTED = "Café crème, pâtisserie & “artisan” bread"
+LATIN1 = "Café crème, pâtisserie & artisan bread"
+
+
+def page(description, charset_meta=""):
+    return (f'<html><head>{charset_meta}<title>Bakery</title>'
+            f'<meta name="description" content="{description}"></head><body></body></html>')
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.close_connection = True
+        name, _, arg = self.path.lstrip("/").partition("/")
+        try:
+            getattr(self, "site_" + name.replace("-", "_"))(arg)
+        except OSError:
+            # The client gave up first, as it should
+            pass
+
+    def send(self, status, body=b"", content_type="text/html", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self, content_type="text/html"):
+        # No length: the body runs until the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+    def site_fast(self, _):
+        self.send(200, PAGE.encode("utf-8"), "text/html; charset=utf-8")
+
+    def site_slow_headers(self, _):
+        time.sleep(DEADLINE * 4)
+        self.send(200, PAGE.encode("utf-8"))
+
+    def site_drip(self, _):
+        # The title, then one byte at a time and never the end of the head
+        self.start_stream()
+        self.wfile.write(b"<html><head><title>A page that never finishes loading</title>")
+        self.wfile.flush()
+        for _ in range(int(DEADLINE * 4 / 0.05)):
+            self.wfile.write(b" ")
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def site_stall(self, _):
+        self.start_stream()
+        time.sleep(DEADLINE * 4)
+
+    def site_huge(self, _):
+        # 64 MB with no end to the head
+        self.start_stream()
+        padding = b"<!-- " + b"x" * (CHUNK_SIZE - 9) + b" -->"
+        self.wfile.write(b"<html><head><title>Huge</title>")
+        for _ in range(64 * 1024 * 1024 // len(padding)):
+            self.wfile.write(padding)
+
+    def site_gzip(self, _):
+        self.send(200, gzip.compress(PAGE.encode("utf-8")), headers=[("Content-Encoding", "gzip")])
+
+    def site_loop(self, _):
+        self.send(302, headers=[("Location", "/loop")])
+
+    def site_chain(self, arg):
+        hops = int(arg)
+        self.send(301, headers=[("Location", f"/chain/{hops - 1}" if hops > 1 else "/fast")])
+
+    def site_missing(self, _):
+        self.send(404, b"<html><head><meta name='description' content='Page not found'></head></html>")
+
+    def site_unavailable(self, _):
+        self.send(503, b"Down for maintenance", headers=[("Retry-After", "3600")])
+
+    def site_pdf(self, _):
+        self.send(200, b"%PDF-1.4 " + b"0" * 100_000, "application/pdf")
+
+    def site_latin1_meta(self, _):
+        self.send(200, page(LATIN1, '<meta charset="ISO-8859-1">').encode("latin-1"))
+
+    def site_http_equiv(self, _):
+        meta = '<meta http-equiv="Content-Type" content="text/html; charset=windows-1252">'
+        self.send(200, page(ACCENTED, meta).encode("cp1252"))
+
+    def site_undeclared(self, _):
+        self.send(200, page(ACCENTED).encode("cp1252"))
+
+    def site_mislabelled(self, _):
+        self.send(200, page(ACCENTED).encode("cp1252"), "text/html; charset=utf-8")
+
+    def site_utf8_bom(self, _):
+        self.send(200, b"\xef\xbb\xbf" + page(ACCENTED).encode("utf-8"), "text/html; charset=iso-8859-1")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def base():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def short_deadline(monkeypatch):
+    monkeypatch.setattr(fetch, "FETCH_DEADLINE", DEADLINE)
+    monkeypatch.setattr(fetch, "CONNECT_TIMEOUT", DEADLINE)
+    monkeypatch.setattr(fetch, "READ_TIMEOUT", DEADLINE)
+    monkeypatch.setattr(clients.host_limiter, "min_interval", 0)
+
+
+def bytes_read(spans):
+    return sum(s["attributes"].get("bytes", 0) for s in spans if s["name"] == "read_page")
+
+
+def timed_fetch(url):
+    started = time.perf_counter()
+    try:
+        outcome = fetch_description(url)
+    except Exception as e:
+        outcome = e
+    return outcome, time.perf_counter() - started
+
+
+ACCENTED_META = (ACCENTED, SOURCE_META)
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("fast", (DESCRIPTION, SOURCE_META)),
+    ("gzip", (DESCRIPTION, SOURCE_META)),
+    ("chain/3", (DESCRIPTION, SOURCE_META)),
+    ("slow-headers", FetchTimeout),
+    ("stall", FetchTimeout),
+    ("drip", ("A page that never finishes loading", SOURCE_TITLE)),
+    ("huge", ("Huge", SOURCE_TITLE)),
+    ("loop", TooManyRedirects),
+    ("missing", BadStatus),
+    ("unavailable", BadStatus),
+    ("pdf", NotHTML),
+    ("latin1-meta", (LATIN1, SOURCE_META)),
+    ("http-equiv", ACCENTED_META),
+    ("undeclared", ACCENTED_META),
+    ("mislabelled", ACCENTED_META),
+    ("utf8-bom", ACCENTED_META),
+])
+def test_site(base, path, expected):
+    outcome, elapsed = timed_fetch(base + path)
+    if isinstance(expected, type):
+        assert isinstance(outcome, expected), outcome
+    else:
+        assert outcome == expected
+    assert elapsed <= DEADLINE + SLACK
+
+
+def test_connection_refused():
+    # A port with nothing listening on it
+    closed = http.server.HTTPServer(("127.0.0.1", 0), SiteHandler)
+    port = closed.server_port
+    closed.server_close()
+    outcome, elapsed = timed_fetch(f"http://127.0.0.1:{port}/")
+    assert isinstance(outcome, ConnectionFailed), outcome
+    assert elapsed <= DEADLINE + SLACK
+
+
+def test_invalid_url():
+    with pytest.raises(InvalidURL):
+        fetch_description("http://")
+
+
+def test_bad_status_keeps_the_status(base):
+    with pytest.raises(BadStatus) as info:
+        fetch_description(base + "missing")
+    assert info.value.status == 404 and info.value.reason == "status"
+
+
+def test_huge_page_read_is_capped(base):
+    spans = []
+    with recording(spans):
+        fetch_description(base + "huge")
+    assert 0 < bytes_read(spans) <= MAX_HEAD_BYTES + CHUNK_SIZE
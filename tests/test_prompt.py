@@ -0,0 +1,98 @@
+"""Description clean-up, token budgets and the shared prompt prefix."""
+
+import pytest
+
+from prospecting_keywords import prompt
+from prospecting_keywords.prompt import (
+    ELLIPSIS,
+    build_adapt_prompt,
+    build_prompt,
+    count_tokens,
+    dedupe_phrases,
+    normalize_description,
+    prompt_prefix,
+    truncate_to_tokens,
+)
+from prospecting_keywords.structured import JSON_OUTPUT_FORMAT, TEXT_OUTPUT_FORMAT
+
+
+@pytest.fixture(autouse=True)
+def no_tiktoken(monkeypatch):
+    # The same character estimate whether or not tiktoken is installed
+    monkeypatch.setattr(prompt, "_encoding", None)
+    monkeypatch.setattr(prompt, "_encoding_loaded", True)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Dog toys, dog treats, Dog Toys, dog beds", "Dog toys, dog treats, dog beds"),
+    ("Fresh bread daily. Fresh bread daily! Cakes to order.", "Fresh bread daily. Cakes to order."),
+    ("Oak | Pine | oak | Walnut |", "Oak | Pine | Walnut"),
+    ("Tables • Chairs • Tables", "Tables • Chairs"),
+    ("Dog toys, great dog toys", "Dog toys, great dog toys"),
+    ("", ""),
+], ids=["comma", "sentence", "pipe", "bullet", "not-a-repeat", "empty"])
+def test_dedupe_phrases(text, expected):
+    assert dedupe_phrases(text) == expected
+
+
+def test_normalize_decodes_entities():
+    assert normalize_description("Fish &amp; chips &ndash; &quot;fresh&quot; &#8217;daily&#x2019;") == \
+        "Fish & chips – \"fresh\" ’daily’"
+
+
+def test_normalize_collapses_whitespace():
+    assert normalize_description("  Oak\n\n tables,\t\tpine&nbsp;&nbsp;chairs  ") == "Oak tables, pine chairs"
+
+
+def test_normalize_drops_repeated_phrases():
+    stuffed = "Cheap flights, cheap flights, CHEAP FLIGHTS,&nbsp;cheap\nflights, holidays, Holidays."
+    assert normalize_description(stuffed) == "Cheap flights, holidays"
+
+
+def test_short_text_is_left_alone():
+    assert truncate_to_tokens("Handmade oak furniture", 10) == "Handmade oak furniture"
+    assert normalize_description("Handmade oak furniture") == "Handmade oak furniture"
+
+
+def test_truncate_cuts_at_a_word_boundary():
+    text = "Handmade oak dining tables, chairs and sideboards built to order in our Yorkshire workshop"
+    cut = truncate_to_tokens(text, 10)
+    assert cut.endswith(ELLIPSIS)
+    body = cut[:-len(ELLIPSIS)]
+    # Within the budget, a prefix of the text, ending on a whole word without its trailing comma
+    assert count_tokens(body) <= 10 and text.startswith(body)
+    assert text[len(body)] in " ," and not body.endswith((" ", ","))
+    assert body == "Handmade oak dining tables, chairs and"
+
+
+def test_truncate_strips_punctuation_before_the_ellipsis():
+    assert truncate_to_tokens("Alpha beta, gamma delta epsilon", 3) == "Alpha beta" + ELLIPSIS
+
+
+def test_normalize_applies_the_budget():
+    description = " ".join(f"word{i}" for i in range(200))
+    normalized = normalize_description(description, max_tokens=20)
+    assert normalized.endswith(ELLIPSIS) and count_tokens(normalized[:-1]) <= 20
+
+
+@pytest.mark.parametrize("structured, output_format", [(False, TEXT_OUTPUT_FORMAT), (True, JSON_OUTPUT_FORMAT)],
+                         ids=["text", "json"])
+def test_prompts_share_the_prefix(structured, output_format):
+    first = build_prompt("oak-tables.co.uk", "Handmade oak tables", structured)
+    second = build_prompt("dogtreats.com", "Natural dog treats &amp; chews", structured)
+    prefix = prompt_prefix(structured)
+    assert output_format in prefix
+    assert first.startswith(prefix) and second.startswith(prefix)
+    # Everything site-specific comes after the prefix
+    assert "oak-tables.co.uk" not in prefix and "Handmade oak tables" in first[len(prefix):]
+    assert "Natural dog treats & chews" in second[len(prefix):]
+
+
+def test_text_and_json_prefixes_differ():
+    assert prompt_prefix(False) != prompt_prefix(True)
+
+
+def test_adapt_prompt_lists_the_keywords():
+    adapted = build_adapt_prompt("dogtreats.com", "Natural dog treats", ["dog treats", "pet food"])
+    assert "1. dog treats\n2. pet food" in adapted
+    assert adapted.index("<similar_keywords>") < adapted.index("<domain>")
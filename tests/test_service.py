@@ -0,0 +1,143 @@
+"""The HTTP service over a real socket, with the pipeline stubbed out."""
+
+import asyncio
+import json
+
+import pytest
+
+from prospecting_keywords import service
+from prospecting_keywords.batch import new_row
+from prospecting_keywords.domains import registrable_domain
+from prospecting_keywords.service import MAX_BATCH_URLS, MAX_BODY_BYTES, KeywordService
+
+
+@pytest.fixture
+def analyzed(monkeypatch):
+    """The URLs the stubbed pipeline was asked to analyze."""
+    urls = []
+
+    def analyze_url(url, api_key, structured=True, reuse=None, **kwargs):
+        urls.append(url)
+        row = new_row(0, url)
+        row.update(root_domain=registrable_domain(url), keywords=[f"{registrable_domain(url)} keyword"],
+                   method="json" if structured else "step_5_tag")
+        return row
+
+    monkeypatch.setattr(service, "analyze_url", analyze_url)
+    return urls
+
+
+def exchange(*requests):
+    """Send raw requests on one connection; return the (status, headers, body) responses until it closes."""
+
+    async def run():
+        keyword_service = KeywordService("sk-test", concurrency=2)
+        server = await asyncio.start_server(keyword_service.handle_connection, "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(b"".join(requests))
+            await writer.drain()
+            responses = []
+            while True:
+                status_line = await asyncio.wait_for(reader.readline(), 5)
+                if not status_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers["content-length"]))
+                responses.append((int(status_line.split()[1]), headers, body))
+                if headers["connection"] == "close":
+                    break
+            writer.close()
+            return responses
+
+    return asyncio.run(run())
+
+
+def post(path, payload, connection="keep-alive"):
+    body = json.dumps(payload).encode("utf-8") if not isinstance(payload, bytes) else payload
+    return (f"POST {path} HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {connection}\r\n\r\n").encode("latin-1") + body
+
+
+def get(path, connection="close"):
+    return f"GET {path} HTTP/1.1\r\nHost: test\r\nConnection: {connection}\r\n\r\n".encode("latin-1")
+
+
+def test_single_url(analyzed):
+    [(status, headers, body)] = exchange(post("/keywords", {"url": "example.com"}, "close"))
+    assert status == 200 and headers["content-type"] == "application/json"
+    result = json.loads(body)
+    assert result["url"] == "https://example.com" and result["keywords"] == ["example.com keyword"]
+    assert result["method"] == "json" and set(result) == set(service.RESULT_FIELDS)
+    assert analyzed == ["https://example.com"]
+
+
+def test_text_format(analyzed):
+    [(status, _, body)] = exchange(post("/keywords", {"url": "example.com", "structured": False}, "close"))
+    assert status == 200 and json.loads(body)["method"] == "step_5_tag"
+
+
+def test_batch_fans_out_each_domain(analyzed):
+    urls = ["https://a.com", "b.com", "http://www.a.com/about"]
+    [(status, _, body)] = exchange(post("/keywords/batch", {"urls": urls}, "close"))
+    assert status == 200
+    results = json.loads(body)["results"]
+    assert [result["url"] for result in results] == ["https://a.com", "https://b.com", "http://www.a.com/about"]
+    assert [result["keywords"] for result in results] == [["a.com keyword"], ["b.com keyword"], ["a.com keyword"]]
+    # a.com and www.a.com are one site, analyzed once
+    assert sorted(analyzed) == ["https://a.com", "https://b.com"]
+
+
+def test_keep_alive(analyzed):
+    responses = exchange(post("/keywords", {"url": "a.com"}), get("/healthz"))
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert responses[0][1]["connection"] == "keep-alive" and json.loads(responses[1][2]) == {"status": "ok"}
+
+
+def test_metrics_are_text(analyzed):
+    [(status, headers, _)] = exchange(get("/metrics"))
+    assert status == 200 and headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (get("/nowhere"), 404),
+    (get("/keywords"), 405),
+    (post("/healthz", {}, "close"), 405),
+    (post("/keywords", b"not json", "close"), 400),
+    (post("/keywords", [1, 2], "close"), 400),
+    (post("/keywords", {"url": " "}, "close"), 400),
+    (post("/keywords/batch", {"urls": "a.com"}, "close"), 400),
+    (post("/keywords/batch", {"urls": ["a.com"] * (MAX_BATCH_URLS + 1)}, "close"), 413),
+], ids=["404", "405-get", "405-post", "bad-json", "not-object", "no-url", "urls-not-list", "too-many-urls"])
+def test_request_errors(analyzed, request_bytes, status):
+    [(got, _, body)] = exchange(request_bytes)
+    assert got == status and "error" in json.loads(body)
+    assert not analyzed
+
+
+def header_request(*header_lines, body=b""):
+    return (b"POST /keywords HTTP/1.1\r\nHost: test\r\n" + b"".join(line + b"\r\n" for line in header_lines)
+            + b"\r\n" + body)
+
+
+@pytest.mark.parametrize("request_bytes, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"GET /healthz\r\n\r\n", 400),
+    (header_request(b"Content-Length: abc"), 400),
+    (header_request(b"Content-Length: -1"), 400),
+    (header_request(b"Content-Length: 1e3"), 400),
+    (header_request(b"no colon here", b"Content-Length: 2", body=b"{}"), 400),
+    (header_request(b"Transfer-Encoding: chunked", body=b"2\r\n{}\r\n0\r\n\r\n"), 411),
+    (header_request(), 411),
+    (header_request(f"Content-Length: {MAX_BODY_BYTES + 1}".encode("ascii")), 413),
+], ids=["request-line", "no-version", "length-text", "length-negative", "length-float", "header-no-colon",
+        "chunked", "no-length", "body-too-large"])
+def test_malformed_requests_get_an_answer_and_close(analyzed, request_bytes, status):
+    # A keep-alive request after the bad one is never read as part of it
+    responses = exchange(request_bytes, get("/healthz", "keep-alive"))
+    assert [(got, headers["connection"]) for got, headers, _ in responses] == [(status, "close")]
+    assert "error" in json.loads(responses[0][2])
+    assert not analyzed
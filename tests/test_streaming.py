@@ -0,0 +1,215 @@
+"""Streamed responses: the incremental extractor, and the client against a local fake SSE server."""
+
+import http.server
+import json
+import os
+import random
+import re
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from prospecting_keywords import pipeline
+from prospecting_keywords.clients import get_openai_client
+from prospecting_keywords.extract import METHOD_STEP5_TAG
+from prospecting_keywords.streaming import StreamExtractor
+from prospecting_keywords.structured import METHOD_JSON, RESPONSE_FORMAT, STEP_KEYS
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "benchmarks", "fixtures", "gpt_responses.jsonl")
+SPLITS = 50
+TOKEN = re.compile(r'\s*\S{1,4}|\s+')
+API_KEY = "sk-test-streaming"
+
+FINAL_KEYWORDS = ["Dog Treats", "Chew Toys", "Dog Collars", "Pet Food", "Pet Supplies"]
+TEXT_RESPONSE = "".join(
+    f"<step_{step}_keywords>\n" + "".join(f"{i}. [Keyword {step}.{i}]\n" for i in range(1, 4))
+    + f"</step_{step}_keywords>\n" for step in range(1, 5)
+) + (
+    "<step_5_keywords>\n" + "".join(f"{i}. [{keyword}]\n" for i, keyword in enumerate(FINAL_KEYWORDS, 1))
+    + "</step_5_keywords>\n\n"
+    + "These keywords target pet blogs that review treats, toys and accessories for dog owners. " * 8
+)
+JSON_RESPONSE = json.dumps(
+    {key: [f"keyword {step}.{i}" for i in range(1, 4)] for step, key in enumerate(STEP_KEYS[:-1], 1)}
+    | {STEP_KEYS[-1]: [keyword.lower() for keyword in FINAL_KEYWORDS]}
+)
+EXPECTED = [keyword.lower() for keyword in FINAL_KEYWORDS]
+
+
+def load_cases():
+    with open(CORPUS, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return ([pytest.param(record["response"], False, id=record["id"]) for record in records]
+            + [pytest.param(TEXT_RESPONSE, False, id="text"), pytest.param(JSON_RESPONSE, True, id="json")])
+
+
+def random_deltas(text, rng):
+    deltas = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 12)
+        deltas.append(text[pos:pos + size])
+        pos += size
+    return deltas
+
+
+@pytest.mark.parametrize("text, structured", load_cases())
+def test_random_splits_match_the_full_extraction(text, structured):
+    rng = random.Random(5)
+    expected = pipeline.keywords_from_response(text, structured)
+    for _ in range(SPLITS):
+        extractor = StreamExtractor(structured)
+        seen = []
+        for delta in random_deltas(text, rng):
+            keywords = extractor.feed(delta)
+            # The list only ever grows, and never with anything but the final keywords
+            assert keywords[:len(seen)] == seen and keywords == expected[0][:len(keywords)]
+            seen = list(keywords)
+            if extractor.can_stop:
+                break
+        if extractor.done and extractor.keywords:
+            assert extractor.keywords == expected[0]
+        if extractor.can_stop:
+            # The text read so far gives the same answer as the whole response
+            assert pipeline.keywords_from_response(extractor.text) == (expected[0], METHOD_STEP5_TAG)
+
+
+def test_can_stop_after_the_text_list_closes():
+    extractor = StreamExtractor(structured=False)
+    end = TEXT_RESPONSE.index("</step_5_keywords>")
+    extractor.feed(TEXT_RESPONSE[:end])
+    assert extractor.keywords == EXPECTED and not extractor.can_stop
+    extractor.feed("</step_5_keywords>")
+    assert extractor.done and extractor.can_stop
+
+
+def test_json_never_stops_early():
+    # Only the closing brace is left once the list closes, and a complete document is cached
+    extractor = StreamExtractor(structured=True)
+    extractor.feed(JSON_RESPONSE[:-1])
+    assert extractor.done and extractor.keywords == EXPECTED and not extractor.can_stop
+
+
+def test_no_keywords_means_no_stop():
+    extractor = StreamExtractor(structured=False)
+    extractor.feed("<step_5_keywords>\n</step_5_keywords>\nMore text")
+    assert extractor.done and not extractor.can_stop
+
+
+class FakeStream:
+    """An SDK stream of content deltas that records how much of it was read."""
+
+    def __init__(self, text):
+        self.tokens = TOKEN.findall(text)
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for token in self.tokens:
+            self.read += 1
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_stream_closes_early_once_the_text_list_is_complete():
+    stream = FakeStream(TEXT_RESPONSE)
+    progress = []
+    text, usage = pipeline._read_stream(stream, "prompt", structured=False,
+                                        on_progress=lambda text, keywords: progress.append(list(keywords)))
+    assert stream.closed and stream.read < len(stream.tokens)
+    assert text.endswith("</step_5_keywords>") and text == TEXT_RESPONSE[:len(text)]
+    assert progress[-1] == EXPECTED
+    # Stopped before the usage chunk, so the counts are estimated
+    assert set(usage) == {"prompt_tokens", "completion_tokens"}
+
+
+def test_read_stream_reads_json_to_the_end():
+    stream = FakeStream(JSON_RESPONSE)
+    text, _ = pipeline._read_stream(stream, "prompt", structured=True)
+    assert stream.closed and stream.read == len(stream.tokens) and text == JSON_RESPONSE
+
+
+class SSEHandler(http.server.BaseHTTPRequestHandler):
+    """A /v1/chat/completions endpoint that answers in one body or as server-sent events."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = JSON_RESPONSE if "response_format" in body else TEXT_RESPONSE
+        tokens = TOKEN.findall(content)
+        usage = {"prompt_tokens": 400, "completion_tokens": len(tokens), "total_tokens": 400 + len(tokens)}
+
+        if not body.get("stream"):
+            data = json.dumps({
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, chunk_usage=None):
+            chunk = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0,
+                     "model": body["model"], "choices": choices, "usage": chunk_usage}
+            self._write_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+
+        try:
+            for token in tokens:
+                event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if body.get("stream_options", {}).get("include_usage"):
+                event([], usage)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def sse_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SSEHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("structured, method", [(False, METHOD_STEP5_TAG), (True, METHOD_JSON)],
+                         ids=["text", "json"])
+def test_streamed_and_blocking_calls_agree(sse_server, monkeypatch, structured, method):
+    monkeypatch.setattr(get_openai_client(API_KEY), "base_url", sse_server)
+    response_format = RESPONSE_FORMAT if structured else None
+    results = {}
+    for stream in (False, True):
+        monkeypatch.setattr(pipeline, "STREAM_RESPONSES", stream)
+        progress = []
+        text = pipeline.call_llm(API_KEY, "prompt", use_cache=False, response_format=response_format,
+                                 on_progress=lambda text, keywords: progress.append(list(keywords)))
+        results[stream] = pipeline.keywords_from_response(text, structured)
+        # Only a streamed call shows keywords as they arrive
+        assert bool(progress) == stream
+    assert results[True] == results[False] == (EXPECTED, method)
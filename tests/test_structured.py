@@ -0,0 +1,75 @@
+"""JSON schema responses: validation, and the fallback to the text extraction."""
+
+import json
+
+import pytest
+
+from prospecting_keywords import pipeline
+from prospecting_keywords.extract import METHOD_NONE, METHOD_QUOTES, METHOD_STEP5_TAG
+from prospecting_keywords.structured import FINAL_STEP_KEY, METHOD_JSON, STEP_KEYS, parse_structured_response
+
+
+def response(**overrides):
+    data = {key: [f"keyword {step}.{i}" for i in range(1, 4)] for step, key in enumerate(STEP_KEYS, 1)}
+    data.update(overrides)
+    return json.dumps(data)
+
+
+def test_valid_response():
+    steps = parse_structured_response(response(**{FINAL_STEP_KEY: [" dog treats ", "", "pet food", "  "]}))
+    assert list(steps) == list(STEP_KEYS)
+    # Items are stripped and blanks dropped
+    assert steps[FINAL_STEP_KEY] == ["dog treats", "pet food"]
+
+
+def test_extra_keys_are_ignored():
+    steps = parse_structured_response(response(notes="anything"))
+    assert "notes" not in steps
+
+
+@pytest.mark.parametrize("content, message", [
+    ("{\"step_1_keywords\": [", "not valid JSON"),
+    ("I'm sorry, but I can't help with that.", "not valid JSON"),
+    ("", "not valid JSON"),
+    (None, "not valid JSON"),
+    ("[\"dog treats\", \"pet food\"]", "not a JSON object"),
+    ("\"dog treats\"", "not a JSON object"),
+    ("null", "not a JSON object"),
+    (json.dumps({key: ["a"] for key in STEP_KEYS[:-1]}), f"{FINAL_STEP_KEY} must be a list of strings"),
+    (response(step_2_keywords=None), "step_2_keywords must be a list of strings"),
+    (response(step_3_keywords="dog treats"), "step_3_keywords must be a list of strings"),
+    (response(**{FINAL_STEP_KEY: ["dog treats", 5]}), f"{FINAL_STEP_KEY} must be a list of strings"),
+    (response(**{FINAL_STEP_KEY: [["dog treats"]]}), f"{FINAL_STEP_KEY} must be a list of strings"),
+    (response(**{FINAL_STEP_KEY: []}), f"{FINAL_STEP_KEY} is empty"),
+    (response(**{FINAL_STEP_KEY: ["", "   "]}), f"{FINAL_STEP_KEY} is empty"),
+], ids=["truncated", "prose", "empty-string", "none", "array", "string", "null", "missing-key", "null-list",
+        "string-list", "number-item", "nested-item", "empty-step-5", "blank-step-5"])
+def test_invalid_responses(content, message):
+    with pytest.raises(ValueError, match=message):
+        parse_structured_response(content)
+
+
+def test_empty_earlier_step_is_allowed():
+    steps = parse_structured_response(response(step_1_keywords=[]))
+    assert steps["step_1_keywords"] == [] and steps[FINAL_STEP_KEY]
+
+
+def test_json_keywords_are_cleaned():
+    content = response(**{FINAL_STEP_KEY: ["Dog Treats", "dog treats", "Pet Food", "Chew Toys", "Collars",
+                                           "Leads", "Beds"]})
+    keywords, method = pipeline._keywords_from_response(content, structured=True)
+    assert method == METHOD_JSON
+    assert keywords == ["dog treats", "pet food", "chew toys", "collars", "leads"]
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("I'm sorry, but I can't help with that.", ([], METHOD_NONE)),
+    ("I can't visit the site, but you could try \"dog treats\" or \"pet food\".",
+     (["dog treats", "pet food"], METHOD_QUOTES)),
+    ("Here you go:\n<step_5_keywords>\n1. [Dog Treats]\n2. [Pet Food]\n</step_5_keywords>",
+     (["dog treats", "pet food"], METHOD_STEP5_TAG)),
+], ids=["refusal", "quotes", "text-format"])
+def test_prose_falls_back_to_extract(content, expected):
+    assert pipeline._keywords_from_response(content, structured=True) == expected
+    # The same as reading it as a text response in the first place
+    assert pipeline._keywords_from_response(content, structured=False) == expected